@@ -7,6 +7,7 @@ Used to measure contact resistivity.
 import pya
 import math
 
+import constraints
 import helpers
 
 class cbkr(pya.PCellDeclarationHelper):
@@ -29,15 +30,19 @@ class cbkr(pya.PCellDeclarationHelper):
 
     self.param("disp_c", self.TypeBoolean, "Display Size?", default=True)
     self.param("text_h", self.TypeDouble, "Text Height", default = 20)
+    self.param("font", self.TypeString, "Label Font", default="Default",
+               choices=[(font, font) for font in helpers.FONTS])
+    self.param("merge", self.TypeBoolean, "Merge shapes?", default=False)
 
 
   def display_text_impl(self):
     return f'CKBR size={self.contact_size}'
   
   def coerce_parameters_impl(self):
-    pass
+    constraints.coerce_pcell(self)
 
   def produce_impl(self):
+    constraints.check_pcell(self)
     dbu = self.layout.dbu
 
     pad_w = self.pad_w / dbu
@@ -53,7 +58,8 @@ class cbkr(pya.PCellDeclarationHelper):
     x_arm_l = pad_dx / 2 + arm_w / 2
     y_arm_l = pad_dy / 2 + arm_w / 2
     
-    contact_centers = [(0, 0), (- x_arm_l, 0), (0, y_arm_l)]
+    # Contacts are left out in draft mode
+    contact_centers = [] if helpers.draft() else [(0, 0), (- x_arm_l, 0), (0, y_arm_l)]
     for x, y in contact_centers:
         self.cell.shapes(self.contact_layer).insert(pya.Box(
             *helpers.center_size_to_points(x, y, contact_size, contact_size)))
@@ -89,12 +95,10 @@ class cbkr(pya.PCellDeclarationHelper):
         pad_dx / 2, arm_w / 2, pad_dx / 2 + arm_w, pad_dy / 2))
     
     # Display text with relevant parameters    
-    if self.disp_c:
+    if self.disp_c and not helpers.draft():
         # Generate klayout region containing text
         # This can only generate with lower left at (0, 0)
-        text_generator = pya.TextGenerator.default_generator()
-        # default height is .7; third argument rescales to desired size
-        text = text_generator.text(f'C={self.contact_size:g}', self.layout.dbu, self.text_h / .7)
+        text = helpers.label(f'C={self.contact_size:g}', self.layout.dbu, self.text_h, self.font)
 
         # Adjust position of region
         bbox = text.bbox()
@@ -104,4 +108,8 @@ class cbkr(pya.PCellDeclarationHelper):
         text.move(text_x, text_y)
 
         # Add region to metal layer
-        self.cell.shapes(self.metal_layer).insert (text)
\ No newline at end of file
+        self.cell.shapes(self.metal_layer).insert (text)
+
+    # Optionally merge each layer into a minimal set of polygons
+    if self.merge:
+        helpers.merge_shapes(self.cell)
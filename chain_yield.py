@@ -0,0 +1,260 @@
+"""
+Contact chain yield analysis.
+
+Chain resistances from a ProberStore are normalized with the exact
+geometry of each contact_chain variant: its contact count and the number
+of squares in its semiconductor and metal links. Open chains are fitted
+to Poisson and negative binomial yield models across chain sizes, and the
+die level fail pattern is tested for spatial clustering on the wafer map.
+Bootstrapped confidence intervals are computed in a process pool.
+"""
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pya
+
+import helpers
+from grid_labels import parse_site_name
+from wafer_map import produce
+
+
+def chain_geometry(structures, dbu=.001):
+    """Measures every contact_chain variant, produced at full detail.
+
+    Link squares are counted from contact center to contact center; the
+    metal strap to the pad is included, the pads are not.
+
+    Args:
+        structures is structure metadata, as in SiteIndex.meta
+    Returns:
+        dict mapping kind to a dict of contacts, contact_area (um^2 per
+        contact), si_squares and metal_squares
+    """
+    result = {}
+    with helpers.full_detail():
+        for kind, info in enumerate(structures):
+            if info['pcell'] != 'contact_chain':
+                continue
+            scratch = pya.Layout()
+            scratch.dbu = dbu
+            cell = produce(scratch, 'contact_chain', info['params'])
+            params = cell.pcell_parameters_by_name()
+            link_w = round((params['contact_size'] + 4 * params['alignment']) / dbu)
+            squares = {}
+            for name in ('si', 'metal'):
+                boxes = [shape.box for shape in cell.shapes(scratch.layer(params[name])).each()
+                         if shape.is_box() and min(shape.box.width(), shape.box.height()) == link_w]
+                squares[name] = sum((max(box.width(), box.height()) - link_w) / link_w
+                                    for box in boxes)
+            contacts = cell.shapes(scratch.layer(params['contact'])).size()
+            result[kind] = {'contacts': contacts,
+                            'contact_area': params['contact_size'] ** 2,
+                            'si_squares': squares['si'],
+                            'metal_squares': squares['metal']}
+            scratch._destroy()
+    return result
+
+def chains(store, r='R', keys=('die', 'site'), open_ohms=1e6, rsh_si=0, rsh_metal=0):
+    """Normalizes the contact chain measurements of a ProberStore.
+
+    Args:
+        r is the chain resistance column in ohm; NaN counts as open
+        open_ohms is the resistance above which a chain is open
+        rsh_si, rsh_metal are link sheet resistances in ohm/sq, removed
+            before dividing by the contact count
+    Returns:
+        dict of per chain arrays: the key columns, contacts,
+        contact_area, r_chain, r_contact and open
+    """
+    rows = np.nonzero(store.select('contact_chain'))[0]
+    geometry = chain_geometry(store.structures)
+    kinds = np.asarray(store['kind'][rows])
+    table = {name: np.array([geometry[kind][name] for kind in kinds], dtype=float)
+             for name in ('contacts', 'contact_area', 'si_squares', 'metal_squares')}
+    result = {key: store.decode(key, rows) if key in store.meta['labels'] else
+              np.asarray(store[key][rows]) for key in keys}
+    r_chain = np.asarray(store[r][rows], dtype=float)
+    links = rsh_si * table['si_squares'] + rsh_metal * table['metal_squares']
+    is_open = ~(r_chain <= open_ohms)
+    result.update(contacts=table['contacts'].astype(np.int64),
+                  contact_area=table['contact_area'], r_chain=r_chain,
+                  r_contact=np.where(is_open, np.nan, (r_chain - links) / table['contacts']),
+                  open=is_open)
+    return result
+
+def yield_table(contacts, opens):
+    """Counts tested and failed chains per chain size.
+
+    Returns:
+        (sizes, tested, failed) arrays
+    """
+    sizes, index = np.unique(contacts, return_inverse=True)
+    tested = np.bincount(index, minlength=len(sizes))
+    failed = np.bincount(index, np.asarray(opens, dtype=float), len(sizes))
+    return sizes, tested, failed
+
+def _nll(y, tested, failed):
+    """Binomial negative log likelihood of chain yields y."""
+    y = np.clip(y, 1e-300, 1 - 1e-16)
+    return - ((tested - failed) * np.log(y) + failed * np.log1p(- y)).sum(axis=-1)
+
+def _zoom(nll, grids, passes=3):
+    """Minimizes nll over log spaced grids, refining around the best point.
+
+    Args:
+        nll takes one broadcastable array per parameter
+        grids is a (low, high, points) range per parameter
+    """
+    ranges = [(math.log(low), math.log(high)) for low, high, _ in grids]
+    for _ in range(passes):
+        axes = [np.exp(np.linspace(low, high, n)) for (low, high), (_, _, n) in zip(ranges, grids)]
+        mesh = np.meshgrid(*axes, indexing='ij')
+        values = nll(*[m[..., None] for m in mesh])
+        best = np.unravel_index(np.nanargmin(values), values.shape)
+        ranges = []
+        for axis, k in zip(axes, best):
+            ranges.append((math.log(axis[max(k - 1, 0)]), math.log(axis[min(k + 1, len(axis) - 1)])))
+    return [axis[k] for axis, k in zip(axes, best)]
+
+def fit_poisson(sizes, tested, failed):
+    """Fits Y = exp(- lam * N) across chain sizes N.
+
+    Returns:
+        lam, the failure probability per contact
+    """
+    sizes = np.asarray(sizes, dtype=float)
+    lam, = _zoom(lambda lam: _nll(np.exp(- lam * sizes), tested, failed), [(1e-12, 10, 400)])
+    return lam
+
+def fit_negative_binomial(sizes, tested, failed):
+    """Fits Y = (1 + lam * N / alpha) ** - alpha across chain sizes N.
+
+    Small alpha means strongly clustered defects; large alpha approaches
+    the Poisson model.
+
+    Returns:
+        (lam, alpha)
+    """
+    sizes = np.asarray(sizes, dtype=float)
+    return tuple(_zoom(
+        lambda lam, alpha: _nll((1 + lam * sizes / alpha) ** - alpha, tested, failed),
+        [(1e-12, 10, 200), (1e-2, 1e4, 60)]))
+
+def die_grid(dies):
+    """Returns (cols, rows) arrays of grid_labels style die names."""
+    cells = np.array([parse_site_name(str(die)) for die in dies], dtype=np.int64).reshape(-1, 2)
+    return cells[:, 0], cells[:, 1]
+
+def _raster(cols, rows, values):
+    grid = np.full((rows.max() - rows.min() + 1, cols.max() - cols.min() + 1), np.nan)
+    grid[rows - rows.min(), cols - cols.min()] = values
+    return grid
+
+def morans_i(grid):
+    """Moran's I with rook neighbours on a 2D array, NaN for missing dies."""
+    z = grid - np.nanmean(grid)
+    pairs = [(z[:, 1:], z[:, :-1]), (z[1:, :], z[:-1, :])]
+    cross = sum(np.nansum(a * b) for a, b in pairs)
+    weights = sum(np.sum(np.isfinite(a * b)) for a, b in pairs)
+    n = np.sum(np.isfinite(z))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return n / weights * cross / np.nansum(z ** 2)
+
+def join_ratio(grid):
+    """Observed over expected fail-fail joins of a 0/1 grid, rook neighbours.
+
+    Above 1 fails cluster; the expectation is for fails spread at random.
+    """
+    pairs = [(grid[:, 1:], grid[:, :-1]), (grid[1:, :], grid[:-1, :])]
+    joins = sum(np.sum(np.isfinite(a * b)) for a, b in pairs)
+    bb = sum(np.nansum(a * b) for a, b in pairs)
+    p = np.nanmean(grid)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return bb / (joins * p * p)
+
+def _block_resample(grid, block, rng):
+    """Moving-block bootstrap: fills grid positions with random blocks."""
+    rows, cols = grid.shape
+    block = min(block, rows, cols)
+    out = np.empty_like(grid)
+    for r in range(0, rows, block):
+        for c in range(0, cols, block):
+            sr = rng.integers(0, rows - block + 1)
+            sc = rng.integers(0, cols - block + 1)
+            h, w = min(block, rows - r), min(block, cols - c)
+            out[r:r + h, c:c + w] = grid[sr:sr + h, sc:sc + w]
+    # The wafer outline is kept, so edge dies stay edge dies
+    out[np.isnan(grid)] = np.nan
+    return out
+
+def _replicates(args):
+    """Bootstrap replicates of the yield fits and clustering statistics."""
+    seed, count, die_index, contacts, opens, fraction, any_open, block = args
+    rng = np.random.default_rng(seed)
+    dies = np.unique(die_index)
+    # Row lists per die, so whole dies are resampled
+    order = np.argsort(die_index, kind='stable')
+    starts = np.searchsorted(die_index[order], dies)
+    ends = np.append(starts[1:], len(order))
+    out = []
+    for _ in range(count):
+        pick = rng.integers(0, len(dies), len(dies))
+        rows = np.concatenate([order[starts[k]:ends[k]] for k in pick])
+        table = yield_table(contacts[rows], opens[rows])
+        lam, alpha = fit_negative_binomial(*table)
+        out.append((fit_poisson(*table), lam, alpha,
+                    morans_i(_block_resample(fraction, block, rng)),
+                    join_ratio(_block_resample(any_open, block, rng))))
+    return out
+
+def analyze(store, n_boot=1000, workers=None, block=3, seed=0, confidence=.95, **options):
+    """Runs the chain normalization, yield fits and spatial statistics.
+
+    The die column must hold grid_labels style die names, as written by
+    build_wafer.
+
+    Args:
+        n_boot is the number of bootstrap replicates; 0 skips them
+        workers is the process pool size; None uses every CPU
+        block is the edge of the die blocks resampled for the spatial
+            statistics
+        options are passed to chains
+    Returns:
+        dict with 'chains' (see chains), 'yield' (sizes, tested, failed),
+        'poisson' (lam), 'negative_binomial' (lam, alpha), 'd0' (defects
+        per cm^2 of contact area, Poisson), 'morans_i' of the die fail
+        fraction, 'join_ratio' of dies with any open chain, and with
+        bootstrapping 'intervals' mapping each of poisson, nb_lam,
+        nb_alpha, morans_i and join_ratio to (low, high)
+    """
+    data = chains(store, **options)
+    table = yield_table(data['contacts'], data['open'])
+    lam = fit_poisson(*table)
+    nb = fit_negative_binomial(*table)
+
+    labels, die_index = np.unique(data['die'].astype(str), return_inverse=True)
+    cols, rows = die_grid(labels)
+    fraction = np.bincount(die_index, data['open'].astype(float)) / np.bincount(die_index)
+    fraction = _raster(cols, rows, fraction)
+    any_open = np.where(np.isnan(fraction), np.nan, fraction > 0)
+    result = {'chains': data, 'yield': table, 'poisson': lam, 'negative_binomial': nb,
+              'd0': lam / (np.median(data['contact_area']) * 1e-8),
+              'morans_i': morans_i(fraction), 'join_ratio': join_ratio(any_open)}
+    if not n_boot:
+        return result
+
+    workers = workers or os.cpu_count() or 1
+    counts = [n_boot // workers + (k < n_boot % workers) for k in range(workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    tasks = [(s, c, die_index, data['contacts'], data['open'], fraction, any_open, block)
+             for s, c in zip(seeds, counts) if c]
+    with ProcessPoolExecutor(len(tasks)) as pool:
+        samples = np.array([r for part in pool.map(_replicates, tasks) for r in part])
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.nanpercentile(samples, [tail, 100 - tail], axis=0)
+    result['intervals'] = dict(zip(('poisson', 'nb_lam', 'nb_alpha', 'morans_i', 'join_ratio'),
+                                   zip(low, high)))
+    return result
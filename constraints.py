@@ -0,0 +1,223 @@
+"""
+Parameter feasibility checks for the EE312 PCells.
+
+Every rule only looks at the parameter values, so whole sweep specs can be
+validated before any geometry is produced. Rules with a fix are applied by
+coerce_parameters_impl of each PCell, and produce_impl refuses parameters
+still violating a rule.
+"""
+
+import math
+
+import helpers
+
+
+def _positive(*names):
+    """Rules requiring each of the given parameters to be positive."""
+    return [(f'{name} must be positive', lambda p, name=name: p[name] > 0, None)
+            for name in names]
+
+def _non_negative(*names):
+    """Rules requiring each of the given parameters to be zero or more."""
+    return [(f'{name} must not be negative', lambda p, name=name: p[name] >= 0,
+             lambda p, name=name: {name: 0})
+            for name in names]
+
+def _contact_box(p):
+    """Width of metal or Si needed around a contact."""
+    return p['contact_size'] + 4 * p['alignment']
+
+def _values(p, name):
+    """The values of a list parameter as floats."""
+    return [float(value) for value in p[name]]
+
+def _same_count(*names):
+    """Rule requiring list parameters to have one value or equally many.
+
+    The fix cuts the longer lists to the shortest one with several values.
+    """
+    message = f'{" and ".join(names)} must have one value or the same number of values'
+    def fix(p):
+        counts = [len(p[name]) for name in names if len(p[name]) > 1]
+        return {name: list(p[name][:min(counts)]) for name in names if len(p[name]) > 1}
+    return [(message, lambda p: all(p[name] for name in names)
+             and len({len(p[name]) for name in names} - {1}) <= 1, fix)]
+
+def _contact_size(size):
+    """Correction shrinking the contacts to size, if that leaves any."""
+    return {'contact_size': size} if size > 0 else {}
+
+
+# Each rule is (message, check(params), fix(params) -> corrections or None).
+# Rules are listed per PCell and evaluated in order.
+_FONT = [(f'font must be one of {", ".join(helpers.FONTS)}',
+          lambda p: p['font'] in helpers.FONTS, lambda p: {'font': helpers.FONTS[0]})]
+_PADS = _positive('pad_w', 'pad_h', 'text_h') + _FONT
+
+RULES = {
+    'transistor': _PADS + _positive('W', 'L', 'contact_size', 'pad_dx', 'pad_dy')
+        + _non_negative('alignment'),
+    'vernier': _positive('tick_width', 'tick_height', 'tick_spacing') + [
+        ('num_ticks must not be negative', lambda p: p['num_ticks'] >= 0,
+         lambda p: {'num_ticks': 0}),
+    ],
+    'four_point_probe': _PADS + _positive('W', 'L', 'contact_size', 'min_feature', 'pad_dx', 'pad_dy')
+        + _non_negative('alignment') + [
+        ('L must leave room for the end contacts',
+         lambda p: p['L'] + _contact_box(p) < p['pad_dx'] + 2 * p['pad_w'] - 2 * _contact_box(p),
+         lambda p: {'L': p['pad_dx']}),
+    ],
+    'cbkr': _PADS + _positive('contact_size', 'pad_dx', 'pad_dy') + _non_negative('alignment'),
+    'ono_contact': _PADS + _positive('meas_contact_w', 'meas_contact_l', 'tlm_dl', 'meas_w', 'pad_dx', 'pad_dy')
+        + _non_negative('alignment') + [
+        ('tlm_dl must exceed the tap metal width',
+         lambda p: p['tlm_dl'] > p['meas_contact_w'] + 4 * p['alignment'],
+         lambda p: {'tlm_dl': 2 * (p['meas_contact_w'] + 4 * p['alignment'])}),
+    ],
+    'contact_chain': _PADS + _positive('contact_size', 'bar_len', 'pad_dx') + _non_negative('alignment') + [
+        ('bar_len must exceed the link width',
+         lambda p: p['bar_len'] > _contact_box(p),
+         lambda p: {'bar_len': 2 * _contact_box(p)}),
+    ],
+    'tlm': _PADS + _positive('width', 'dl', 'contact_size', 'pad_dx', 'pad_dy') + [
+        ('contact metal (.8 dl) must cover the contact',
+         lambda p: .8 * p['dl'] > p['contact_size'],
+         lambda p: {'dl': 2 * p['contact_size']}),
+    ],
+    'six_p_tlm': _PADS + _positive('width', 'dl', 'contact_size', 'pad_dy') + [
+        ('contact metal (.8 dl) must cover the contact',
+         lambda p: .8 * p['dl'] > p['contact_size'],
+         lambda p: {'dl': 2 * p['contact_size']}),
+    ],
+    'tlm_array': _PADS + _positive('contact_size', 'pad_dx', 'pad_dy', 'bus_w')
+        + _non_negative('alignment') + _same_count('dl', 'width') + [
+        ('every dl must be positive', lambda p: min(_values(p, 'dl')) > 0, None),
+        ('every width must fit a contact',
+         lambda p: min(_values(p, 'width')) >= _contact_box(p),
+         lambda p: _contact_size(min(_values(p, 'width')) - 4 * p['alignment'])),
+    ],
+    'fpp_array': _PADS + _positive('contact_size', 'min_feature', 'pad_dx', 'pad_dy')
+        + _non_negative('alignment') + _same_count('W', 'L') + [
+        ('every W must be positive', lambda p: min(_values(p, 'W')) > 0, None),
+        ('every L must exceed the tap width',
+         lambda p: min(_values(p, 'L')) > p['min_feature'], None),
+    ],
+    'vdp': _PADS + _positive('square', 'slit', 'dia', 'contact_size', 'pad_dx', 'pad_dy')
+        + _non_negative('alignment') + [
+        ('slit must be narrower than dia',
+         lambda p: p['slit'] < p['dia'],
+         lambda p: {'slit': p['dia'] / 8}),
+        ('square must fit inside dia',
+         lambda p: p['square'] < p['dia'],
+         lambda p: {'square': p['dia'] / 2}),
+        ('contacts must fit inside the cloverleaf',
+         lambda p: p['dia'] / 2 > p['alignment'] + p['contact_size'] / math.sqrt(2),
+         lambda p: _contact_size((p['dia'] / 2 - p['alignment']) / math.sqrt(2))),
+    ],
+    'diode': _PADS + _positive('L', 'contact_size', 'pad_dx') + _non_negative('alignment') + [
+        ('L must fit at least one contact',
+         lambda p: p['L'] >= p['contact_size'] + 5 * p['alignment'],
+         lambda p: {'L': p['contact_size'] + 5 * p['alignment']}),
+    ],
+    'min_feature_optic': _positive('min_width', 'feature_spacing') + _non_negative('delta') + [
+        ('num_features must be at least 1', lambda p: p['num_features'] >= 1,
+         lambda p: {'num_features': 1}),
+    ],
+    'min_feature_optic_step': _positive('min_width', 'feature_spacing', 'height') + _non_negative('delta') + [
+        ('num_features must be at least 1', lambda p: p['num_features'] >= 1,
+         lambda p: {'num_features': 1}),
+    ],
+    'min_feature_electrical': _PADS + _positive('feature_width', 'feature_spacing', 'pad_dy', 'contact_size')
+        + _non_negative('alignment') + [
+        ('pad_dy must exceed twice the feature spacing',
+         lambda p: not p['cont'] or p['pad_dy'] > 2 * p['feature_spacing'],
+         None),
+    ],
+    'grid_labels': _positive('text_h', 'dx', 'dy') + _FONT + [
+        ('x_num must be at least 1', lambda p: p['x_num'] >= 1, lambda p: {'x_num': 1}),
+        ('y_num must be at least 1', lambda p: p['y_num'] >= 1, lambda p: {'y_num': 1}),
+    ],
+}
+
+
+def check(pcell, params):
+    """Returns the messages of all constraints violated by params."""
+    errors = []
+    for message, ok, _ in RULES[pcell]:
+        try:
+            if not ok(params):
+                errors.append(message)
+        except (TypeError, KeyError, ValueError) as e:
+            errors.append(f'{message} ({e!r})')
+    return errors
+
+def coerce(pcell, params):
+    """Returns a copy of params with every fixable violation corrected."""
+    params = dict(params)
+    for _, ok, fix in RULES[pcell]:
+        try:
+            if fix is not None and not ok(params):
+                params.update(fix(params))
+        except (TypeError, KeyError, ValueError):
+            pass
+    return params
+
+def _pcell_params(declaration):
+    return {p.name: getattr(declaration, p.name) for p in declaration.get_parameters()}
+
+def coerce_pcell(declaration):
+    """Corrects the parameters of a PCell from its coerce_parameters_impl."""
+    params = _pcell_params(declaration)
+    for name, value in coerce(type(declaration).__name__, params).items():
+        if value != params[name]:
+            setattr(declaration, name, value)
+
+def check_pcell(declaration):
+    """Refuses the parameters of a PCell from its produce_impl.
+
+    Parameters reach produce_impl without coerce when a layout creates the
+    PCell directly, and not every rule has a fix.
+
+    Raises:
+        ValueError naming every violated constraint
+    """
+    pcell = type(declaration).__name__
+    errors = check(pcell, _pcell_params(declaration))
+    if errors:
+        raise ValueError(f'{pcell}: ' + '; '.join(errors))
+
+
+_defaults = {}
+
+def defaults(pcell):
+    """Returns the declared default parameters of a PCell."""
+    if pcell not in _defaults:
+        import library
+        _defaults[pcell] = {p.name: p.default
+                            for p in library.PCELLS[pcell]().get_parameters()}
+    return _defaults[pcell]
+
+def split_rows(pcell, rows, fix=False):
+    """Validates a sweep spec in bulk without producing any geometry.
+
+    Args:
+        pcell is the PCell name
+        rows is an iterable of parameter dicts; missing values use defaults
+        fix applies the automatic corrections before checking
+    Returns:
+        (accepted, rejected) where accepted is a list of complete parameter
+        dicts and rejected a list of (row index, row, messages)
+    """
+    base = defaults(pcell)
+    accepted = []
+    rejected = []
+    for index, row in enumerate(rows):
+        params = dict(base, **row)
+        if fix:
+            params = coerce(pcell, params)
+        errors = check(pcell, params)
+        if errors:
+            rejected.append((index, row, errors))
+        else:
+            accepted.append(params)
+    return accepted, rejected
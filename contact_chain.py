@@ -7,6 +7,7 @@ Used to verify contacts perform consistently.
 import pya
 import math
 
+import constraints
 import helpers
 
 class contact_chain(pya.PCellDeclarationHelper):
@@ -31,15 +32,19 @@ class contact_chain(pya.PCellDeclarationHelper):
 
     self.param("disp_c", self.TypeBoolean, "Display Size?", default=True)
     self.param("text_h", self.TypeDouble, "Text Height", default = 20)
+    self.param("font", self.TypeString, "Label Font", default="Default",
+               choices=[(font, font) for font in helpers.FONTS])
+    self.param("merge", self.TypeBoolean, "Merge shapes?", default=False)
 
 
   def display_text_impl(self):
     return f'contact chain size={self.contact_size} num={self.num}'
   
   def coerce_parameters_impl(self):
-    pass
+    constraints.coerce_pcell(self)
 
   def produce_impl(self):
+    constraints.check_pcell(self)
     self.num=0
     dbu = self.layout.dbu
 
@@ -64,41 +69,53 @@ class contact_chain(pya.PCellDeclarationHelper):
     layers = [self.si_layer, self.metal_layer]
     layer = True
     next_br = False
+    # Links are collected so draft mode can replace them by an outline
+    links = []
+    contacts = []
     while True:
         if abs(y + c_dir * (2 * bl + bw / 2)) > pad_h / 2 and layer:
             if next_br:
                 break
             if x + 3 * bl - bw / 2 > pad_dx / 2:
                 next_br = True
-            self.cell.shapes(layers[layer]).insert(pya.Box(
+            links.append((layers[layer], pya.Box(
                 *helpers.center_size_to_points(
-                   x + bl / 2, y, bl + bw, bw)))
+                   x + bl / 2, y, bl + bw, bw))))
             x += bl
             c_dir *= -1
-            self.cell.shapes(self.contact_layer).insert(pya.Box(
+            contacts.append(pya.Box(
                 *helpers.center_size_to_points(
                    x, y, cs, cs)))
             layer = not layer
-        self.cell.shapes(layers[layer]).insert(pya.Box(
+        links.append((layers[layer], pya.Box(
             *helpers.center_size_to_points(
-                x, y + c_dir * bl / 2, bw, bl + bw)))
+                x, y + c_dir * bl / 2, bw, bl + bw))))
         y += c_dir * bl
-        self.cell.shapes(self.contact_layer).insert(pya.Box(
+        contacts.append(pya.Box(
             *helpers.center_size_to_points(
                 x, y, cs, cs)))
         if not layer:
             self.num += 2
         layer = not layer
+
+    if helpers.draft():
+        outline = pya.Box()
+        for _, box in links:
+            outline += box
+        self.cell.shapes(self.si_layer).insert(outline)
+    else:
+        for link_layer, box in links:
+            self.cell.shapes(link_layer).insert(box)
+        for box in contacts:
+            self.cell.shapes(self.contact_layer).insert(box)
     self.cell.shapes(self.metal_layer).insert(pya.Box(
         x - bw / 2, y - bw / 2, pad_dx / 2, y + bw / 2))
 
     # Display text with relevant parameters    
-    if self.disp_c:
+    if self.disp_c and not helpers.draft():
         # Generate klayout region containing text
         # This can only generate with lower left at (0, 0)
-        text_generator = pya.TextGenerator.default_generator()
-        # default height is .7; third argument rescales to desired size
-        text = text_generator.text(f'C={self.contact_size:g}', self.layout.dbu, self.text_h / .7)
+        text = helpers.label(f'C={self.contact_size:g}', self.layout.dbu, self.text_h, self.font)
 
         # Adjust position of region
         bbox = text.bbox()
@@ -109,3 +126,7 @@ class contact_chain(pya.PCellDeclarationHelper):
 
         # Add region to metal layer
         self.cell.shapes(self.metal_layer).insert (text)
+
+    # Optionally merge each layer into a minimal set of polygons
+    if self.merge:
+        helpers.merge_shapes(self.cell)
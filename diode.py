@@ -7,6 +7,7 @@ Used for testing any number of electrical characteristics.
 import pya
 import math
 
+import constraints
 import helpers
 
 class diode(pya.PCellDeclarationHelper):
@@ -29,6 +30,9 @@ class diode(pya.PCellDeclarationHelper):
 
     self.param("disp_L", self.TypeBoolean, "Display Size?", default=True)
     self.param("text_h", self.TypeDouble, "Text Height", default = 20)
+    self.param("font", self.TypeString, "Label Font", default="Default",
+               choices=[(font, font) for font in helpers.FONTS])
+    self.param("merge", self.TypeBoolean, "Merge shapes?", default=False)
 
 
   def display_text_impl(self):
@@ -36,9 +40,10 @@ class diode(pya.PCellDeclarationHelper):
     return f'{part_str} L={self.L}'
   
   def coerce_parameters_impl(self):
-    pass
+    constraints.coerce_pcell(self)
 
   def produce_impl(self):
+    constraints.check_pcell(self)
     dbu = self.layout.dbu
     L = self.L / dbu
     alignment = self.alignment / dbu
@@ -52,6 +57,9 @@ class diode(pya.PCellDeclarationHelper):
         *helpers.center_size_to_points(0, 0, L, L)))
 
     num_contacts = int((L - 3 * alignment) / (contact_size + 2 * alignment))
+    # Contact arrays are left out in draft mode
+    if helpers.draft():
+        num_contacts = 0
     p_contact_pos = L / 2 + 3 * offset / 2
     for ii in range(num_contacts):
         contact_x = - L / 2 + offset / 2 + ii * (contact_size + 2 * alignment)
@@ -90,12 +98,10 @@ class diode(pya.PCellDeclarationHelper):
         - pad_dx / 2, - L / 2, - p_contact_pos - offset / 2, L / 2))
 
     # Display text with relevant parameters    
-    if self.disp_L:
+    if self.disp_L and not helpers.draft():
         # Generate klayout region containing text
         # This can only generate with lower left at (0, 0)
-        text_generator = pya.TextGenerator.default_generator()
-        # default height is .7; third argument rescales to desired size
-        text = text_generator.text(f'L={self.L:g}', self.layout.dbu, self.text_h / .7)
+        text = helpers.label(f'L={self.L:g}', self.layout.dbu, self.text_h, self.font)
 
         # Adjust position of region
         bbox = text.bbox()
@@ -105,4 +111,8 @@ class diode(pya.PCellDeclarationHelper):
         text.move(text_x, text_y)
 
         # Add region to metal layer
-        self.cell.shapes(self.metal_layer).insert (text)
\ No newline at end of file
+        self.cell.shapes(self.metal_layer).insert (text)
+
+    # Optionally merge each layer into a minimal set of polygons
+    if self.merge:
+        helpers.merge_shapes(self.cell)
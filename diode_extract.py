@@ -0,0 +1,191 @@
+"""
+Batched diode I-V and MOS capacitor C-V extraction for the diode PCell.
+
+Fits run on (devices, points) sweep arrays padded with NaN, as returned
+by ProberStore.sweeps. Junction area and perimeter are measured on the
+produced active layer of each diode variant, so results can be split into
+area and perimeter components across the L variants of a die.
+"""
+
+import numpy as np
+import pya
+
+import helpers
+from mosfet_extract import gradient, take
+from wafer_map import produce
+
+Q = 1.602176634e-19
+K_B = 1.380649e-23
+EPS_0 = 8.8541878128e-14  # F/cm
+EPS_SI = 11.7
+EPS_OX = 3.9
+
+
+def geometry(structures, layer='active', dbu=.001):
+    """Measures the junction of every diode variant.
+
+    Args:
+        structures is structure metadata, as in SiteIndex.meta
+        layer names the layer parameter holding the junction
+    Returns:
+        dict mapping kind to (area in um^2, perimeter in um)
+    """
+    result = {}
+    with helpers.full_detail():
+        for kind, info in enumerate(structures):
+            if info['pcell'] != 'diode':
+                continue
+            scratch = pya.Layout()
+            scratch.dbu = dbu
+            cell = produce(scratch, 'diode', info['params'])
+            region = pya.Region(cell.begin_shapes_rec(
+                scratch.layer(pya.LayerInfo.from_string(str(info['params'][layer])))))
+            region.merge()
+            result[kind] = (region.area() * dbu ** 2, region.perimeter() * dbu)
+            scratch._destroy()
+    return result
+
+def _line(x, y, mask):
+    """Least squares y = slope * x + intercept per device over mask."""
+    n = mask.sum(axis=1)
+    x = np.where(mask, x, 0)
+    y = np.where(mask, y, 0)
+    sx, sy = x.sum(axis=1), y.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (n * (x * y).sum(axis=1) - sx * sy) / (n * (x * x).sum(axis=1) - sx ** 2)
+        intercept = (sy - slope * sx) / n
+    invalid = n < 2
+    return np.where(invalid, np.nan, slope), np.where(invalid, np.nan, intercept)
+
+def iv_fit(v, i, temperature=300, fraction=1e-2, i_floor=1e-12):
+    """Fits forward I-V sweeps to I = Is (exp((V - I Rs) / (n Vt)) - 1).
+
+    n and Is come from ln(I) against V where the current is below fraction
+    of the sweep maximum, so Rs does not matter there; Rs is then the least
+    squares ratio of the remaining voltage drop to I above it.
+
+    Returns:
+        dict of per device arrays n, i_s (A) and r_s (ohm)
+    """
+    vt = K_B * temperature / Q
+    current = np.abs(i)
+    top = np.nanmax(np.where(v > 0, current, np.nan), axis=1, initial=0)[:, None]
+    forward = (v > 0) & (current > i_floor)
+    low = forward & (current < fraction * top)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope, intercept = _line(v, np.log(current), low)
+        n = 1 / (slope * vt)
+        i_s = np.exp(intercept)
+        high = forward & (current >= fraction * top)
+        drop = v - (n * vt)[:, None] * np.log(current / i_s[:, None] + 1)
+        r_s = np.where(high, current * drop, 0).sum(axis=1) / np.where(high, current ** 2, 0).sum(axis=1)
+    return {'n': n, 'i_s': i_s, 'r_s': r_s}
+
+def cv_fit(v, c, area, temperature=300, depletion=(.3, .8)):
+    """Extracts oxide thickness, doping and flat-band voltage from C-V.
+
+    The oxide capacitance is the accumulation maximum. The doping profile
+    follows from the slope of 1/C^2 wherever C lies within the depletion
+    fractions of it, and the flat-band voltage is where C crosses the
+    flat-band capacitance of the median doping.
+
+    Args:
+        c is the capacitance in F
+        area is the gate area in um^2 per device
+    Returns:
+        dict of per device arrays c_ox (F), t_ox (nm), doping (cm^-3) and
+        v_fb (V), and (devices, points) arrays depth (um) and profile
+        (cm^-3) along the sweep
+    """
+    area = np.asarray(area, dtype=float)[:, None] * 1e-8
+    eps_si = EPS_SI * EPS_0
+    c_ox = np.nanmax(c, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_ox = EPS_OX * EPS_0 * area[:, 0] / c_ox * 1e7
+        slope = gradient(1 / c ** 2, v)
+        profile = 2 / (Q * eps_si * area ** 2 * np.abs(slope))
+        depth = eps_si * area * (1 / c - 1 / c_ox[:, None]) * 1e4
+    ratio = c / c_ox[:, None]
+    inside = (ratio >= depletion[0]) & (ratio <= depletion[1]) & np.isfinite(profile)
+    doping = np.nanmedian(np.where(inside, profile, np.nan), axis=1) \
+        if inside.any() else np.full(len(c), np.nan)
+
+    debye = np.sqrt(eps_si * K_B * temperature / (Q ** 2 * doping))
+    c_fb = 1 / (1 / c_ox + debye / (eps_si * area[:, 0]))
+    side = np.sign(c - c_fb[:, None])
+    crossing = (side[:, :-1] * side[:, 1:] <= 0) & np.isfinite(side[:, :-1] * side[:, 1:])
+    k = np.argmax(crossing, axis=1)
+    v0, v1 = take(v, k), take(v, k + 1)
+    c0, c1 = take(c, k), take(c, k + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        v_fb = np.where(c1 != c0, v0 + (c_fb - c0) * (v1 - v0) / (c1 - c0), v0)
+    v_fb = np.where(crossing.any(axis=1), v_fb, np.nan)
+    return {'c_ox': c_ox, 't_ox': t_ox, 'doping': doping, 'v_fb': v_fb,
+            'depth': depth, 'profile': profile}
+
+def area_perimeter(area, perimeter, values, groups=None):
+    """Splits values into area and perimeter components.
+
+    Within each group, usually the L variants of one die, values is fitted
+    as a * area + p * perimeter by least squares.
+
+    Returns:
+        (group labels, a per um^2, p per um), NaN where a group does not
+        determine both
+    """
+    area = np.asarray(area, dtype=float)
+    perimeter = np.asarray(perimeter, dtype=float)
+    values = np.asarray(values, dtype=float)
+    groups = np.zeros(len(values)) if groups is None else np.asarray(groups)
+    labels, g = np.unique(groups, return_inverse=True)
+    ok = np.isfinite(values)
+    sums = [np.bincount(g[ok], (x * y)[ok], len(labels)) for x, y in (
+        (area, area), (area, perimeter), (perimeter, perimeter),
+        (area, values), (perimeter, values))]
+    aa, ap, pp, av, pv = sums
+    det = aa * pp - ap ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        singular = np.abs(det) <= 1e-12 * aa * pp
+        a = np.where(singular, np.nan, (av * pp - pv * ap) / det)
+        p = np.where(singular, np.nan, (pv * aa - av * ap) / det)
+    return labels, a, p
+
+def _die_groups(data):
+    if 'die' not in data:
+        return None
+    return np.array([die if isinstance(die, str) else format(die, 'g') for die in data['die']])
+
+def _sweeps(store, x, y, diode, keys, layer):
+    data = store.sweeps(x, y, 'diode', keys, diode=diode)
+    sizes = geometry(store.structures, layer)
+    measured = np.array([sizes[kind] for kind in data.pop('kind')], dtype=float).reshape(-1, 2)
+    data['area'], data['perimeter'] = measured[:, 0], measured[:, 1]
+    return data
+
+def extract_iv(store, v='V', i='I', keys=('die', 'site'), temperature=300, layer='active'):
+    """Fits the I-V sweeps of every diode in a ProberStore.
+
+    Returns:
+        dict of per device arrays (keys, area, perimeter, n, i_s, r_s) and
+        'j_s', the area_perimeter split of i_s by die
+    """
+    data = _sweeps(store, v, i, True, keys, layer)
+    result = {key: value for key, value in data.items() if key not in ('x', 'y')}
+    result.update(iv_fit(data['x'], data['y'], temperature))
+    result['j_s'] = area_perimeter(data['area'], data['perimeter'], result['i_s'],
+                                   _die_groups(data))
+    return result
+
+def extract_cv(store, v='V', c='C', keys=('die', 'site'), temperature=300, layer='active'):
+    """Fits the C-V sweeps of every MOS capacitor in a ProberStore.
+
+    Returns:
+        dict of per device arrays as from cv_fit, with the keys, area and
+        perimeter, and 'c_split', the area_perimeter split of c_ox by die
+    """
+    data = _sweeps(store, v, c, False, keys, layer)
+    result = {key: value for key, value in data.items() if key not in ('x', 'y')}
+    result.update(cv_fit(data['x'], data['y'], data['area'], temperature))
+    result['c_split'] = area_perimeter(data['area'], data['perimeter'], result['c_ox'],
+                                       _die_groups(data))
+    return result
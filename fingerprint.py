@@ -0,0 +1,164 @@
+"""
+Geometry fingerprints and layout diffs.
+
+A fingerprint hashes the merged, flattened geometry of a cell per layer, so
+it does not depend on shape order, hierarchy or database unit. Two reticle
+builds are compared by fingerprint first; only cells whose fingerprints
+differ are XORed, tile by tile.
+
+Run as a script to keep a golden set of fingerprints for the library; the
+set in tests/golden.json is checked by the test suite:
+    python fingerprint.py write tests/golden.json
+    python fingerprint.py check tests/golden.json
+"""
+
+import hashlib
+import json
+import sys
+
+import pya
+
+import helpers
+import library
+
+# Coordinates are hashed on this grid in um, independent of the layout dbu
+GRID = .001
+
+
+def layer_hashes(layout, cell):
+    """Returns {layer name: sha256 hex digest} of the geometry under cell."""
+    scale = layout.dbu / GRID
+    hashes = {}
+    for layer in layout.layer_indexes():
+        region = pya.Region(cell.begin_shapes_rec(layer))
+        if region.is_empty():
+            continue
+        if scale != 1:
+            region.transform(pya.ICplxTrans(scale))
+        # Merged polygons are normalized, so sorting them gives a canonical form
+        polygons = sorted(str(polygon) for polygon in region.merged().each())
+        digest = hashlib.sha256()
+        for polygon in polygons:
+            digest.update(polygon.encode())
+            digest.update(b';')
+        hashes[str(layout.get_info(layer))] = digest.hexdigest()
+    return hashes
+
+def cell_hash(layout, cell):
+    """Returns one digest over all layers of a cell."""
+    digest = hashlib.sha256()
+    for name, layer_digest in sorted(layer_hashes(layout, cell).items()):
+        digest.update(f'{name}={layer_digest};'.encode())
+    return digest.hexdigest()
+
+def cell_key(cell):
+    """Names a cell stably across builds.
+
+    PCell variants get numbered names like tlm$3 in the order they were
+    created, so they are keyed by PCell name and parameters instead.
+    """
+    if cell.is_pcell_variant():
+        params = {k: str(v) if isinstance(v, pya.LayerInfo) else v
+                  for k, v in cell.pcell_parameters_by_name().items()}
+        return f'{cell.pcell_declaration().name()} {json.dumps(params, sort_keys=True)}'
+    return cell.name
+
+def fingerprints(layout):
+    """Returns {cell key: {layer: digest}} for every cell of a layout."""
+    return {cell_key(cell): layer_hashes(layout, cell) for cell in layout.each_cell()}
+
+
+def tiled_xor(layout_a, cell_a, layout_b, cell_b, layer_info, tile_size=500, threads=4):
+    """XORs one layer of two cells tile by tile.
+
+    Args:
+        tile_size is the tile edge in um
+    Returns:
+        pya.Region of the differences in the dbu of layout_a
+    """
+    result = pya.Region()
+    tp = pya.TilingProcessor()
+    tp.input('a', layout_a, cell_a.cell_index(), layout_a.layer(layer_info))
+    # Bring b onto the database unit of a
+    scale = pya.ICplxTrans(layout_b.dbu / layout_a.dbu)
+    tp.input('b', layout_b, cell_b.cell_index(), layout_b.layer(layer_info), scale)
+    tp.output('o', result)
+    tp.dbu = layout_a.dbu
+    tp.tile_size(tile_size, tile_size)
+    tp.threads = threads
+    tp.queue('_output(o, a ^ b)')
+    tp.execute('EE312 layout diff')
+    return result
+
+def diff_layouts(layout_a, layout_b, tile_size=500, threads=4):
+    """Compares two builds cell by cell.
+
+    Returns:
+        {cell key: result} where result is 'only a', 'only b' or a dict
+        {layer: XOR area in um^2} for cells whose geometry changed.
+        Unchanged cells are left out.
+    """
+    hashes_a = fingerprints(layout_a)
+    hashes_b = fingerprints(layout_b)
+    cells_a = {cell_key(cell): cell for cell in layout_a.each_cell()}
+    cells_b = {cell_key(cell): cell for cell in layout_b.each_cell()}
+
+    diffs = {}
+    for key in sorted(set(hashes_a) | set(hashes_b)):
+        if key not in hashes_b:
+            diffs[key] = 'only a'
+        elif key not in hashes_a:
+            diffs[key] = 'only b'
+        elif hashes_a[key] != hashes_b[key]:
+            layers = {}
+            for name in set(hashes_a[key]) | set(hashes_b[key]):
+                if hashes_a[key].get(name) == hashes_b[key].get(name):
+                    continue
+                xor = tiled_xor(layout_a, cells_a[key], layout_b, cells_b[key],
+                                pya.LayerInfo.from_string(name), tile_size, threads)
+                layers[name] = xor.area() * layout_a.dbu ** 2
+            diffs[key] = layers
+    return diffs
+
+
+def golden_variants():
+    """Yields (label, pcell, params) covering every PCell of the library.
+
+    Each PCell is produced with its defaults and once with every boolean
+    parameter flipped.
+    """
+    for name, pcell in library.PCELLS.items():
+        yield name, name, {}
+        for decl in pcell().get_parameters():
+            if decl.type == pya.PCellParameterDeclaration.TypeBoolean:
+                value = not decl.default
+                yield f'{name}:{decl.name}={value}', name, {decl.name: value}
+
+def golden_hashes():
+    """Returns {label: digest} for golden_variants, at full detail."""
+    library.load()
+    layout = pya.Layout()
+    with helpers.full_detail():
+        return {label: cell_hash(layout, layout.create_cell(pcell, 'EE312', params))
+                for label, pcell, params in golden_variants()}
+
+def check_golden(path):
+    """Returns the labels whose fingerprint differs from the golden file."""
+    with open(path) as f:
+        golden = json.load(f)
+    current = golden_hashes()
+    return sorted(label for label in set(golden) | set(current)
+                  if golden.get(label) != current.get(label))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] not in ('write', 'check'):
+        sys.exit('usage: python fingerprint.py write|check golden.json')
+    if sys.argv[1] == 'write':
+        with open(sys.argv[2], 'w') as f:
+            json.dump(golden_hashes(), f, indent=1, sort_keys=True)
+    else:
+        changed = check_golden(sys.argv[2])
+        for label in changed:
+            print(f'changed: {label}')
+        sys.exit(1 if changed else 0)
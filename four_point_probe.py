@@ -7,6 +7,7 @@ Used for measuring sheet resistance.
 import pya
 import math
 
+import constraints
 import helpers
 
 class four_point_probe(pya.PCellDeclarationHelper):
@@ -34,15 +35,19 @@ class four_point_probe(pya.PCellDeclarationHelper):
     self.param("disp_L", self.TypeBoolean, "Display L?", default=True)
     self.param("disp_W", self.TypeBoolean, "Display W?", default=True)
     self.param("text_h", self.TypeDouble, "Text Height", default = 20)
+    self.param("font", self.TypeString, "Label Font", default="Default",
+               choices=[(font, font) for font in helpers.FONTS])
+    self.param("merge", self.TypeBoolean, "Merge shapes?", default=False)
 
 
   def display_text_impl(self):
     return f'FPP W={self.W} L={self.L}'
   
   def coerce_parameters_impl(self):
-    pass
+    constraints.coerce_pcell(self)
 
   def produce_impl(self):
+    constraints.check_pcell(self)
     dbu = self.layout.dbu
     w = self.W / dbu
     l = self.L / dbu
@@ -86,7 +91,7 @@ class four_point_probe(pya.PCellDeclarationHelper):
           *helpers.center_size_to_points(mir * l / 2, contact_y, contact_box, contact_box)))
     
     # Add contacts
-    if self.resistor_layer != self.metal_layer:
+    if self.resistor_layer != self.metal_layer and not helpers.draft():
       for mir in [-1, 1]:
         self.cell.shapes(self.contact_layer).insert(pya.Box(
             *helpers.center_size_to_points(mir * l / 2, contact_y, contact_size, contact_size)))
@@ -113,12 +118,10 @@ class four_point_probe(pya.PCellDeclarationHelper):
     elif self.disp_W:
         disp_str = f'W={self.W:g}'
     
-    if disp_str:
+    if disp_str and not helpers.draft():
         # Generate klayout region containing text
         # This can only generate with lower left at (0, 0)
-        text_generator = pya.TextGenerator.default_generator()
-        # default height is .7; third argument rescales to desired size
-        text = text_generator.text(disp_str, self.layout.dbu, self.text_h / .7)
+        text = helpers.label(disp_str, self.layout.dbu, self.text_h, self.font)
 
         # Adjust position of region
         bbox = text.bbox()
@@ -129,3 +132,7 @@ class four_point_probe(pya.PCellDeclarationHelper):
 
         # Add region to metal layer
         self.cell.shapes(self.metal_layer).insert (text)
+
+    # Optionally merge each layer into a minimal set of polygons
+    if self.merge:
+        helpers.merge_shapes(self.cell)
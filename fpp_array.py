@@ -0,0 +1,146 @@
+"""
+A row of four point probes sweeping width and measured length.
+
+Used for measuring sheet resistance and linewidth of a whole
+four_point_probe family in one structure. The bars are segments of one
+resistor, so one force current through the two end pads is shared by all
+of them, and each bar only adds its two sense pads: N bars need 2 N + 2
+pads instead of 4 N. Sense taps go up at the start of each bar and down
+at its end, straight to their pads.
+"""
+
+import numpy as np
+import pya
+
+import constraints
+import helpers
+
+class fpp_array(pya.PCellDeclarationHelper):
+
+  def __init__(self):
+    # Important: initialize the super class
+    super(fpp_array, self).__init__()
+    # declare the parameters
+    self.param("resistor", self.TypeLayer, "Layer", default = pya.LayerInfo(1, 0))
+    self.param("contact", self.TypeLayer, "Layer", default = pya.LayerInfo(3, 0))
+    self.param("metal", self.TypeLayer, "Layer", default = pya.LayerInfo(4, 0))
+
+    # One value is used for every bar; otherwise one value per bar
+    self.param("W", self.TypeList, "Structure Widths", default=["1.5", "2", "3", "5", "10"])
+    self.param("L", self.TypeList, "Meas Lengths", default=["200"])
+
+    self.param("pad_w", self.TypeDouble, "Pad Width", default = 150)
+    self.param("pad_h", self.TypeDouble, "Pad Length", default = 100)
+    self.param("pad_dx", self.TypeDouble, "X pad spacing", default=50)
+    self.param("pad_dy", self.TypeDouble, "Y pad spacing", default=50)
+
+    self.param("alignment", self.TypeDouble, "Alignment Accuracy", default = 1)
+    self.param("contact_size", self.TypeDouble, "Contact Size", default = 2)
+    self.param("min_feature", self.TypeDouble, "Min Feature in Resistor Layer", default=1.5)
+
+    self.param("disp_L", self.TypeBoolean, "Display L?", default=True)
+    self.param("disp_W", self.TypeBoolean, "Display W?", default=True)
+    self.param("text_h", self.TypeDouble, "Text Height", default = 20)
+    self.param("font", self.TypeString, "Label Font", default="Default",
+               choices=[(font, font) for font in helpers.FONTS])
+    self.param("merge", self.TypeBoolean, "Merge shapes?", default=False)
+
+
+  def display_text_impl(self):
+    return f'FPP array W={",".join(self.W)} L={",".join(self.L)}'
+
+  def coerce_parameters_impl(self):
+    constraints.coerce_pcell(self)
+
+  def produce_impl(self):
+    constraints.check_pcell(self)
+    dbu = self.layout.dbu
+    w_um, l_um = np.broadcast_arrays(np.array(self.W, dtype=float),
+                                     np.array(self.L, dtype=float))
+    w = w_um / dbu
+    l = l_um / dbu
+    pad_w = self.pad_w / dbu
+    pad_h = self.pad_h / dbu
+    pad_dx = self.pad_dx / dbu
+    pad_dy = self.pad_dy / dbu
+    alignment = self.alignment / dbu
+    contact_size = self.contact_size / dbu
+    min_feature = self.min_feature / dbu
+
+    contact_box = contact_size + 4 * alignment
+    arm = 4 * min_feature
+
+    # Gaps between bars keep neighbouring pads of both rows a pitch apart
+    pitch = pad_w + pad_dx
+    gaps = np.maximum(np.maximum(pitch - l[:-1], pitch - l[1:]), contact_box)
+    starts = np.concatenate([[0], np.cumsum(l[:-1] + gaps)])
+    ends = starts + l
+    end_len = pad_w / 2 + pad_dx + contact_box
+    left = starts[0] - end_len
+    right = ends[-1] + end_len
+    bounds = np.concatenate([[left], ends[:-1] + gaps / 2, [right]])
+
+    # Bars, each from the middle of one gap to the next
+    for x0, x1, bar_w in zip(bounds[:-1], bounds[1:], w):
+      self.cell.shapes(self.resistor_layer).insert(pya.Box(x0, - bar_w / 2, x1, bar_w / 2))
+
+    # Force contact regions and the shared force pads at either end
+    force_h = np.maximum([w[0], w[-1]], contact_box)
+    for x, mir, h in zip([left, right], [-1, 1], force_h):
+      self.cell.shapes(self.resistor_layer).insert(pya.Box(x, - h / 2, x - mir * contact_box, h / 2))
+      self.cell.shapes(self.metal_layer).insert(pya.Box(x + mir * pad_w, - pad_h / 2, x, pad_h / 2))
+      self.cell.shapes(self.metal_layer).insert(pya.Box(x, - h / 2, x - mir * contact_box, h / 2))
+
+    # Sense taps, up at the start of each bar and down at its end
+    pad_y = w.max() / 2 + arm + contact_box + pad_dy
+    for xs, y_dir in [(starts, 1), (ends, -1)]:
+      for x, bar_w in zip(xs, w):
+        self.cell.shapes(self.resistor_layer).insert(pya.Box(
+            x - min_feature / 2, 0, x + min_feature / 2, y_dir * (bar_w / 2 + arm)))
+        self.cell.shapes(self.resistor_layer).insert(pya.Box(
+            x - contact_box / 2, y_dir * (bar_w / 2 + arm),
+            x + contact_box / 2, y_dir * (bar_w / 2 + arm + contact_box)))
+        self.cell.shapes(self.metal_layer).insert(pya.Box(
+            x - contact_box / 2, y_dir * (bar_w / 2 + arm), x + contact_box / 2, y_dir * pad_y))
+        self.cell.shapes(self.metal_layer).insert(pya.Box(
+            x - pad_w / 2, y_dir * pad_y, x + pad_w / 2, y_dir * (pad_y + pad_h)))
+
+    # Add contacts, one per tap and a column at either end
+    if self.resistor_layer != self.metal_layer and not helpers.draft():
+      contact = helpers.contact_cell(self.cell, self.contact_layer, contact_size)
+      for xs, y_dir in [(starts, 1), (ends, -1)]:
+        helpers.insert_arrays(
+            self.cell, contact, np.stack([xs, y_dir * (w / 2 + arm + contact_box / 2)], axis=1),
+            [1] * len(xs), (0, 0))
+      counts = np.maximum(np.floor((force_h - 4 * alignment - contact_size)
+                                   / (2 * contact_size)).astype(int) + 1, 1)
+      helpers.insert_arrays(
+          self.cell, contact,
+          [(left + contact_box / 2, - (counts[0] - 1) * contact_size),
+           (right - contact_box / 2, - (counts[1] - 1) * contact_size)],
+          counts.tolist(), (0, 2 * contact_size))
+
+    # Display text with relevant parameters
+    # Show L, W or both above each upper pad
+    if (self.disp_L or self.disp_W) and not helpers.draft():
+      for x, bar_l, bar_w in zip(starts, l_um, w_um):
+        disp_str = ''
+        if self.disp_L:
+          disp_str += f'L={bar_l:g} '
+        if self.disp_W:
+          disp_str += f'W={bar_w:g} '
+        # Generate klayout region containing text
+        # This can only generate with lower left at (0, 0)
+        text = helpers.label(disp_str[:-1], self.layout.dbu, self.text_h, self.font)
+
+        # Adjust position of region
+        bbox = text.bbox()
+        text_len = (bbox.right - bbox.left)
+        text.move(x - text_len / 2, pad_y + pad_h + .05 * pad_h)
+
+        # Add region to metal layer
+        self.cell.shapes(self.metal_layer).insert (text)
+
+    # Optionally merge each layer into a minimal set of polygons
+    if self.merge:
+      helpers.merge_shapes(self.cell)
@@ -0,0 +1,123 @@
+"""
+Rectangle/trapezoid fracturing for mask writers.
+
+Cuts the flattened layout into horizontal trapezoids (rectangles wherever
+the geometry is Manhattan) on parallel tiles and streams them straight to a
+GDSII file, so memory stays bounded by the tiles in flight. Also reports
+the shot count of every structure so label sizes can be traded against
+write time.
+"""
+
+import math
+
+import pya
+
+from fingerprint import cell_key
+from stream_writer import GdsWriter
+
+
+def _shots(polygon, max_shot):
+    """Shots needed for one trapezoid when a shot is at most max_shot wide."""
+    if not max_shot:
+        return 1
+    box = polygon.bbox()
+    return math.ceil(box.width() / max_shot) * math.ceil(box.height() / max_shot)
+
+
+class _ShotWriter(pya.TileOutputReceiver):
+  """Writes the trapezoids of each finished tile and counts them."""
+
+  def __init__(self, writer, layer_info, max_shot):
+    self.writer = writer
+    self.layer_info = layer_info
+    self.max_shot = max_shot
+    self.trapezoids = 0
+    self.shots = 0
+
+  def put(self, ix, iy, tile, obj, dbu, clip):
+    for polygon in obj.each():
+      self.writer.polygon(self.layer_info.layer, self.layer_info.datatype,
+                          [(p.x, p.y) for p in polygon.each_point_hull()])
+      self.trapezoids += 1
+      self.shots += _shots(polygon, self.max_shot)
+
+
+def fracture_layout(layout, cell, path, layers=None, tile_size=200, threads=4,
+                    max_shot=None, name='FRACTURED'):
+    """Fractures every layer under cell into a flat GDSII file.
+
+    Args:
+        layers are LayerInfos to fracture; defaults to all layers
+        tile_size is the tile edge in um; shapes are cut at tile borders
+        threads is the number of worker threads
+        max_shot is the largest shot edge of the writer in um, used for
+            the shot count only
+    Returns:
+        {layer name: (trapezoids, shots)}
+    """
+    if layers is None:
+        layers = [layout.get_info(li) for li in layout.layer_indexes()]
+    max_shot_dbu = max_shot / layout.dbu if max_shot else None
+
+    counts = {}
+    with GdsWriter(path, layout.dbu) as writer:
+        writer.begin_cell(name)
+        tp = pya.TilingProcessor()
+        tp.dbu = layout.dbu
+        tp.tile_size(tile_size, tile_size)
+        tp.threads = threads
+        receivers = []
+        for ii, info in enumerate(layers):
+            receiver = _ShotWriter(writer, info, max_shot_dbu)
+            receivers.append(receiver)
+            tp.input(f'i{ii}', layout, cell.cell_index(), layout.layer(info))
+            tp.output(f'o{ii}', receiver)
+            # 1 is Polygon.TD_htrapezoids
+            tp.queue(f'_output(o{ii}, (_tile ? i{ii} & _tile.bbox : i{ii}).decompose_trapezoids_to_region(1))')
+        tp.execute('EE312 fracture')
+        writer.end_cell()
+
+    for info, receiver in zip(layers, receivers):
+        counts[str(info)] = (receiver.trapezoids, receiver.shots)
+    return counts
+
+
+def instance_counts(layout, cell):
+    """Returns {cell index: number of placements} below cell, arrays expanded."""
+    counts = {cell.cell_index(): 1}
+    for ci in layout.each_cell_top_down():
+        if ci not in counts:
+            continue
+        for inst in layout.cell(ci).each_inst():
+            counts[inst.cell_index] = counts.get(inst.cell_index, 0) + counts[ci] * inst.size()
+    return counts
+
+def shot_report(layout, cell, max_shot=None):
+    """Counts the shots each structure adds to the mask.
+
+    Every PCell variant below cell is fractured once and multiplied by the
+    number of times it is placed.
+
+    Returns:
+        {structure key: dict of instances, trapezoids (per instance),
+        shots (per instance) and total_shots}
+    """
+    max_shot_dbu = max_shot / layout.dbu if max_shot else None
+    report = {}
+    for ci, count in instance_counts(layout, cell).items():
+        structure = layout.cell(ci)
+        if not structure.is_pcell_variant():
+            continue
+        trapezoids = 0
+        shots = 0
+        for li in layout.layer_indexes():
+            region = pya.Region(structure.begin_shapes_rec(li)).merged()
+            for polygon in region.decompose_trapezoids_to_region(pya.Polygon.TD_htrapezoids).each():
+                trapezoids += 1
+                shots += _shots(polygon, max_shot_dbu)
+        key = cell_key(structure)
+        entry = report.setdefault(key, {'instances': 0, 'trapezoids': trapezoids,
+                                        'shots': shots, 'total_shots': 0})
+        entry['instances'] += count
+        entry['total_shots'] += count * shots
+    return report
@@ -5,8 +5,29 @@ A good ol fashioned transistor.
 import pya
 import math
 
+import constraints
 import helpers
 
+def site_name(col, row):
+    """Returns the label of a grid site, e.g. (0, 0) -> 'A1'.
+
+    Columns past Z continue spreadsheet style with AA, AB, ...
+    """
+    letters = ''
+    col += 1
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return f'{letters}{row + 1}'
+
+def parse_site_name(name):
+    """Inverse of site_name; returns (col, row)."""
+    letters = name.rstrip('0123456789')
+    col = 0
+    for letter in letters.upper():
+        col = col * 26 + ord(letter) - 64
+    return col - 1, int(name[len(letters):]) - 1
+
 class grid_labels(pya.PCellDeclarationHelper):
 
   def __init__(self):
@@ -16,6 +37,8 @@ class grid_labels(pya.PCellDeclarationHelper):
     self.param("l", self.TypeLayer, "Layer", default = pya.LayerInfo(1, 0))
 
     self.param("text_h", self.TypeDouble, "Text Height", default=20)
+    self.param("font", self.TypeString, "Label Font", default="Default",
+               choices=[(font, font) for font in helpers.FONTS])
 
     self.param("dx", self.TypeDouble, "X Spacing", default = 100)
     self.param("dy", self.TypeDouble, "Y Spacing", default = 100)
@@ -27,22 +50,24 @@ class grid_labels(pya.PCellDeclarationHelper):
     return f'Grid Labels'
   
   def coerce_parameters_impl(self):
-    pass
+    constraints.coerce_pcell(self)
 
   def produce_impl(self):
+    constraints.check_pcell(self)
     dbu = self.layout.dbu
 
     # Generate klayout region containing text
     # This can only generate with lower left at (0, 0)
-    text_generator = pya.TextGenerator.default_generator()
-    # default height is .7; rescale to um
-    text_h = self.text_h / .7
-
+    # Draft mode shows each label as its bounding box, without the text
     texts = []
     for ii in range(self.x_num):
         texts.append([])
         for jj in range(self.y_num):
-            texts[-1].append(text_generator.text(f'{ chr(65 + ii) }{jj + 1}', dbu, text_h))
+            if helpers.draft():
+                texts[-1].append(pya.Region(helpers.label_box(
+                    site_name(ii, jj), dbu, self.text_h, self.font)))
+            else:
+                texts[-1].append(helpers.label(site_name(ii, jj), dbu, self.text_h, self.font))
             texts[-1][-1].move(ii * self.dx / dbu, - jj * self.dy / dbu)
 
     x_shift = - (texts[0][0].bbox().left + texts[-1][0].bbox().right) / 2
@@ -51,4 +76,7 @@ class grid_labels(pya.PCellDeclarationHelper):
     for ii in range(self.x_num):
         for jj in range(self.y_num):
             texts[ii][jj].move(x_shift, y_shift)
-            self.cell.shapes(self.l_layer).insert(texts[ii][jj])
+            if helpers.draft():
+                self.cell.shapes(self.l_layer).insert(texts[ii][jj].bbox())
+            else:
+                self.cell.shapes(self.l_layer).insert(texts[ii][jj])
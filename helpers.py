@@ -1,5 +1,16 @@
+import contextlib
+
 import pya
 
+import stroke_font
+
+# Library wide level of detail. In draft mode the PCells leave out contact
+# arrays and text labels so large layouts stay responsive while editing.
+_draft = False
+
+# Label fonts selectable by the font parameter of the PCells
+FONTS = ('Default', 'Stroke')
+
 def tuples_to_polygon(points: list, shift=(0, 0)):
     """Converts an iterable of tuples to polygon object.
     
@@ -13,3 +24,159 @@ def center_size_to_points(center_x, center_y, width, length):
     """Convert center and size to lower left/upper right coords."""
     return (center_x - width / 2, center_y - length / 2,
             center_x + width / 2, center_y + length / 2)
+
+def label(string, dbu, text_h, font='Default'):
+    """Generates a text label as a region with its lower left at (0, 0).
+
+    text_h is the character height in um. 'Stroke' uses the Manhattan
+    font of stroke_font, which has about half the vertices and trapezoids
+    of the KLayout default font.
+    """
+    if font == 'Stroke':
+        return stroke_font.text(string, dbu, text_h)
+    text_generator = pya.TextGenerator.default_generator()
+    # default height is .7; third argument rescales to desired size
+    return text_generator.text(string, dbu, text_h / .7)
+
+def label_box(string, dbu, text_h, font='Default'):
+    """Returns the box of a label with its lower left at (0, 0).
+
+    The box is computed from the character cells of the font without
+    generating the text, for draft mode; a narrow last glyph may end
+    inside it.
+    """
+    if font == 'Stroke':
+        scale = text_h / stroke_font.HEIGHT / dbu
+        return pya.Box(0, 0, round((len(string) * stroke_font.ADVANCE - 1) * scale),
+                       round(text_h / dbu))
+    # Default glyphs are .5 wide on a .6 advance and .7 high
+    return pya.Box(0, 0, round((.6 * len(string) - .1) * text_h / .7 / dbu), round(text_h / dbu))
+
+def merge_shapes(cell, layers=None, rectangles=False):
+    """Merges each layer of a cell into non-overlapping polygons.
+
+    Args:
+        layers are the layer indexes to merge; defaults to all layers
+        rectangles further cuts the merged polygons into horizontal
+            rectangles (trapezoids where edges are not Manhattan)
+
+    Merged polygons which are rectangles are inserted as boxes.
+    """
+    layout = cell.layout()
+    for layer in layers or layout.layer_indexes():
+        shapes = cell.shapes(layer)
+        if shapes.is_empty():
+            continue
+        region = pya.Region(shapes)
+        region.merge()
+        if rectangles:
+            region = region.decompose_trapezoids_to_region(pya.Polygon.TD_htrapezoids)
+        shapes.clear()
+        # Rectangles stay boxes, which pad and link lookups rely on
+        for polygon in region.each():
+            shapes.insert(polygon.bbox() if polygon.is_box() else polygon)
+
+def merge_layout(layout, rectangles=False):
+    """Runs merge_shapes once on every cell of a layout.
+
+    Every cell is merged once no matter how often it is placed, so a whole
+    reticle costs as much as its distinct cells. Meant for layouts about
+    to be written; PCells produced again afterwards are not merged.
+    """
+    for cell in layout.each_cell():
+        merge_shapes(cell, rectangles=rectangles)
+
+def contact_cell(cell, layer, size):
+    """Returns the index of a cell holding one contact centered at (0, 0).
+
+    The contact cell belongs to cell, a PCell variant being produced, so
+    its contacts can be instance arrays. It is not shared between variants:
+    library variants are copied into layouts one by one, and a child shared
+    between them is mapped to only one of them.
+
+    Args:
+        layer is the layer index
+        size is the contact edge in dbu
+    """
+    layout = cell.layout()
+    info = layout.get_info(layer)
+    name = f'{cell.name}_CONTACT_{info.layer}_{info.datatype}_{round(size)}'
+    contact = layout.cell(name)
+    if contact is None:
+        contact = layout.create_cell(name)
+    contact.clear()
+    contact.shapes(layer).insert(pya.Box(
+        *center_size_to_points(0, 0, round(size), round(size))))
+    return contact.cell_index()
+
+def insert_arrays(cell, cell_index, starts, counts, step):
+    """Places rows of a cell with as few instance arrays as possible.
+
+    Row k has counts[k] copies, the first at starts[k] and the rest step
+    apart. Consecutive rows of equal count and evenly spaced starts become
+    one two dimensional array.
+
+    Args:
+        starts are (x, y) in dbu
+        step is the (dx, dy) within a row in dbu
+    Returns:
+        the number of arrays inserted
+    """
+    starts = [(round(x), round(y)) for x, y in starts]
+    a = pya.Vector(round(step[0]), round(step[1]))
+    arrays = 0
+    k = 0
+    while k < len(starts):
+        j = k + 1
+        if j < len(starts) and counts[j] == counts[k]:
+            delta = (starts[j][0] - starts[k][0], starts[j][1] - starts[k][1])
+            while j < len(starts) and counts[j] == counts[k] and \
+                    (starts[j][0] - starts[j - 1][0], starts[j][1] - starts[j - 1][1]) == delta:
+                j += 1
+        else:
+            delta = (0, 0)
+        if counts[k] > 0:
+            cell.insert(pya.CellInstArray(
+                cell_index, pya.Trans(*starts[k]), a, pya.Vector(*delta), counts[k], j - k))
+            arrays += 1
+        k = j
+    return arrays
+
+def draft():
+    """True while PCells should produce simplified geometry."""
+    return _draft
+
+def set_draft(enabled):
+    """Switches draft mode and re-produces all EE312 cells in use."""
+    global _draft
+    if bool(enabled) != _draft:
+        _draft = bool(enabled)
+        lib = pya.Library.library_by_name("EE312")
+        if lib is not None:
+            lib.refresh()
+
+@contextlib.contextmanager
+def full_detail(*layouts):
+    """Produces full detail inside the block, then restores draft mode.
+
+    Library proxies are only produced again when a layout is next
+    updated, so the given layouts are updated on entry and on exit.
+    """
+    was_draft = _draft
+    set_draft(False)
+    for layout in layouts:
+        layout.update()
+    try:
+        yield
+    finally:
+        set_draft(was_draft)
+        for layout in layouts:
+            layout.update()
+
+def write_layout(layout, path, options=None):
+    """Writes a layout with full detail regardless of draft mode."""
+    with full_detail(layout):
+        if options is None:
+            layout.write(path)
+        else:
+            layout.write(path, options)
@@ -0,0 +1,159 @@
+"""
+Hot reload of edited PCell modules.
+
+The PCell modules are imported once when the library is registered, so
+edits to them normally need a restart. A Watcher compares the file times
+of the modules behind library.PCELLS, reloads the edited ones, registers
+their new declarations and re-produces only the library variants of those
+PCells. Layouts then pull the new geometry into their proxies of exactly
+these variants; every other cell keeps what it already has.
+
+Editing a module shared by all PCells (helpers, constraints, stroke_font)
+reloads and re-produces every PCell.
+"""
+
+import importlib
+import os
+import sys
+import time
+
+import pya
+
+import helpers
+import library
+
+# Modules imported by every PCell, in the order they import each other
+SHARED = ('stroke_font', 'helpers', 'constraints')
+
+
+def pcell_modules():
+    """Maps module names to the names of the PCells they define."""
+    modules = {}
+    for name, pcell in library.PCELLS.items():
+        modules.setdefault(pcell.__module__, []).append(name)
+    return modules
+
+def stamps():
+    """Returns the modification time of every shared and PCell module."""
+    result = {}
+    for module in list(SHARED) + list(pcell_modules()):
+        path = getattr(sys.modules.get(module), '__file__', None)
+        if path is not None and os.path.exists(path):
+            result[module] = os.stat(path).st_mtime_ns
+    return result
+
+def open_layouts():
+    """Returns the layouts shown in the main window, if there is one."""
+    app = pya.Application.instance()
+    main_window = app.main_window() if app is not None else None
+    if main_window is None:
+        return []
+    layouts = []
+    for ii in range(main_window.views()):
+        view = main_window.view(ii)
+        for jj in range(view.cellviews()):
+            layouts.append(view.cellview(jj).layout())
+    return layouts
+
+def reproduce(names, layouts=None):
+    """Produces the library variants of PCells again and updates layouts.
+
+    Variants are produced in place with the declaration now registered, so
+    their cell indexes and every proxy pointing at them stay valid.
+
+    Args:
+        names are the PCell names
+        layouts are the layouts to update; defaults to the open layouts
+    Returns:
+        the number of variants produced
+    """
+    lib = library.load()
+    lib_layout = lib.layout()
+    produced = set()
+    for name in names:
+        declaration = lib_layout.pcell_declaration(name)
+        pcell_id = lib_layout.pcell_id(name)
+        for cell in [cell for cell in lib_layout.each_cell()
+                     if cell.is_pcell_variant() and cell.pcell_id() == pcell_id]:
+            params = cell.pcell_parameters()
+            layers = [lib_layout.layer(info) for info in declaration.get_layers(params)]
+            cell.clear()
+            declaration.produce(lib_layout, layers, params, cell)
+            produced.add(cell.cell_index())
+    for layout in open_layouts() if layouts is None else layouts:
+        for cell in layout.each_cell():
+            if (cell.is_library_cell() and cell.library().name() == lib.name()
+                    and cell.library_cell_index() in produced):
+                cell.refresh()
+    return len(produced)
+
+def reload(modules, layouts=None):
+    """Reloads modules and re-produces the PCells defined in them.
+
+    Args:
+        modules are module names; a shared module reloads every PCell
+        layouts are as for reproduce
+    Returns:
+        the names of the PCells produced again
+    """
+    by_module = pcell_modules()
+    shared = [module for module in SHARED if module in modules]
+    if shared:
+        # Draft mode lives in helpers and would be reset by the reload
+        draft = helpers.draft()
+        for module in shared:
+            importlib.reload(sys.modules[module])
+        helpers._draft = draft
+        modules = list(by_module)
+    names = []
+    lib_layout = library.load().layout()
+    for module in modules:
+        if module not in by_module:
+            continue
+        reloaded = importlib.reload(sys.modules[module])
+        for name in by_module[module]:
+            pcell = getattr(reloaded, library.PCELLS[name].__name__)
+            library.PCELLS[name] = pcell
+            lib_layout.register_pcell(name, pcell())
+            names.append(name)
+    reproduce(names, layouts)
+    return names
+
+
+class Watcher:
+  """Reloads PCell modules whose files changed since the last poll."""
+
+  def __init__(self, layouts=None):
+    self.layouts = layouts
+    self.stamps = stamps()
+
+  def poll(self):
+    """Reloads the edited modules.
+
+    A module failing to import is reported and tried again once its
+    file changes again; the PCells keep their previous declarations.
+
+    Returns:
+      the names of the PCells produced again
+    """
+    current = stamps()
+    edited = [module for module, stamp in current.items() if self.stamps.get(module) != stamp]
+    self.stamps = current
+    if not edited:
+      return []
+    try:
+      return reload(edited, self.layouts)
+    except Exception as error:
+      print(f'EE312 reload of {", ".join(edited)} failed: {error!r}')
+      return []
+
+  def watch(self, interval=.5):
+    """Polls until interrupted, for scripts outside the GUI."""
+    try:
+      while True:
+        names = self.poll()
+        if names:
+          print(f'EE312 reloaded {", ".join(names)}')
+        time.sleep(interval)
+    except KeyboardInterrupt:
+      pass
@@ -0,0 +1,180 @@
+"""
+Inventory and bulk re-parameterization of EE312 instances in a layout.
+
+A layout written with EE312 PCells keeps each variant's library and
+parameters as PCell context information. The inventory reads a GDS or
+OASIS file with an empty layer map, so the file's shapes are skipped and
+only the hierarchy and that context are loaded, and lists every variant
+and every placement of it.
+
+Bulk edits read the whole file, re-produce only the variants whose
+parameters change and point their instances at the new variants.
+"""
+
+import json
+
+import numpy as np
+import pya
+
+import constraints
+import library
+
+
+def read(path, shapes=True):
+    """Reads a layout with the EE312 library registered.
+
+    Args:
+        shapes loads the shapes of the file; without them only cells,
+            instances and PCell context are read
+    """
+    library.load()
+    layout = pya.Layout()
+    options = pya.LoadLayoutOptions()
+    if not shapes:
+        options.layer_map = pya.LayerMap()
+        options.create_other_layers = False
+    layout.read(path, options)
+    return layout
+
+def variants(layout):
+    """Returns the EE312 PCell variant cells of a layout."""
+    return [cell for cell in layout.each_cell()
+            if cell.is_pcell_variant() and cell.is_library_cell()
+            and cell.library().name() == 'EE312']
+
+def _top(layout, top):
+    if top is not None:
+        return layout.cell(top)
+    tops = list(layout.each_top_cell())
+    if len(tops) != 1:
+        raise ValueError('the layout has several top cells, pass one')
+    return layout.cell(tops[0])
+
+def inventory(path, top=None):
+    """Lists the EE312 instances below the top cell of a layout file.
+
+    Array instances are expanded.
+
+    Args:
+        top is the name of the cell to start from; defaults to the only
+            top cell
+    Returns:
+        list of variant dicts (cell, pcell, params, count), and a dict of
+        per placement arrays: variant (index into the list), x, y (um),
+        rotation (degrees), mirror and magnification
+    """
+    layout = read(path, shapes=False)
+    cells = variants(layout)
+    index = {cell.cell_index(): ii for ii, cell in enumerate(cells)}
+    found = {key: [] for key in ('variant', 'x', 'y', 'rotation', 'mirror', 'magnification')}
+    it = _top(layout, top).begin_instances_rec()
+    it.targets = list(index)
+    # PCells are not searched for nested PCells
+    it.unselect_cells(list(index))
+    while not it.at_end():
+        trans = it.dtrans() * it.inst_dtrans()
+        found['variant'].append(index[it.inst_cell().cell_index()])
+        found['x'].append(trans.disp.x)
+        found['y'].append(trans.disp.y)
+        found['rotation'].append(trans.angle)
+        found['mirror'].append(trans.is_mirror())
+        found['magnification'].append(trans.mag)
+        it.next()
+    placements = {key: np.array(values, dtype=bool if key == 'mirror' else
+                                np.int64 if key == 'variant' else float)
+                  for key, values in found.items()}
+    counts = np.bincount(placements['variant'], minlength=len(cells))
+    result = [{'cell': cell.name, 'pcell': cell.pcell_declaration().name(),
+               'params': cell.pcell_parameters_by_name(), 'count': int(count)}
+              for cell, count in zip(cells, counts)]
+    layout._destroy()
+    return result, placements
+
+def write_spec(path, layout_path, top=None):
+    """Writes the inventory of a layout file as a JSON Lines spec.
+
+    Rows hold every parameter and the placement origin, so spec_loader
+    can rebuild the structures; rotation and mirroring are not part of a
+    spec and are left out.
+
+    Returns:
+        the number of rows
+    """
+    found, placements = inventory(layout_path, top)
+    params = [{name: str(value) if isinstance(value, pya.LayerInfo) else value
+               for name, value in variant['params'].items()}
+              for variant in found]
+    with open(path, 'w') as f:
+        for k, x, y in zip(placements['variant'], placements['x'], placements['y']):
+            f.write(json.dumps({'pcell': found[k]['pcell'], 'x': float(x), 'y': float(y),
+                                **params[k]}) + '\n')
+    return len(placements['variant'])
+
+def edit(path, output, changes, pcell=None, where=None, fix=False, top=None):
+    """Changes parameters of EE312 instances and writes the layout.
+
+    Every variant matching pcell and where gets the changed parameters;
+    variants whose parameters end up unchanged are left alone, so only
+    the touched variants are produced.
+
+    Args:
+        changes maps parameter names to new values, or to functions
+            taking the old parameters and returning the new value
+        pcell restricts the edit to one PCell
+        where is a function of the parameters selecting variants
+        fix applies the automatic corrections of constraints
+        top limits the edit to instances below this cell; variants used
+            elsewhere as well are split
+    Returns:
+        list of (old cell name, new cell name) of re-produced variants
+    Raises:
+        KeyError if changes name a parameter that none of the PCells
+            considered has
+        ValueError if new parameters violate the constraints
+    """
+    layout = read(path)
+    lib = library.load()
+    pcells = {pcell} if pcell is not None else \
+        {cell.pcell_declaration().name() for cell in variants(layout)}
+    known = {key for name in pcells for key in constraints.defaults(name)}
+    unknown = sorted(set(changes) - known)
+    if unknown:
+        raise KeyError(f'no parameter {", ".join(unknown)} in {", ".join(sorted(pcells))}')
+    below = None
+    if top is not None:
+        below = set(layout.cell(top).called_cells()) | {layout.cell(top).cell_index()}
+    # Every target is computed from the parameters as read and every
+    # instance to move is taken before any is moved, so an instance moved
+    # into a variant that is edited itself is not edited again
+    plan = []
+    for cell in variants(layout):
+        name = cell.pcell_declaration().name()
+        params = cell.pcell_parameters_by_name()
+        if (pcell is not None and name != pcell) or (where is not None and not where(params)):
+            continue
+        new = dict(params)
+        for key, value in changes.items():
+            if key in params:
+                new[key] = value(params) if callable(value) else value
+        if fix:
+            new = constraints.coerce(name, new)
+        if new == params:
+            continue
+        errors = constraints.check(name, new)
+        if errors:
+            raise ValueError(f'{cell.name}: ' + '; '.join(errors))
+        insts = [inst for inst in cell.each_parent_inst()
+                 if below is None or inst.parent_cell_index() in below]
+        plan.append((cell, name, new, [inst.child_inst() for inst in insts]))
+
+    edited = []
+    for cell, name, new, insts in plan:
+        target = layout.create_cell(name, lib.name(), new)
+        for inst in insts:
+            inst.cell_index = target.cell_index()
+        edited.append((cell.name, target.name))
+    for cell, _, _, _ in plan:
+        if cell.parent_cells() == 0:
+            cell.delete()
+    layout.write(output)
+    return edited
@@ -0,0 +1,195 @@
+"""
+Lead resistance of produced structures.
+
+The lead of a terminal is the metal connected to its probe pad, without
+the pad itself and without the metal over the device layers (the
+semiconductor, resistor, active or gate layers, wherever a PCell has
+them). Its squares are its resistance between the pad edge and the edges
+where current leaves into the device or a contact, solved on a grid, so
+stubs and slivers off the route do not count. Square counts are
+measured once per structure variant; resistances and flags for whole
+DOE sweeps are then numpy arithmetic.
+"""
+
+import math
+
+import numpy as np
+import pya
+
+import helpers
+from site_index import find_pads
+from thumbnails import scanline_fill, trapezoids
+from wafer_map import produce
+
+# Layer parameters carrying routing; every other layer, contacts
+# included, ends the lead
+METALS = ('metal', 'p_metal')
+
+
+def _raster(region, box, pitch, shape):
+    """Samples a region at the centers of a grid of pitch x pitch cells."""
+    return scanline_fill(trapezoids(region & pya.Region(box)), box.left, box.top, 1 / pitch, shape)
+
+def squares(lead, source, sink, across=16, max_cells=250000, tolerance=1e-6):
+    """Counts the squares of a lead from its pad to the device.
+
+    The lead is rasterized and its resistance between the edges touching
+    source and sink is solved on the grid, so only the metal that carries
+    current counts: stubs and slivers off the route add nothing, and
+    parallel parts of a route conduct in parallel.
+
+    Args:
+        lead, source, sink are pya.Regions in dbu; the lead touches source
+            (the pad) and sink (the device) along its edges
+        across is the number of grid cells across the typical width of the
+            lead, taken as twice its area over its perimeter; the grid is
+            coarsened to at most max_cells cells
+    Returns:
+        the resistance in squares, 0 for an empty lead and NaN for a lead
+        not connecting source and sink
+    """
+    if lead.is_empty():
+        return 0.
+    box = lead.bbox()
+    pitch = max(2 * lead.area() / lead.perimeter() / across,
+                math.sqrt(box.width() * box.height() / max_cells), 1)
+    # One cell of margin for the pad and device around the lead
+    ny = int(math.ceil(box.height() / pitch)) + 2
+    nx = int(math.ceil(box.width() / pitch)) + 2
+    frame = pya.Box(round(box.left - pitch), round(box.top + pitch - ny * pitch),
+                    round(box.left - pitch + nx * pitch), round(box.top + pitch))
+    metal = _raster(lead, frame, pitch, (ny, nx))
+    high = _raster(source, frame, pitch, (ny, nx)) & ~metal
+    low = _raster(sink, frame, pitch, (ny, nx)) & ~metal & ~high
+
+    # Conductance between neighbouring cells is 1, and 2 to a fixed cell,
+    # whose potential sits on the shared edge
+    def neighbours(mask):
+        padded = np.pad(mask, 1)
+        return [padded[1:-1, :-2], padded[1:-1, 2:], padded[:-2, 1:-1], padded[2:, 1:-1]]
+    to_metal = neighbours(metal)
+    diagonal = metal * (sum(to_metal) + 2 * sum(neighbours(high)) + 2 * sum(neighbours(low)))
+    rhs = metal * 2. * sum(neighbours(high))
+    if not (metal & (sum(neighbours(high)) > 0)).any() or not (metal & (sum(neighbours(low)) > 0)).any():
+        return math.nan
+
+    def apply(v):
+        padded = np.pad(v, 1)
+        around = padded[1:-1, :-2] + padded[1:-1, 2:] + padded[:-2, 1:-1] + padded[2:, 1:-1]
+        return metal * (diagonal * v - around)
+
+    # Conjugate gradients; cells cut off from both edges stay at 0
+    inverse = np.where(diagonal > 0, 1 / np.maximum(diagonal, 1), 0)
+    v = np.zeros((ny, nx))
+    r = rhs.copy()
+    z = inverse * r
+    p = z.copy()
+    rz = (r * z).sum()
+    limit = tolerance ** 2 * (rhs * rhs).sum()
+    for _ in range(20 * (nx + ny)):
+        if (r * r).sum() <= limit:
+            break
+        ap = apply(p)
+        alpha = rz / (p * ap).sum()
+        v += alpha * p
+        r -= alpha * ap
+        z = inverse * r
+        rz, rz_old = (r * z).sum(), rz
+        p = z + rz / rz_old * p
+    current = (metal * 2 * sum(neighbours(high)) * (1 - v)).sum()
+    return 1 / current if current > 0 else math.nan
+
+def terminal_squares(cell):
+    """Measures the lead of every probe pad of a produced structure.
+
+    Returns:
+        list of (pad name, metal parameter name, squares) in pad order;
+        pads on no metal layer are left out
+    """
+    layout = cell.layout()
+    params = cell.pcell_parameters_by_name()
+    layers = {name: value for name, value in params.items() if isinstance(value, pya.LayerInfo)}
+    # Current leaves the lead into the device layers or through contacts
+    device = pya.Region()
+    for name, info in layers.items():
+        if name not in METALS:
+            device += pya.Region(cell.begin_shapes_rec(layout.layer(info)))
+    device.merge()
+    metals = {name: pya.Region(cell.begin_shapes_rec(layout.layer(layers[name]))).merged()
+              for name in METALS if name in layers}
+
+    result = []
+    for no, pad in enumerate(find_pads(cell, params['pad_w'], params['pad_h'])):
+        pad_region = pya.Region(pad)
+        for name, metal in metals.items():
+            if not (pad_region - metal).is_empty():
+                continue
+            lead = metal.interacting(pad_region) - pad_region - device
+            # Only the part still connected to the pad is the lead
+            lead = lead.merged().interacting(pad_region.sized(1))
+            result.append((f'P{no + 1}', name, squares(lead, pad_region, device)))
+            break
+    return result
+
+def lead_table(structures, dbu=.001):
+    """Measures the leads of every structure of a sweep.
+
+    Each distinct (pcell, params) is produced once at full detail.
+
+    Args:
+        structures is an iterable of (pcell, params), for example the
+            placements of a spec without x and y
+    Returns:
+        dict with 'pcell' (list per structure), 'terminals' (list of pad
+        names per structure) and per structure arrays, padded with NaN or
+        '' to the most pads: 'squares' and 'metal' (the metal parameter
+        name)
+    """
+    structures = list(structures)
+    measured = {}
+    keys = []
+    with helpers.full_detail():
+        for pcell, params in structures:
+            key = (pcell, repr(sorted(params.items())))
+            keys.append(key)
+            if key in measured:
+                continue
+            scratch = pya.Layout()
+            scratch.dbu = dbu
+            measured[key] = terminal_squares(produce(scratch, pcell, params))
+            scratch._destroy()
+    width = max((len(terminals) for terminals in measured.values()), default=0)
+    table = {'pcell': [pcell for pcell, _ in structures],
+             'terminals': [[pad for pad, _, _ in measured[key]] for key in keys],
+             'squares': np.full((len(keys), width), np.nan),
+             'metal': np.full((len(keys), width), '', dtype=object)}
+    for ii, key in enumerate(keys):
+        for jj, (_, metal, count) in enumerate(measured[key]):
+            table['squares'][ii, jj] = count
+            table['metal'][ii, jj] = metal
+    return table
+
+def resistance(table, sheet):
+    """Lead resistance per terminal in ohm.
+
+    Args:
+        sheet maps metal parameter names to sheet resistance in ohm/sq
+    """
+    rsh = np.zeros(table['metal'].shape)
+    for name, value in sheet.items():
+        rsh[table['metal'] == name] = value
+    return table['squares'] * rsh
+
+def flag(table, sheet, expected, fraction=.1):
+    """Marks structures whose worst lead exceeds a fraction of the device.
+
+    Args:
+        expected is the expected device resistance in ohm, one value or
+            one per structure
+    Returns:
+        bool array per structure, and the worst lead resistance
+    """
+    worst = np.nanmax(np.where(np.isnan(table['squares']), - np.inf,
+                               resistance(table, sheet)), axis=1, initial=- np.inf)
+    worst = np.where(np.isfinite(worst), worst, np.nan)
+    return worst > fraction * np.asarray(expected, dtype=float), worst
@@ -0,0 +1,66 @@
+"""
+The EE312 PCell library.
+
+EE312.lym registers the library from here so scripts running outside the
+GUI can build the same library.
+"""
+
+import pya
+
+from transistor import transistor
+from vernier import vernier
+from four_point_probe import four_point_probe
+from cbkr import cbkr
+from ono_contact import ono_contact
+from contact_chain import contact_chain
+from tlm import tlm
+from six_p_tlm import six_p_tlm
+from tlm_array import tlm_array
+from fpp_array import fpp_array
+from vdp import vdp
+from diode import diode
+from min_feature_optic import min_feature_optic
+from min_feature_electrical import min_feature_electrical
+from min_feature_optic_step import min_feature_optic_step
+from grid_labels import grid_labels
+
+# PCell classes by the name they are registered under
+PCELLS = {
+    "transistor": transistor,
+    "vernier": vernier,
+    "four_point_probe": four_point_probe,
+    "cbkr": cbkr,
+    "ono_contact": ono_contact,
+    "contact_chain": contact_chain,
+    "tlm": tlm,
+    "six_p_tlm": six_p_tlm,
+    "tlm_array": tlm_array,
+    "fpp_array": fpp_array,
+    "vdp": vdp,
+    "diode": diode,
+    "min_feature_optic": min_feature_optic,
+    "min_feature_optic_step": min_feature_optic_step,
+    "min_feature_electrical": min_feature_electrical,
+    "grid_labels": grid_labels,
+}
+
+class EE312(pya.Library):
+
+  def __init__(self):
+
+    # Set the description
+    self.description = "Test Structures for EE312"
+
+    # Create the PCell declarations
+    for name, pcell in PCELLS.items():
+      self.layout().register_pcell(name, pcell())
+
+    # If a library with that name already existed, it will be replaced then.
+    self.register("EE312")
+
+def load():
+    """Returns the registered EE312 library, registering it if needed."""
+    lib = pya.Library.library_by_name("EE312")
+    if lib is None:
+        lib = EE312()
+    return lib
@@ -0,0 +1,166 @@
+"""
+Windowed layer density and dummy fill.
+
+Density is measured per window over the reticle with a TilingProcessor.
+Windows below a minimum density get dummy tiles on a global grid, kept
+clear of every existing shape and, with a wider margin, of the probe pads
+of the EE312 structures. Each run of fill tiles is one instance array of a
+single tile cell, so the fill adds very little to the file size.
+"""
+
+import numpy as np
+import pya
+
+from site_index import SiteIndex
+
+
+class _Windows(pya.TileOutputReceiver):
+  """Collects one output per tile by tile index."""
+
+  def __init__(self):
+    self.values = {}
+
+  def put(self, ix, iy, tile, obj, dbu, clip):
+    self.values[(ix, iy)] = obj
+
+
+class _FillArrays(pya.TileOutputReceiver):
+  """Turns the allowed tile corners of each window into array parameters.
+
+  Arrays are kept as (x, y, nx, ny) in dbu and inserted after the run, as
+  the layout is still being read while tiles come in.
+  """
+
+  def __init__(self, origin, pitch):
+    self.origin = origin
+    self.pitch = pitch
+    self.arrays = []
+
+  def put(self, ix, iy, tile, obj, dbu, clip):
+    origin, pitch = self.origin, self.pitch
+    for polygon in obj.merged().decompose_trapezoids_to_region(
+        pya.Polygon.TD_htrapezoids).each():
+      if not polygon.is_box():
+        continue
+      box = polygon.bbox()
+      # Grid points with left <= x < right, bottom <= y < top
+      x0 = origin.x - ((origin.x - box.left) // pitch) * pitch
+      y0 = origin.y - ((origin.y - box.bottom) // pitch) * pitch
+      nx = - ((x0 - box.right) // pitch)
+      ny = - ((y0 - box.top) // pitch)
+      if nx > 0 and ny > 0:
+        self.arrays.append((x0, y0, nx, ny))
+
+
+def _grid(values):
+    """Arranges per tile values as a [iy, ix] array, iy from the bottom."""
+    if not values:
+        return np.zeros((0, 0))
+    nx = max(ix for ix, _ in values) + 1
+    ny = max(iy for _, iy in values) + 1
+    grid = np.full((ny, nx), np.nan)
+    for (ix, iy), value in values.items():
+        grid[iy, ix] = value
+    return grid
+
+def _processor(layout, cell, frame, window, threads):
+    dbu = layout.dbu
+    if frame is None:
+        frame = cell.dbbox()
+    tp = pya.TilingProcessor()
+    tp.dbu = dbu
+    tp.tile_size(window, window)
+    tp.tile_origin(frame.left, frame.bottom)
+    tp.frame = frame
+    tp.threads = threads
+    tp.var('frame', frame.to_itype(dbu))
+    return tp
+
+def density(layout, cell, layer_info, window=100, frame=None, threads=4):
+    """Measures the density of a layer per window.
+
+    Args:
+        window is the window edge in um
+        frame is the area to measure as a pya.DBox in um; defaults to the
+            bounding box of cell; windows at its right and top edge are
+            cut to it
+    Returns:
+        array of densities indexed [iy, ix] with window (0, 0) at the
+        lower left of frame
+    """
+    tp = _processor(layout, cell, frame, window, threads)
+    tp.input('m', layout, cell.cell_index(), layout.layer(layer_info))
+    receiver = _Windows()
+    tp.output('density', receiver)
+    tp.queue('var b = _tile ? _tile.bbox & frame : frame; '
+             'b.area == 0 ? nil : _output(density, to_f((m & b).area) / b.area)')
+    tp.execute('EE312 density')
+    return _grid(receiver.values)
+
+def fill(layout, cell, layer_info, fill_layer=None, window=100, min_density=.2, tile=2,
+         pitch=4, spacing=5, pad_spacing=20, keep_out=None, frame=None, threads=4,
+         name='FILL'):
+    """Adds dummy tiles to the windows of a layer below min_density.
+
+    Args:
+        layer_info is the layer whose density is measured
+        fill_layer receives the tiles; defaults to layer_info
+        tile, pitch are the fill tile edge and grid pitch in um
+        spacing is the clearance from shapes on the keep_out layers in um
+        pad_spacing is the clearance from EE312 probe pads in um
+        keep_out are the LayerInfos to keep clear of; defaults to all
+            layers
+        other arguments as for density
+    Returns:
+        the fill cell placed in cell, and the number of fill tiles
+    """
+    dbu = layout.dbu
+    fill_layer = layer_info if fill_layer is None else fill_layer
+    if keep_out is None:
+        keep_out = [layout.get_info(li) for li in layout.layer_indexes()]
+    tile_dbu, pitch_dbu = round(tile / dbu), round(pitch / dbu)
+    if frame is None:
+        frame = cell.dbbox()
+    # Windows span whole grid steps, so no tile straddles two windows
+    window = max(round(window / pitch), 1) * pitch
+
+    index = SiteIndex.from_layout(layout, cell)
+    pads = pya.Region()
+    for left, bottom, right, top in index.pads:
+        pads.insert(pya.DBox(left, bottom, right, top).to_itype(dbu))
+
+    tp = _processor(layout, cell, frame, window, threads)
+    border = max(spacing, pad_spacing) + tile
+    tp.tile_border(border, border)
+    tp.input('m', layout, cell.cell_index(), layout.layer(layer_info))
+    names = []
+    for ii, info in enumerate(keep_out):
+        tp.input(f'k{ii}', layout, cell.cell_index(), layout.layer(info))
+        names.append(f'k{ii}')
+    # The processor does not keep the region alive by itself
+    tp.var('pads', pads)
+    tp.var('spacing', round(spacing / dbu))
+    tp.var('pad_spacing', round(pad_spacing / dbu))
+    tp.var('half', tile_dbu // 2)
+    tp.var('min_density', min_density)
+    receiver = _FillArrays(frame.to_itype(dbu).p1, pitch_dbu)
+    tp.output('corners', receiver)
+    keep = ' + '.join(names) if names else 'Region.new'
+    # Lower left corners of tiles that fit in the window minus the keep-out
+    tp.queue('var b = _tile ? _tile.bbox & frame : frame; '
+             'var free = Region.new(b) - (' + keep + ').sized(spacing) - pads.sized(pad_spacing); '
+             'b.area == 0 ? nil : (to_f((m & b).area) / b.area < min_density ? '
+             '_output(corners, free.sized(-half).moved(-half, -half)) : nil)')
+    tp.execute('EE312 fill')
+
+    fill_cell = layout.create_cell(name)
+    tile_cell = layout.create_cell(f'{name}_TILE')
+    tile_cell.shapes(layout.layer(fill_layer)).insert(pya.Box(0, 0, tile_dbu, tile_dbu))
+    count = 0
+    for x, y, nx, ny in receiver.arrays:
+        fill_cell.insert(pya.CellInstArray(
+            tile_cell.cell_index(), pya.Trans(x, y),
+            pya.Vector(pitch_dbu, 0), pya.Vector(0, pitch_dbu), nx, ny))
+        count += nx * ny
+    cell.insert(pya.CellInstArray(fill_cell.cell_index(), pya.Trans()))
+    return fill_cell, count
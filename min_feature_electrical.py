@@ -7,6 +7,7 @@ Can test for continuity or isolation.
 import pya
 import math
 
+import constraints
 import helpers
 
 class min_feature_electrical(pya.PCellDeclarationHelper):
@@ -33,12 +34,14 @@ class min_feature_electrical(pya.PCellDeclarationHelper):
 
     self.param("disp_fs", self.TypeBoolean, "Display Size?", default=True)
     self.param("text_h", self.TypeDouble, "Text Height", default = 20)
+    self.param("font", self.TypeString, "Label Font", default="Default",
+               choices=[(font, font) for font in helpers.FONTS])
 
   def display_text_impl(self):
     return f'Min Feature Electrical width={self.feature_width}'
   
   def coerce_parameters_impl(self):
-    pass
+    constraints.coerce_pcell(self)
 
   def get_snake(self, h, w, fs, fw):
     """Creates a snake structure.
@@ -71,6 +74,7 @@ class min_feature_electrical(pya.PCellDeclarationHelper):
             return top_snake, bottom_snake
 
   def produce_impl(self):
+    constraints.check_pcell(self)
     dbu = self.layout.dbu
     fw = self.feature_width / dbu
     fs = self.feature_spacing / dbu
@@ -125,7 +129,9 @@ class min_feature_electrical(pya.PCellDeclarationHelper):
 
     if self.si_layer != self.metal_layer:
         contact_y = (pad_dy + offset) / 2
-        for ii in range(int((pad_w - 2 * alignment) / (contact_size + 2 * alignment))):
+        # Contact arrays are left out in draft mode
+        num_contacts = 0 if helpers.draft() else int((pad_w - 2 * alignment) / (contact_size + 2 * alignment))
+        for ii in range(num_contacts):
             contact_x = - pad_w / 2 + offset / 2 + ii * (contact_size + 2 * alignment)
             self.cell.shapes(self.contact_layer).insert(pya.Box(
                 *helpers.center_size_to_points(contact_x, contact_y, contact_size, contact_size))) 
@@ -138,12 +144,10 @@ class min_feature_electrical(pya.PCellDeclarationHelper):
             *helpers.center_size_to_points(0, pad_y, pad_w, pad_h)))
 
     # Display text with relevant parameters    
-    if self.disp_fs:
+    if self.disp_fs and not helpers.draft():
         # Generate klayout region containing text
         # This can only generate with lower left at (0, 0)
-        text_generator = pya.TextGenerator.default_generator()
-        # default height is .7; third argument rescales to desired size
-        text = text_generator.text(f'S={self.feature_width:g}', self.layout.dbu, self.text_h / .7)
+        text = helpers.label(f'S={self.feature_width:g}', self.layout.dbu, self.text_h, self.font)
         text = text.transformed(pya.ICplxTrans.R270)
         
 
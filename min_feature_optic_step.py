@@ -7,6 +7,7 @@ Used for optical inspection of minimum feature size.
 import pya
 import math
 
+import constraints
 import helpers
 
 class min_feature_optic_step(pya.PCellDeclarationHelper):
@@ -28,9 +29,10 @@ class min_feature_optic_step(pya.PCellDeclarationHelper):
     return f'Min Feature Optic Step delta={self.delta}'
   
   def coerce_parameters_impl(self):
-    pass
+    constraints.coerce_pcell(self)
 
   def produce_impl(self):
+    constraints.check_pcell(self)
     dbu = self.layout.dbu
     min_w = self.min_width / dbu
     fs = self.feature_spacing / dbu
@@ -0,0 +1,169 @@
+"""
+Batched MOSFET parameter extraction for the transistor PCell.
+
+Every function works on a whole batch of Id-Vg sweeps at once: arrays of
+shape (devices, points), padded with NaN where a sweep is shorter. W and L
+come from the layout metadata of the prober store, so a full wafer of
+transistors is extracted with a handful of numpy calls.
+"""
+
+import numpy as np
+
+
+def sweeps(store, vg='Vg', id='Id', vd='Vd', keys=('die', 'site')):
+    """Collects the transistor Id-Vg sweeps of a ProberStore.
+
+    Returns:
+        dict of per device arrays: the key columns (decoded), W, L, vd
+        (median drain bias, if the column exists) and the padded
+        (devices, points) arrays vg, id sorted by vg
+    """
+    data = store.sweeps(vg, id, 'transistor', keys, [vd] if vd in store.columns else [])
+    params = [store.structures[kind]['params'] for kind in data.pop('kind')]
+    data['W'] = np.array([p['W'] for p in params], dtype=float)
+    data['L'] = np.array([p['L'] for p in params], dtype=float)
+    if vd in data:
+        data['vd'] = data.pop(vd)
+    data['vg'] = data.pop('x')
+    data['id'] = data.pop('y')
+    return data
+
+
+def gradient(y, x):
+    """Central-difference dy/dx along the points, NaN where undefined."""
+    d = np.full(y.shape, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        d[:, 1:-1] = (y[:, 2:] - y[:, :-2]) / (x[:, 2:] - x[:, :-2])
+        d[:, 0] = (y[:, 1] - y[:, 0]) / (x[:, 1] - x[:, 0])
+        d[:, -1] = (y[:, -1] - y[:, -2]) / (x[:, -1] - x[:, -2])
+    return d
+
+def take(values, index):
+    """Picks values[i, index[i]] for every device i."""
+    return np.take_along_axis(values, index[:, None], axis=1)[:, 0]
+
+def max_gm(vg, id, vd, W, L, cox):
+    """Linear-region threshold and mobility by maximum transconductance.
+
+    The tangent at the gm peak is extrapolated to Id = 0 and corrected by
+    vd / 2.
+
+    Args:
+        vd is the drain bias, scalar or per device
+        cox is the gate capacitance in F/cm^2
+    Returns:
+        dict of per device arrays vt (V), gm_max (S) and mobility
+        (cm^2/Vs)
+    """
+    gm = gradient(np.abs(id), vg)
+    # A sweep without any gm gives index 0 and NaN results below
+    peak = np.argmax(np.nan_to_num(gm, nan=-np.inf), axis=1)
+    gm_max = take(gm, peak)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vt = take(vg, peak) - take(np.abs(id), peak) / gm_max - np.asarray(vd) / 2
+    mobility = gm_max * np.asarray(L) / (np.asarray(W) * cox * np.abs(vd))
+    return {'vt': vt, 'gm_max': gm_max, 'mobility': mobility}
+
+def constant_current(vg, id, W, L, i_crit=1e-7):
+    """Threshold where Id reaches i_crit * W / L, interpolated in log(Id).
+
+    Returns:
+        per device vt, NaN where the sweep never reaches the current
+    """
+    target = np.log10(i_crit * np.asarray(W, dtype=float) / np.asarray(L, dtype=float))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_id = np.log10(np.abs(id))
+    above = np.nan_to_num(log_id, nan=-np.inf) >= np.broadcast_to(target, len(vg))[:, None]
+    k = np.argmax(above, axis=1)
+    valid = above.any(axis=1) & (k > 0)
+    k = np.maximum(k, 1)
+    x0, x1 = take(vg, k - 1), take(vg, k)
+    y0, y1 = take(log_id, k - 1), take(log_id, k)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vt = x0 + (target - y0) * (x1 - x0) / (y1 - y0)
+    return np.where(valid, vt, np.nan)
+
+def subthreshold_slope(vg, id, i_max=np.inf, i_floor=1e-12):
+    """Steepest subthreshold slope of each sweep in mV/decade.
+
+    Only points between i_floor, the noise floor, and i_max, scalar or per
+    device, are used; extract passes the constant-current threshold.
+    """
+    i_max = np.broadcast_to(np.asarray(i_max, dtype=float), len(vg))[:, None]
+    current = np.abs(id)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_id = np.where((current > i_floor) & (current < i_max), np.log10(current), np.nan)
+    slope = gradient(log_id, vg)
+    steepest = np.nanmax(np.where(np.isnan(slope), -np.inf, np.abs(slope)), axis=1)
+    with np.errstate(divide='ignore'):
+        return np.where(np.isfinite(steepest) & (steepest > 0), 1000 / steepest, np.nan)
+
+def current_at(vg, id, v):
+    """Interpolates |Id| at a per device gate voltage v."""
+    v = np.broadcast_to(np.asarray(v, dtype=float), len(vg))
+    k = np.clip(np.sum(np.nan_to_num(vg, nan=np.inf) < v[:, None], axis=1), 1, vg.shape[1] - 1)
+    x0, x1 = take(vg, k - 1), take(vg, k)
+    y0, y1 = np.abs(take(id, k - 1)), np.abs(take(id, k))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return y0 + (v - x0) * (y1 - y0) / (x1 - x0)
+
+def series_resistance(W, L, r_total, groups=None):
+    """Source/drain series resistance by the L-array method.
+
+    Within each group, usually devices of one W on one die at the same
+    gate overdrive, r_total * W is fitted linearly against L. The
+    intercept is the width-normalized series resistance.
+
+    Args:
+        r_total is Vd / Id per device in ohm
+        groups labels the devices fitted together; defaults to W
+    Returns:
+        (group labels, rsd_w in ohm um, sheet in ohm um / um of L, rsd in
+        ohm for the group W), NaN where a group spans fewer than two L
+    """
+    W = np.asarray(W, dtype=float)
+    L = np.asarray(L, dtype=float)
+    y = np.asarray(r_total, dtype=float) * W
+    groups = W if groups is None else np.asarray(groups)
+    labels, g = np.unique(groups, return_inverse=True)
+    ok = np.isfinite(y) & np.isfinite(L)
+    count = np.bincount(g[ok], minlength=len(labels)).astype(float)
+    sx = np.bincount(g[ok], L[ok], len(labels))
+    sy = np.bincount(g[ok], y[ok], len(labels))
+    sxx = np.bincount(g[ok], L[ok] ** 2, len(labels))
+    sxy = np.bincount(g[ok], L[ok] * y[ok], len(labels))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (count * sxy - sx * sy) / (count * sxx - sx ** 2)
+        rsd_w = (sy - slope * sx) / count
+        width = np.bincount(g, W, len(labels)) / np.bincount(g, minlength=len(labels))
+        return labels, rsd_w, slope, rsd_w / width
+
+def extract(store, cox, vd=None, i_crit=1e-7, overdrive=1, **columns):
+    """Runs every extraction on the transistor sweeps of a ProberStore.
+
+    Args:
+        cox is the gate capacitance in F/cm^2
+        vd is the drain bias; defaults to the Vd column
+        overdrive is the Vg - Vt in V at which r_total is taken for the
+            series resistance
+        columns renames the sweep columns, see sweeps
+    Returns:
+        dict of per device arrays (keys, W, L, vt_gm, vt_cc, gm_max,
+        mobility, ss, r_total) and 'rsd', the series_resistance result
+        grouped by 'die/W' (by W if there is no die key)
+    """
+    data = sweeps(store, **columns)
+    vd = data.get('vd') if vd is None else np.broadcast_to(vd, len(data['W']))
+    gm = max_gm(data['vg'], data['id'], vd, data['W'], data['L'], cox)
+    result = {key: value for key, value in data.items() if key not in ('vg', 'id')}
+    result.update(vt_gm=gm['vt'], gm_max=gm['gm_max'], mobility=gm['mobility'],
+                  vt_cc=constant_current(data['vg'], data['id'], data['W'], data['L'], i_crit),
+                  ss=subthreshold_slope(data['vg'], data['id'], i_crit * data['W'] / data['L']))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result['r_total'] = np.abs(vd) / current_at(data['vg'], data['id'], gm['vt'] + overdrive)
+    groups = None
+    if 'die' in data:
+        groups = np.array([f'{die if isinstance(die, str) else format(die, "g")}/{w:g}'
+                           for die, w in zip(data['die'], data['W'])])
+    result['rsd'] = series_resistance(data['W'], data['L'], result['r_total'], groups)
+    return result
@@ -12,6 +12,7 @@ Issue 9, 2002, Pages 1325-1331.
 import pya
 import math
 
+import constraints
 import helpers
 
 class ono_contact(pya.PCellDeclarationHelper):
@@ -39,14 +40,18 @@ class ono_contact(pya.PCellDeclarationHelper):
     self.param("disp_DL", self.TypeBoolean, "Display DL?", default=True)
     self.param("disp_W", self.TypeBoolean, "Display W?", default=True)
     self.param("text_h", self.TypeDouble, "Text Height", default = 20)
+    self.param("font", self.TypeString, "Label Font", default="Default",
+               choices=[(font, font) for font in helpers.FONTS])
+    self.param("merge", self.TypeBoolean, "Merge shapes?", default=False)
 
   def display_text_impl(self):
     return f'Ono Contact size={self.meas_contact_w}'
   
   def coerce_parameters_impl(self):
-    pass
+    constraints.coerce_pcell(self)
 
   def produce_impl(self):
+    constraints.check_pcell(self)
     dbu = self.layout.dbu
 
     pad_w = self.pad_w / dbu
@@ -84,9 +89,10 @@ class ono_contact(pya.PCellDeclarationHelper):
         - metal_w / 2, metal_w / 2,
         metal_w / 2, pad_dy / 2))
     for x_mir in [-1, 1]:
-        self.cell.shapes(self.contact_layer).insert(pya.Box(
-            *helpers.center_size_to_points(
-                x_mir * big_contact_x, 0, mcl, mcw)))
+        if not helpers.draft():
+            self.cell.shapes(self.contact_layer).insert(pya.Box(
+                *helpers.center_size_to_points(
+                    x_mir * big_contact_x, 0, mcl, mcw)))
         self.cell.shapes(self.metal_layer).insert(pya.Box(
             x_mir * (pad_dx + pad_w / 2 + metal_w), - metal_w / 2,
             x_mir * (big_contact_x - mcl / 2 - 2 * alignment), metal_w / 2))
@@ -105,9 +111,10 @@ class ono_contact(pya.PCellDeclarationHelper):
         self.cell.shapes(self.si_layer).insert(pya.Box(
             *helpers.center_size_to_points(
                 x, - 2 * metal_w, metal_w, metal_w)))
-        self.cell.shapes(self.contact_layer).insert(pya.Box(
-            *helpers.center_size_to_points(
-                x, - 2 * metal_w, mcw, mcw)))
+        if not helpers.draft():
+            self.cell.shapes(self.contact_layer).insert(pya.Box(
+                *helpers.center_size_to_points(
+                    x, - 2 * metal_w, mcw, mcw)))
     
     # Connect Si to metal
     self.cell.shapes(self.metal_layer).insert(pya.Box(
@@ -131,12 +138,10 @@ class ono_contact(pya.PCellDeclarationHelper):
     elif self.disp_W:
         disp_str = f'W={self.meas_contact_w:g}'
     
-    if disp_str:
+    if disp_str and not helpers.draft():
         # Generate klayout region containing text
         # This can only generate with lower left at (0, 0)
-        text_generator = pya.TextGenerator.default_generator()
-        # default height is .7; third argument rescales to desired size
-        text = text_generator.text(disp_str, self.layout.dbu, self.text_h / .7)
+        text = helpers.label(disp_str, self.layout.dbu, self.text_h, self.font)
 
         # Adjust position of region
         bbox = text.bbox()
@@ -147,3 +152,7 @@ class ono_contact(pya.PCellDeclarationHelper):
 
         # Add region to metal layer
         self.cell.shapes(self.metal_layer).insert (text)
+
+    # Optionally merge each layer into a minimal set of polygons
+    if self.merge:
+        helpers.merge_shapes(self.cell)
@@ -0,0 +1,208 @@
+"""
+Shared probe-card pad frame.
+
+Places several structures in a row between two rows of probe pads and
+routes every structure pad to a frame pad, so one touchdown of a 2 x N
+probe card measures all of them. Structure pads above the middle of their
+structure go to the top row, the others to the bottom row.
+
+Each channel is routed with one horizontal track per net. Terminals are
+assigned to frame pads in x order, and nets running right are stacked
+below the nets they start inside of (mirrored for nets running left), so
+no two nets cross. The finished frame is checked for shorts.
+"""
+
+import pya
+
+from site_index import find_pads
+
+
+def _assign(terminals, pads):
+    """Assigns sorted terminal x to sorted pad x in order, least total |dx|.
+
+    Returns:
+        pad index for every terminal
+    """
+    m, n = len(terminals), len(pads)
+    if not m:
+        return []
+    if m > n:
+        raise ValueError(f'{m} terminals need more than the {n} frame pads of a row')
+    inf = float('inf')
+    # cost[k]: best cost with the current terminal on pad k
+    cost = [abs(terminals[0] - pads[k]) for k in range(n)]
+    choices = []
+    for i in range(1, m):
+        best, arg = inf, -1
+        prefix = []
+        for k in range(n):
+            prefix.append((best, arg))
+            if cost[k] < best:
+                best, arg = cost[k], k
+        choices.append([a for _, a in prefix])
+        cost = [prefix[k][0] + abs(terminals[i] - pads[k]) for k in range(n)]
+    k = min(range(n), key=lambda k: cost[k])
+    assigned = [k]
+    for choice in reversed(choices):
+        k = choice[k]
+        assigned.append(k)
+    return assigned[::-1]
+
+def _tracks(nets, clearance):
+    """Assigns tracks, 0 nearest to the structures, to (x, pad x) nets.
+
+    Nets are in x order. A net whose span holds the start of a net in the
+    same direction must run above it, otherwise the legs would cross.
+    """
+    tracks = [0] * len(nets)
+    spans = [(min(x, p) - clearance, max(x, p) + clearance) for x, p in nets]
+    right = [i for i, (x, p) in enumerate(nets) if p >= x]
+    left = [i for i, (x, p) in enumerate(nets) if p < x]
+    # Rightward nets from the right end, leftward nets from the left end
+    for group in (right[::-1], left):
+        done = []
+        for i in group:
+            below = [tracks[j] + 1 for j in done
+                     if spans[j][0] < spans[i][1] and spans[i][0] < spans[j][1]]
+            tracks[i] = max(below, default=0)
+            done.append(i)
+    # Nets of the two groups never overlap and may share tracks
+    return tracks
+
+def _leg_x(pad, others, edge, up, width, clearance):
+    """Picks the x of the wire leaving a structure pad towards a channel.
+
+    The leg runs from the pad to edge, the structure bounding box; it takes
+    the free column nearest the pad center that clears other metal.
+    """
+    band = pya.Box(pad.left, pad.top if up else edge, pad.right, edge if up else pad.bottom)
+    half = width // 2 + clearance
+    blocked = sorted((p.bbox().left - half, p.bbox().right + half)
+                     for p in (others & pya.Region(band)).each())
+    lo, hi = pad.left + width // 2, pad.right - width // 2
+    free = []
+    start = lo
+    for left, right in blocked:
+        if left > start:
+            free.append((start, min(left, hi)))
+        start = max(start, right)
+    if start < hi:
+        free.append((start, hi))
+    free = [(a, b) for a, b in free if a <= b]
+    if not free:
+        raise ValueError(f'no free path leaves the pad at {pad}; try turning off its labels')
+    center = pad.center().x
+    return min((min(max(center, a), b) for a, b in free), key=lambda x: abs(x - center))
+
+def build_pad_frame(layout, cells, pad_w=100, pad_h=100, pitch=200, n_pads=None,
+                    spacing=100, wire=10, clearance=10,
+                    metals=(pya.LayerInfo(4, 0), pya.LayerInfo(5, 0)), name='PAD_FRAME'):
+    """Builds a frame cell sharing one 2 x n_pads probe pad row pair.
+
+    Args:
+        cells are produced EE312 structures with pad_w and pad_h parameters
+        pad_w, pad_h, pitch are the frame pad size and pitch in um
+        n_pads is the number of pads per row; defaults to what is needed
+        spacing is the gap between structures in um
+        wire, clearance are the route width and spacing in um
+        metals are the pad layers; each pad is routed on the layer holding
+            it, and pads on none of them are left out
+    Returns:
+        the frame cell and a dict mapping frame pads T1..Tn (top, left to
+        right) and B1..Bn (bottom) to (structure index, structure pad name)
+    Raises:
+        ValueError if the structures need more pads than n_pads or a
+        route would short
+    """
+    dbu = layout.dbu
+    wire = round(wire / dbu)
+    clearance = round(clearance / dbu)
+    layers = [layout.layer(metal) for metal in metals]
+    frame = layout.create_cell(name)
+
+    # Structures side by side with their origins on one line
+    x = 0
+    terminals = {'T': [], 'B': []}
+    device_metal = {li: pya.Region() for li in layers}
+    low = high = 0
+    for index, cell in enumerate(cells):
+        box = cell.bbox()
+        trans = pya.Trans(x - box.left, 0)
+        frame.insert(pya.CellInstArray(cell.cell_index(), trans))
+        x += box.width() + round(spacing / dbu)
+        placed = box.transformed(trans)
+        low, high = min(low, placed.bottom), max(high, placed.top)
+
+        params = cell.pcell_parameters_by_name()
+        local = {li: pya.Region(cell.begin_shapes_rec(li)) for li in layers}
+        for li in layers:
+            device_metal[li] += local[li].transformed(trans)
+        for no, pad in enumerate(find_pads(cell, params['pad_w'], params['pad_h'])):
+            on = [li for li in layers if (pya.Region(pad) - local[li]).is_empty()]
+            if not on:
+                continue
+            pad = pad.transformed(trans)
+            side = 'T' if pad.center().y >= placed.center().y else 'B'
+            terminals[side].append((pad, index, f'P{no + 1}', placed, on[0]))
+    for region in device_metal.values():
+        region.merge()
+    width = x - round(spacing / dbu)
+
+    needed = max(len(terminals['T']), len(terminals['B']))
+    n_pads = n_pads or needed
+    pad_w, pad_h, pitch = round(pad_w / dbu), round(pad_h / dbu), round(pitch / dbu)
+    first = (width - (n_pads - 1) * pitch) // 2
+    pad_xs = [first + k * pitch for k in range(n_pads)]
+
+    routes = {}
+    pad_map = {}
+    for side in 'TB':
+        up = side == 'T'
+        found = sorted(terminals[side], key=lambda t: t[0].center().x)
+        nets = []
+        for pad, index, pad_name, placed, li in found:
+            others = device_metal[li] - device_metal[li].interacting(pya.Region(pad))
+            edge = placed.top if up else placed.bottom
+            nets.append((_leg_x(pad, others, edge, up, wire, clearance), pad, edge))
+        assigned = _assign([leg for leg, _, _ in nets], pad_xs)
+        tracks = _tracks([(leg, pad_xs[k]) for (leg, _, _), k in zip(nets, assigned)],
+                         wire + clearance)
+        n_tracks = max(tracks, default=-1) + 1
+        step = wire + clearance
+        base = (high if up else low) + (clearance if up else - clearance)
+        pad_edge = base + (n_tracks * step + clearance) * (1 if up else -1)
+
+        for k, px in enumerate(pad_xs):
+            name_k = f'{side}{k + 1}'
+            box = pya.Box(px - pad_w // 2, pad_edge if up else pad_edge - pad_h,
+                          px + pad_w // 2, pad_edge + pad_h if up else pad_edge)
+            routes[name_k] = [layers[0], pya.Region(box)]
+        for (leg, pad, edge), k, track, (_, index, pad_name, _, li) in zip(nets, assigned, tracks, found):
+            px = pad_xs[k]
+            sign = 1 if up else -1
+            y = base + sign * (track * step + step // 2 + clearance // 2)
+            start = pad.top if up else pad.bottom
+            half = wire // 2
+            wires = pya.Region()
+            wires.insert(pya.Box(leg - half, min(start, y), leg + half, max(start, y)).enlarged(0, half))
+            wires.insert(pya.Box(min(leg, px) - half, y - half, max(leg, px) + half, y + half))
+            wires.insert(pya.Box(px - half, min(y, pad_edge), px + half, max(y, pad_edge)))
+            wires.merge()
+            name_k = f'{side}{k + 1}'
+            # The frame pad goes on the layer of its structure pad
+            routes[name_k][0] = li
+            routes[name_k][1] += wires
+            pad_map[name_k] = (index, pad_name)
+
+    # Every route may only touch its own structure pad and keep clear of the others
+    names = sorted(routes)
+    for i, name_i in enumerate(names):
+        li, route = routes[name_i]
+        grown = route.sized(clearance - 1)
+        for name_j in names[i + 1:]:
+            if routes[name_j][0] == li and not (grown & routes[name_j][1]).is_empty():
+                raise ValueError(f'routes to {name_i} and {name_j} are closer than the clearance')
+        if device_metal[li].interacting(route).count() > 1:
+            raise ValueError(f'the route to {name_i} shorts two structure nets')
+        frame.shapes(li).insert(route.merged())
+    return frame, pad_map
@@ -0,0 +1,140 @@
+"""
+Automatic die composition.
+
+Packs produced structures onto a die with a bottom-left skyline packer,
+tallest first. Each structure is placed by its bounding box, labels
+included, with a keep-out spacing and optionally with its origin on the
+prober pitch. Repeated cells are placed as instances of one cell, and
+every placement gets a grid_labels style site ID.
+"""
+
+import numpy as np
+import pya
+
+from grid_labels import site_name
+
+
+def _ceil_to(value, pitch, offset=0):
+    """Smallest v >= value with v + offset on the pitch grid."""
+    return - ((- (value + offset)) // pitch) * pitch - offset
+
+def pack(sizes, width, spacing=0, pitch=None, offsets=None):
+    """Packs rectangles into a strip of the given width.
+
+    Args:
+        sizes is a list of (w, h)
+        spacing is kept free between rectangles
+        pitch puts the point offsets[i] of every rectangle, relative to
+            its lower left corner, on a pitch grid
+    Returns:
+        list of lower left (x, y) in the order of sizes, and the height
+        of the packing
+    Raises:
+        ValueError if a rectangle does not fit the width
+    """
+    offsets = offsets or [(0, 0)] * len(sizes)
+    order = sorted(range(len(sizes)), key=lambda i: (- sizes[i][1], - sizes[i][0]))
+    # Skyline as segment starts and heights covering [0, width); every
+    # candidate position is evaluated at once per rectangle
+    starts = np.zeros(1, dtype=np.int64)
+    heights = np.zeros(1, dtype=np.int64)
+    positions = [None] * len(sizes)
+    height = 0
+
+    for index in order:
+        w, h = sizes[index]
+        ox, oy = offsets[index]
+        ends = np.append(starts[1:], width)
+        # Leftmost x of every segment, on the pitch grid if needed
+        xs = _ceil_to(starts, pitch, ox) if pitch else starts
+        fits = (xs < ends) & (xs + w <= width)
+        if not fits.any():
+            raise ValueError(f'{w} x {h} does not fit the width {width}')
+        # The spacing to the right has to clear the skyline as well, so
+        # the height is the highest segment under [x, x + w + spacing)
+        first = np.nonzero(fits)[0]
+        rights = np.minimum(xs[first] + w + spacing, width)
+        last = np.searchsorted(starts, rights, 'left')
+        bounds = np.stack([first, last], axis=1).ravel()
+        ys = np.maximum.reduceat(np.append(heights, -1), bounds)[::2]
+        if pitch:
+            ys = _ceil_to(ys, pitch, oy)
+        best = np.lexsort((xs[first], ys))[0]
+        x, y = int(xs[first[best]]), int(ys[best])
+        positions[index] = (x, y)
+        height = max(height, y + h)
+
+        # Raise the skyline under the rectangle and its spacing
+        right = min(x + w + spacing, width)
+        i0 = np.searchsorted(ends, x, 'right')
+        i1 = np.searchsorted(starts, right, 'left')
+        new_starts = [starts[:i0 + 1] if starts[i0] < x else starts[:i0], [x]]
+        new_heights = [heights[:i0 + 1] if starts[i0] < x else heights[:i0], [y + h + spacing]]
+        if right < width and (i1 >= len(starts) or starts[i1] > right):
+            new_starts.append([right])
+            new_heights.append([heights[i1 - 1]])
+        new_starts.append(starts[i1:])
+        new_heights.append(heights[i1:])
+        starts = np.concatenate(new_starts).astype(np.int64)
+        heights = np.concatenate(new_heights).astype(np.int64)
+        # Merge neighbours of equal height
+        keep = np.append(True, heights[1:] != heights[:-1])
+        starts, heights = starts[keep], heights[keep]
+    return positions, height
+
+def site_ids(boxes):
+    """Names placed boxes A1, B1, ... row by row from the top left.
+
+    Rows are bands as tall as the smallest box; empty bands are skipped.
+
+    Args:
+        boxes is a list of (left, bottom, right, top)
+    Returns:
+        list of site IDs in the order of boxes
+    """
+    if not boxes:
+        return []
+    band = min(top - bottom for _, bottom, _, top in boxes) or 1
+    ceiling = max(top for _, _, _, top in boxes)
+    bands = [int((ceiling - (bottom + top) / 2) // band) for _, bottom, _, top in boxes]
+    rows = {b: row for row, b in enumerate(sorted(set(bands)))}
+    ids = [None] * len(boxes)
+    cols = {}
+    for index in sorted(range(len(boxes)), key=lambda i: (bands[i], boxes[i][0])):
+        row = rows[bands[index]]
+        ids[index] = site_name(cols.get(row, 0), row)
+        cols[row] = cols.get(row, 0) + 1
+    return ids
+
+def place_structures(layout, cells, die_w, spacing=50, pitch=None, labels=None, name='DIE'):
+    """Packs structure cells onto a new die cell.
+
+    Args:
+        cells is a list of cells to place; a cell listed several times
+            is placed that many times
+        die_w is the die width in um; the die grows upwards as needed
+        spacing is the keep-out between bounding boxes in um
+        pitch puts each structure origin on a prober pitch grid in um
+        labels is a LayerInfo for pya.Text site IDs, or None
+    Returns:
+        the die cell and a dict mapping site IDs to (cell, x, y) with the
+        structure origin in um
+    """
+    dbu = layout.dbu
+    boxes = [cell.bbox() for cell in cells]
+    positions, _ = pack([(box.width(), box.height()) for box in boxes],
+                        round(die_w / dbu), round(spacing / dbu),
+                        round(pitch / dbu) if pitch else None,
+                        [(- box.left, - box.bottom) for box in boxes])
+
+    die = layout.create_cell(name)
+    placed = [(x, y, x + box.width(), y + box.height()) for (x, y), box in zip(positions, boxes)]
+    sites = {}
+    label_layer = layout.layer(labels) if labels is not None else None
+    for site, cell, box, (x, y) in zip(site_ids(placed), cells, boxes, positions):
+        disp = pya.Vector(x - box.left, y - box.bottom)
+        die.insert(pya.CellInstArray(cell.cell_index(), pya.Trans(disp)))
+        sites[site] = (cell, disp.x * dbu, disp.y * dbu)
+        if label_layer is not None:
+            die.shapes(label_layer).insert(pya.Text(site, pya.Trans(disp)))
+    return die, sites
@@ -0,0 +1,85 @@
+"""
+Polarity inversion for dark-field masks.
+
+min_feature_optic and min_feature_optic_step invert locally with their pos
+flag. For a whole dark-field mask a layer is inverted against the reticle
+frame instead, tile by tile on several threads, so memory stays bounded by
+the tiles in flight rather than the flattened reticle.
+"""
+
+import pya
+
+
+class _Insert(pya.TileOutputReceiver):
+  """Inserts every tile into a shapes container as it finishes.
+
+  The native layout receiver fails on a cell with child instances, so
+  the tiles go through Python, one at a time.
+  """
+
+  def __init__(self, shapes):
+    self.shapes = shapes
+
+  def put(self, ix, iy, tile, obj, dbu, clip):
+    self.shapes.insert(obj)
+
+
+def invert_region(layout, cell, layer_info, frame=None, tile_size=1000, threads=4):
+    """Returns frame NOT layer as a pya.Region in dbu.
+
+    Args:
+        layer_info is the layer to invert
+        frame is the reticle frame as a pya.DBox in um; defaults to the
+            bounding box of cell
+        tile_size is the tile edge in um
+        threads is the number of worker threads
+    """
+    result = pya.Region()
+    _invert(layout, cell, layer_info, frame, tile_size, threads, result)
+    return result
+
+def invert_layer(layout, cell, layer_info, output=None, frame=None, tile_size=1000,
+                 threads=4):
+    """Inverts a layer into cell, flat.
+
+    Tiles are inserted into the output layer of cell as they finish.
+    Without an output layer the layer is replaced in place: its shapes are
+    removed from cell and every cell below it, which are flattened into
+    the inverted layer, and the inverted layer takes their place in cell.
+
+    Args:
+        output is the LayerInfo receiving the inverted layer
+        other arguments as for invert_region
+    Returns:
+        the layer index of the inverted layer
+    """
+    if output is not None:
+        target = layout.layer(output)
+        _invert(layout, cell, layer_info, frame, tile_size, threads,
+                _Insert(cell.shapes(target)))
+        return target
+
+    source = layout.layer(layer_info)
+    scratch = layout.insert_layer(pya.LayerInfo())
+    _invert(layout, cell, layer_info, frame, tile_size, threads, _Insert(cell.shapes(scratch)))
+    for ci in [cell.cell_index()] + list(cell.called_cells()):
+        layout.cell(ci).shapes(source).clear()
+    cell.move(scratch, source)
+    layout.delete_layer(scratch)
+    return source
+
+def _invert(layout, cell, layer_info, frame, tile_size, threads, output):
+    if frame is None:
+        frame = cell.dbbox()
+    tp = pya.TilingProcessor()
+    tp.dbu = layout.dbu
+    tp.tile_size(tile_size, tile_size)
+    tp.threads = threads
+    tp.input('i', layout, cell.cell_index(), layout.layer(layer_info))
+    # The processor does not keep the region alive by itself
+    frame_region = pya.Region(frame.to_itype(layout.dbu))
+    tp.var('frame', frame_region)
+    tp.frame = frame
+    tp.output('o', output)
+    tp.queue('_output(o, (_tile ? frame & _tile.bbox : frame) - i)')
+    tp.execute('EE312 polarity inversion')
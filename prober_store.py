@@ -0,0 +1,270 @@
+"""
+Columnar store for prober logs.
+
+Prober CSV logs are parsed in chunks and appended column by column to raw
+binary files, which are read back as numpy memory maps. Numeric columns
+are stored as float64, text columns as int32 codes into a vocabulary.
+Every record is joined to the structure under its site through a
+SiteIndex, so extraction code can select rows by PCell and parameters and
+read only the columns it needs.
+
+A store is a directory holding one <column>.bin file per column and
+meta.json with the column types, vocabularies, row count and structure
+metadata.
+"""
+
+import csv
+import json
+import os
+
+import numpy as np
+
+# Columns added by the join with the layout
+JOIN_COLUMNS = ('instance', 'kind')
+
+
+class ProberStore:
+  """Read access to an ingested store.
+
+  store[name] returns the column as a read-only memory map; text columns
+  hold codes, see labels() and decode().
+  """
+
+  def __init__(self, path):
+    self.path = path
+    with open(os.path.join(path, 'meta.json')) as f:
+      self.meta = json.load(f)
+
+  def __len__(self):
+    return self.meta['rows']
+
+  @property
+  def columns(self):
+    return list(self.meta['columns'])
+
+  @property
+  def structures(self):
+    """Structure metadata by kind, as in SiteIndex.meta."""
+    return self.meta['structures']
+
+  def __getitem__(self, name):
+    dtype = self.meta['columns'][name]
+    if not len(self):
+      return np.zeros(0, dtype=dtype)
+    return np.memmap(os.path.join(self.path, f'{name}.bin'), dtype=dtype, mode='r',
+                     shape=(len(self),))
+
+  def labels(self, name):
+    """Returns the vocabulary of a text column."""
+    return self.meta['labels'][name]
+
+  def decode(self, name, rows=slice(None)):
+    """Returns the strings of a text column."""
+    return np.array(self.labels(name), dtype=object)[self[name][rows]]
+
+  def code(self, name, label):
+    """Returns the code of a label in a text column, -1 if it never occurs."""
+    labels = self.labels(name)
+    return labels.index(label) if label in labels else -1
+
+  def select(self, pcell=None, **params):
+    """Returns a boolean row mask for structures of a PCell and parameters."""
+    kinds = [kind for kind, info in enumerate(self.structures)
+             if (pcell is None or info['pcell'] == pcell)
+             and all(info['params'].get(k) == v for k, v in params.items())]
+    return np.isin(self['kind'], kinds)
+
+  def sweeps(self, x, y, pcell=None, keys=('die', 'site'), extra=(), **params):
+    """Collects the sweeps of selected structures as padded arrays.
+
+    Rows are grouped into devices by the key columns; the points of a
+    device are sorted by x.
+
+    Args:
+        x, y are the swept and measured columns
+        extra are columns returned as their per device median
+        pcell, params select the structures, as in select
+    Returns:
+        dict of per device arrays: the key columns (text decoded), kind, the
+        extra columns, and x and y as (devices, points) arrays padded
+        with NaN
+    """
+    rows = np.nonzero(self.select(pcell, **params))[0]
+    # Every key column as integer codes into its distinct values, so text
+    # codes and numeric keys group exactly
+    values, codes = zip(*[np.unique(np.asarray(self[key][rows]), return_inverse=True)
+                          for key in keys])
+    codes = np.stack([code.ravel() for code in codes], axis=1).astype(np.int64)
+    groups, device = np.unique(codes.reshape(len(rows), len(keys)), axis=0, return_inverse=True)
+    device = device.ravel()
+    order = np.argsort(device, kind='stable')
+    rows, device = rows[order], device[order]
+    counts = np.bincount(device, minlength=len(groups))
+    starts = np.cumsum(counts) - counts
+    slot = np.arange(len(rows)) - np.repeat(starts, counts)
+
+    shape = (len(groups), int(counts.max(initial=0)))
+    def padded(name):
+      values = np.full(shape, np.nan)
+      values[device, slot] = self[name][rows]
+      return values
+
+    result = {}
+    for ii, key in enumerate(keys):
+      result[key] = values[ii][groups[:, ii]]
+      if key in self.meta['labels']:
+        result[key] = np.array(self.labels(key), dtype=object)[result[key]]
+    result['kind'] = np.asarray(self['kind'][rows[starts]])
+    for name in extra:
+      result[name] = np.nanmedian(padded(name), axis=1) if shape[1] else np.zeros(0)
+    by_x = np.argsort(padded(x), axis=1)
+    result['x'] = np.take_along_axis(padded(x), by_x, axis=1)
+    result['y'] = np.take_along_axis(padded(y), by_x, axis=1)
+    return result
+
+
+def _parse_chunk(rows, names, types, labels, lookup, site_column):
+    """Converts a list of CSV rows to column arrays."""
+    columns = {}
+    for ii, name in enumerate(names):
+        values = [row[ii] if ii < len(row) else '' for row in rows]
+        if types[name] == 'float64':
+            try:
+                columns[name] = np.array([value or 'nan' for value in values], dtype=np.float64)
+            except ValueError as e:
+                raise ValueError(f'column {name!r} is numeric, but {e}') from None
+        else:
+            vocab = labels[name]
+            codes = {label: code for code, label in enumerate(vocab)}
+            for value in set(values) - set(codes):
+                codes[value] = len(vocab)
+                vocab.append(value)
+            columns[name] = np.array([codes[value] for value in values], dtype=np.int32)
+    if lookup is not None:
+        instances, kinds = lookup(labels[site_column])
+        columns['instance'] = instances[columns[site_column]]
+        columns['kind'] = kinds[columns[site_column]]
+    return columns
+
+def _numeric(values):
+    try:
+        np.array([value or 'nan' for value in values], dtype=np.float64)
+        return True
+    except ValueError:
+        return False
+
+def _truncate(path, columns, rows):
+    """Cuts the column files of a store back to rows rows."""
+    for name, dtype in columns.items():
+        file = os.path.join(path, f'{name}.bin')
+        if os.path.exists(file):
+            os.truncate(file, rows * np.dtype(dtype).itemsize)
+
+def ingest(log, path, index=None, sites=None, site_column='site', chunk_rows=1 << 16,
+           append=False):
+    """Parses a prober CSV log into a store, chunk by chunk.
+
+    Columns are typed from the first chunk: numeric if every value parses
+    as a number (empty cells become NaN), text otherwise. The site column
+    is always text.
+
+    Args:
+        log is the CSV path; the first line names the columns
+        path is the store directory
+        index is a SiteIndex of the die; with sites it adds the instance
+            and kind columns (-1 where no structure is found)
+        sites maps site names to (x, y) in um in the indexed cell; entries
+            of place_structures, ending in x, y, work as well
+        site_column is the column holding the site names
+        append adds to an existing store with the same columns; a store
+            joined to a SiteIndex takes rows joined to the same index only
+    Returns:
+        the ProberStore
+    Raises:
+        ValueError if the log or the join do not match the store; the
+            store is left as it was before the call
+    """
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, 'meta.json')
+    if append and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        # meta.json is written last, so rows past its count are left over
+        # from an ingest that failed
+        _truncate(path, meta['columns'], meta['rows'])
+    else:
+        meta = {'rows': 0, 'columns': {}, 'labels': {},
+                'structures': index.meta if index is not None else []}
+        for name in os.listdir(path):
+            if name.endswith('.bin') or name == 'meta.json':
+                os.remove(os.path.join(path, name))
+
+    lookup = None
+    if index is not None and sites is not None:
+        cache = {}
+        def lookup(vocab):
+            new = [label for label in vocab if label not in cache]
+            for label in new:
+                cache[label] = (-1, -1)
+            new = [label for label in new if label in sites]
+            if new:
+                xy = np.array([sites[label][-2:] for label in new], dtype=float)
+                instances, _ = index.query(xy[:, 0], xy[:, 1])
+                for label, instance in zip(new, instances):
+                    cache[label] = (instance, index.kinds[instance] if instance >= 0 else -1)
+            pairs = np.array([cache[label] for label in vocab], dtype=np.int64).reshape(-1, 2)
+            return pairs[:, 0], pairs[:, 1]
+
+    # The join columns must grow with every other column
+    if meta['columns']:
+        joined = 'kind' in meta['columns']
+        if joined != (lookup is not None):
+            raise ValueError('the store is joined to a SiteIndex, pass index and sites'
+                             if joined else 'the store is not joined to a SiteIndex')
+        if joined and json.loads(json.dumps(index.meta)) != meta['structures']:
+            raise ValueError('the index differs from the one the store is joined to')
+
+    committed = meta['rows']
+    files = {}
+    try:
+        with open(log, newline='') as f:
+            reader = csv.reader(f)
+            names = [name.strip() for name in next(reader)]
+            if lookup is not None and site_column not in names:
+                raise ValueError(f'the log has no {site_column!r} column')
+            while True:
+                rows = [row for _, row in zip(range(chunk_rows), reader) if row]
+                if not rows:
+                    break
+                if not meta['columns']:
+                    for ii, name in enumerate(names):
+                        numeric = name != site_column and \
+                            _numeric([row[ii] if ii < len(row) else '' for row in rows])
+                        meta['columns'][name] = 'float64' if numeric else 'int32'
+                        if not numeric:
+                            meta['labels'][name] = []
+                    if lookup is not None:
+                        meta['columns'].update(instance='int64', kind='int64')
+                elif [n for n in meta['columns'] if n not in JOIN_COLUMNS] != names:
+                    raise ValueError('the log columns differ from the store')
+                columns = _parse_chunk(rows, names, meta['columns'], meta['labels'], lookup,
+                                       site_column)
+                for name, values in columns.items():
+                    if name not in files:
+                        files[name] = open(os.path.join(path, f'{name}.bin'), 'ab')
+                    files[name].write(values.astype(meta['columns'][name]).tobytes())
+                meta['rows'] += len(rows)
+    except BaseException:
+        # Drop every row of this call; meta.json still holds the store before it
+        for file in files.values():
+            file.close()
+        _truncate(path, meta['columns'], committed)
+        raise
+    finally:
+        for file in files.values():
+            file.close()
+
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+    return ProberStore(path)
@@ -0,0 +1,76 @@
+"""
+Minimal raster output with numpy.
+
+Writes RGB images as PNG with zlib alone, maps values to colors and draws
+labels with the stroke_font glyphs, so reports need no imaging library.
+"""
+
+import struct
+import zlib
+
+import numpy as np
+
+from stroke_font import ADVANCE, GLYPHS, HEIGHT
+
+# Viridis sampled at nine evenly spaced points
+VIRIDIS = np.array([
+    (68, 1, 84), (71, 44, 122), (59, 81, 139), (44, 113, 142), (33, 144, 141),
+    (39, 173, 129), (92, 200, 99), (170, 220, 50), (253, 231, 37)], dtype=float)
+
+# Blue, white, red for signed values such as trend residuals
+DIVERGING = np.array([(59, 76, 192), (221, 221, 221), (180, 4, 38)], dtype=float)
+
+
+def colorize(values, vmin=None, vmax=None, colormap=VIRIDIS, nan=(255, 255, 255)):
+    """Maps an array of values to uint8 RGB by linear interpolation.
+
+    vmin and vmax default to the finite range of values; NaN gets the nan
+    color.
+    """
+    values = np.asarray(values, dtype=float)
+    finite = np.isfinite(values)
+    if vmin is None:
+        vmin = values[finite].min() if finite.any() else 0
+    if vmax is None:
+        vmax = values[finite].max() if finite.any() else 1
+    span = (vmax - vmin) or 1
+    t = np.clip((np.where(finite, values, vmin) - vmin) / span, 0, 1) * (len(colormap) - 1)
+    k = np.minimum(t.astype(np.int64), len(colormap) - 2)
+    f = (t - k)[..., None]
+    rgb = colormap[k] * (1 - f) + colormap[k + 1] * f
+    rgb[~finite] = nan
+    return np.round(rgb).astype(np.uint8)
+
+def text_mask(string, scale=1):
+    """Returns a boolean bitmap of string in the stroke_font glyphs."""
+    mask = np.zeros((HEIGHT, max(len(string) * ADVANCE - 1, 0)), dtype=bool)
+    for ii, char in enumerate(string):
+        rows = GLYPHS.get(char, GLYPHS.get(char.upper(), ()))
+        for row, line in enumerate(rows):
+            for col, pixel in enumerate(line):
+                mask[row, ii * ADVANCE + col] = pixel == '#'
+    return mask.repeat(scale, axis=0).repeat(scale, axis=1)
+
+def draw_text(image, string, x, y, scale=1, color=(0, 0, 0)):
+    """Draws string into an RGB image with its upper left at x, y, clipped."""
+    mask = text_mask(string, scale)
+    h = max(min(mask.shape[0], image.shape[0] - y), 0)
+    w = max(min(mask.shape[1], image.shape[1] - x), 0)
+    image[y:y + h, x:x + w][mask[:h, :w]] = color
+
+def write_png(path, image):
+    """Writes an (h, w, 3) uint8 array as an 8 bit RGB PNG."""
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    h, w = image.shape[:2]
+    # Filter type 0 in front of every scanline
+    raw = np.concatenate([np.zeros((h, 1), dtype=np.uint8), image.reshape(h, w * 3)], axis=1)
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + \
+            struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)))
+        f.write(chunk(b'IEND', b''))
@@ -0,0 +1,170 @@
+"""
+Resolution-limit detection for min_feature_optic and min_feature_optic_step.
+
+Uses the feature positions of the PCell to profile each bar in a micrograph
+and decide which widths resolved.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def feature_layout(num_features=10, min_width=1, feature_spacing=5, delta=.5,
+                   pos=True, height=None):
+    """Returns the test features along x and the row to profile them on.
+
+    Mirrors the center calculation in min_feature_optic.produce_impl and
+    min_feature_optic_step.produce_impl. All values are in um relative to
+    the PCell origin. In positive polarity the features are the bars, in
+    negative polarity they are the gaps between the walls.
+
+    Args:
+        height is the step structure height; None for min_feature_optic
+    Returns:
+        list of (center_x, width) ordered from smallest to largest and
+        (profile_y, profile_h), the row and band height to average over
+    """
+    num = num_features
+    fs = feature_spacing
+    features = []
+    if pos:
+        centers = [0]
+        for ii in range(num - 1):
+            centers.append(centers[-1] + fs + min_width + (ii + 1 / 2) * delta)
+        shift = centers[-1] / 2 + (num - 1) * delta / 4
+        for ii in range(num):
+            features.append((shift - centers[ii], min_width + ii * delta))
+    else:
+        centers = [0]
+        for ii in range(num):
+            centers.append(centers[-1] + fs + min_width + ii * delta)
+        shift = centers[-1] / 2
+        for ii in range(num):
+            features.append((shift - (centers[ii] + centers[ii + 1]) / 2,
+                             min_width + ii * delta))
+
+    if height is not None:
+        # Bars cross the step at y=0
+        return features, (0, height / 4)
+    # Profile the row of the largest feature, which sits at the same offset in y
+    return features, (features[-1][0], features[-1][1] / 2)
+
+
+def load_image(image):
+    """Loads a micrograph as a 2D float array.
+
+    Accepts an array, a .npy file or any image file Pillow can read.
+    """
+    if isinstance(image, np.ndarray):
+        data = image
+    elif str(image).endswith('.npy'):
+        data = np.load(image)
+    else:
+        from PIL import Image
+        with Image.open(image) as im:
+            data = np.asarray(im.convert('L'))
+    data = np.asarray(data, dtype=float)
+    if data.ndim == 3:
+        data = data.mean(axis=2)
+    return data
+
+
+def _interval_means(prefix, starts, ends):
+    """Mean of a 1D profile over [start, end) using its prefix sum."""
+    n = len(prefix) - 1
+    starts = np.clip(np.floor(starts).astype(int), 0, n)
+    ends = np.clip(np.ceil(ends).astype(int), 0, n)
+    ends = np.maximum(ends, starts + 1)
+    ends = np.minimum(ends, n)
+    starts = np.minimum(starts, ends - 1)
+    return (prefix[ends] - prefix[starts]) / (ends - starts)
+
+
+def analyze_image(image, origin, um_per_px, params, threshold=.1):
+    """Decides which features of one site resolved.
+
+    Args:
+        image is an array or a path accepted by load_image
+        origin is the (x, y) pixel of the PCell origin
+        um_per_px is the image scale
+        params is a dict of PCell parameters passed to feature_layout
+        threshold is the minimum contrast of a resolved feature
+    Returns:
+        dict with widths, contrast, resolved and min_resolved
+    """
+    data = load_image(image)
+    features, (row_y, row_h) = feature_layout(**params)
+    fs = params.get('feature_spacing', 5)
+
+    # Image rows grow downwards
+    y0 = origin[1] - (row_y + row_h / 2) / um_per_px
+    y1 = origin[1] - (row_y - row_h / 2) / um_per_px
+    y0 = int(np.clip(np.floor(y0), 0, data.shape[0] - 1))
+    y1 = int(np.clip(np.ceil(y1), y0 + 1, data.shape[0]))
+    profile = data[y0:y1].mean(axis=0)
+    prefix = np.concatenate([[0.], np.cumsum(profile)])
+
+    centers = np.array([f[0] for f in features]) / um_per_px + origin[0]
+    widths_um = np.array([f[1] for f in features])
+    widths = widths_um / um_per_px
+    space = fs / um_per_px
+
+    # Sample the middle half of the feature and of the spaces on either side
+    inside = _interval_means(prefix, centers - widths / 4, centers + widths / 4)
+    left = _interval_means(prefix, centers - widths / 2 - 3 * space / 4,
+                           centers - widths / 2 - space / 4)
+    right = _interval_means(prefix, centers + widths / 2 + space / 4,
+                            centers + widths / 2 + 3 * space / 4)
+    outside = (left + right) / 2
+    contrast = np.abs(inside - outside) / np.maximum(inside + outside, 1e-12)
+    resolved = (contrast >= threshold) & (widths >= 1)
+
+    # The limit is the smallest width above which every feature resolved
+    min_resolved = None
+    for width, ok in sorted(zip(widths_um, resolved), reverse=True):
+        if not ok:
+            break
+        min_resolved = float(width)
+
+    return {
+        'widths': widths_um.tolist(),
+        'contrast': contrast.tolist(),
+        'resolved': resolved.tolist(),
+        'min_resolved': min_resolved,
+    }
+
+
+def _analyze_site(args):
+    site, image, origin, um_per_px, params, threshold = args
+    return site, analyze_image(image, origin, um_per_px, params, threshold)
+
+
+def analyze_wafer(images, origins, um_per_px, params, threshold=.1, workers=None):
+    """Analyzes a whole image set in parallel.
+
+    Args:
+        images maps site names to images or image paths
+        origins is a single (x, y) pixel origin or a dict of them per site
+        um_per_px is the image scale shared by all images
+        params is a dict of PCell parameters passed to feature_layout
+        workers is the process count; defaults to the CPU count
+    Returns:
+        dict mapping site names to analyze_image results
+    """
+    jobs = []
+    for site, image in images.items():
+        origin = origins[site] if isinstance(origins, dict) else origins
+        jobs.append((site, image, origin, um_per_px, params, threshold))
+
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        return dict(map(_analyze_site, jobs))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(_analyze_site, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+
+def min_resolved_map(results):
+    """Reduces analyze_wafer results to the minimum resolved feature per site."""
+    return {site: result['min_resolved'] for site, result in results.items()}
@@ -0,0 +1,249 @@
+"""
+Spatial index from stage coordinates to structure instances and pads.
+
+Built from the PCell instances of a produced layout. Answers which EE312
+structure, parameter set and pad lies under millions of x/y coordinates
+from a prober or defect inspection tool in one vectorized call.
+"""
+
+import json
+
+import numpy as np
+import pya
+
+
+def find_pads(cell, pad_w, pad_h):
+    """Returns the probe pads of a produced structure.
+
+    Pads are the boxes at least pad_w x pad_h on any layer; some structures
+    stretch a pad towards its contact. They are named P1, P2, ... from top
+    left to bottom right.
+
+    Returns:
+        list of pya.Box in dbu, in pad order
+    """
+    layout = cell.layout()
+    w = round(pad_w / layout.dbu)
+    h = round(pad_h / layout.dbu)
+    pads = set()
+    for layer in layout.layer_indexes():
+        for shape in cell.each_shape(layer):
+            if shape.is_box():
+                box = shape.box
+                if (box.width() >= w and box.height() >= h) or \
+                        (box.width() >= h and box.height() >= w):
+                    pads.add((box.left, box.bottom, box.right, box.top))
+    pads = sorted(pads, key=lambda b: (- b[3], b[0]))
+    return [pya.Box(*pad) for pad in pads]
+
+def _jsonable(value):
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return value
+    return str(value)
+
+
+class _Grid:
+  """A uniform bucket grid over boxes, queried for many points at once."""
+
+  def __init__(self, boxes, size=None):
+    self.boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    self.areas = (self.boxes[:, 2] - self.boxes[:, 0]) * (self.boxes[:, 3] - self.boxes[:, 1])
+    if not len(self.boxes):
+      self.x0 = self.y0 = 0.
+      self.size = 1.
+      self.nx = self.ny = 1
+      self.items = np.zeros(0, dtype=np.int64)
+      self.start = np.zeros(2, dtype=np.int64)
+      return
+
+    self.x0 = self.boxes[:, 0].min()
+    self.y0 = self.boxes[:, 1].min()
+    extent = max(self.boxes[:, 2].max() - self.x0, self.boxes[:, 3].max() - self.y0, 1.)
+    if size is None:
+      dims = np.maximum(self.boxes[:, 2] - self.boxes[:, 0], self.boxes[:, 3] - self.boxes[:, 1])
+      size = float(np.median(dims))
+    # Keep the bucket count bounded for sparse layouts
+    self.size = max(size, extent / 4096, 1.)
+    self.nx = int((self.boxes[:, 2].max() - self.x0) // self.size) + 1
+    self.ny = int((self.boxes[:, 3].max() - self.y0) // self.size) + 1
+
+    i0 = ((self.boxes[:, 0] - self.x0) // self.size).astype(np.int64)
+    i1 = ((self.boxes[:, 2] - self.x0) // self.size).astype(np.int64)
+    j0 = ((self.boxes[:, 1] - self.y0) // self.size).astype(np.int64)
+    j1 = ((self.boxes[:, 3] - self.y0) // self.size).astype(np.int64)
+    widths = i1 - i0 + 1
+    counts = widths * (j1 - j0 + 1)
+
+    # Expand every box into the buckets it covers
+    ids = np.repeat(np.arange(len(self.boxes)), counts)
+    k = np.arange(len(ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+    buckets = (j0[ids] + k // widths[ids]) * self.nx + i0[ids] + k % widths[ids]
+    order = np.argsort(buckets, kind='stable')
+    self.items = ids[order]
+    self.start = np.searchsorted(buckets[order], np.arange(self.nx * self.ny + 1))
+
+  def query(self, x, y):
+    """Returns the smallest box containing each point, -1 where none does."""
+    i = np.floor((x - self.x0) / self.size).astype(np.int64)
+    j = np.floor((y - self.y0) / self.size).astype(np.int64)
+    inside = (i >= 0) & (i < self.nx) & (j >= 0) & (j < self.ny)
+    bucket = np.where(inside, j * self.nx + i, 0)
+    first = self.start[bucket]
+    count = np.where(inside, self.start[bucket + 1] - first, 0)
+
+    best = np.full(len(x), -1, dtype=np.int64)
+    best_area = np.full(len(x), np.inf)
+    for slot in range(int(count.max(initial=0))):
+      rows = np.nonzero(count > slot)[0]
+      cand = self.items[first[rows] + slot]
+      box = self.boxes[cand]
+      hit = ((x[rows] >= box[:, 0]) & (x[rows] <= box[:, 2])
+             & (y[rows] >= box[:, 1]) & (y[rows] <= box[:, 3])
+             & (self.areas[cand] < best_area[rows]))
+      best[rows[hit]] = cand[hit]
+      best_area[rows[hit]] = self.areas[cand[hit]]
+    return best
+
+
+class SiteIndex:
+  """Maps coordinates in um to PCell instances and their pads.
+
+  Instance i has bounding box boxes[i], parameter set kinds[i] described
+  by meta[kinds[i]]. Pad k belongs to instance pad_parent[k] and is
+  named f'P{pad_no[k] + 1}'.
+  """
+
+  def __init__(self, boxes, kinds, meta, pads, pad_parent, pad_no):
+    self.boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    self.kinds = np.asarray(kinds, dtype=np.int64)
+    self.meta = meta
+    self.pads = np.asarray(pads, dtype=float).reshape(-1, 4)
+    self.pad_parent = np.asarray(pad_parent, dtype=np.int64)
+    self.pad_no = np.asarray(pad_no, dtype=np.int64)
+    self._instances = _Grid(self.boxes)
+    self._pads = _Grid(self.pads)
+
+  @classmethod
+  def from_layout(cls, layout, cell):
+    """Indexes every PCell instance below cell, expanding arrays."""
+    dbu = layout.dbu
+    meta = []
+    kind_ids = {}
+    # Per cell: (boxes, kinds, pads, pad_parent, pad_no) in local dbu
+    local = {}
+
+    def cell_data(ci):
+      if ci in local:
+        return local[ci]
+      child = layout.cell(ci)
+      if child.is_pcell_variant():
+        params = child.pcell_parameters_by_name()
+        key = (child.name, json.dumps({k: _jsonable(v) for k, v in sorted(params.items())}))
+        if key not in kind_ids:
+          kind_ids[key] = len(meta)
+          lib = child.library()
+          meta.append({
+              'pcell': child.pcell_declaration().name(),
+              'library': lib.name() if lib else None,
+              'cell': child.name,
+              'params': json.loads(key[1]),
+          })
+        pads = []
+        if 'pad_w' in params and 'pad_h' in params:
+          pads = [[p.left, p.bottom, p.right, p.top]
+                  for p in find_pads(child, params['pad_w'], params['pad_h'])]
+        box = child.bbox()
+        data = (np.array([[box.left, box.bottom, box.right, box.top]], dtype=float),
+                np.array([kind_ids[key]]),
+                np.array(pads, dtype=float).reshape(-1, 4),
+                np.zeros(len(pads), dtype=np.int64),
+                np.arange(len(pads)))
+      else:
+        parts = [cell_data(inst.cell_index) + (inst.cell_inst,)
+                 for inst in child.each_inst()]
+        data = _place(parts)
+      local[ci] = data
+      return data
+
+    boxes, kinds, pads, pad_parent, pad_no = cell_data(cell.cell_index())
+    return cls(boxes * dbu, kinds, meta, pads * dbu, pad_parent, pad_no)
+
+  def query(self, x, y):
+    """Looks up many coordinates at once.
+
+    Args:
+        x, y are arrays of coordinates in um in the indexed cell
+    Returns:
+        (instance ids, pad ids), -1 where nothing was hit. A pad hit
+        always reports the instance owning the pad.
+    """
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    instances = self._instances.query(x, y)
+    pads = self._pads.query(x, y)
+    on_pad = pads >= 0
+    instances[on_pad] = self.pad_parent[pads[on_pad]]
+    return instances, pads
+
+  def describe(self, instance, pad=-1):
+    """Returns the structure, parameters and pad name of a query result."""
+    if instance < 0:
+      return None
+    info = dict(self.meta[self.kinds[instance]])
+    info['instance'] = int(instance)
+    info['bbox'] = self.boxes[instance].tolist()
+    info['pad'] = f'P{self.pad_no[pad] + 1}' if pad >= 0 else None
+    return info
+
+  def save(self, path):
+    """Writes the index to a .npz file."""
+    np.savez_compressed(path, boxes=self.boxes, kinds=self.kinds, pads=self.pads,
+                        pad_parent=self.pad_parent, pad_no=self.pad_no,
+                        meta=np.array(json.dumps(self.meta)))
+
+  @classmethod
+  def load(cls, path):
+    """Reads an index written by save."""
+    with np.load(path) as data:
+      return cls(data['boxes'], data['kinds'], json.loads(str(data['meta'])),
+                 data['pads'], data['pad_parent'], data['pad_no'])
+
+
+def _transform(boxes, trans, offsets):
+    """Applies an instance transformation and array offsets to boxes."""
+    if not len(boxes):
+        return boxes
+    t = pya.DCplxTrans(trans.mag, trans.angle, trans.is_mirror(), trans.disp.x, trans.disp.y)
+    ex = t * pya.DVector(1, 0)
+    ey = t * pya.DVector(0, 1)
+    xs = boxes[:, [0, 2, 0, 2]]
+    ys = boxes[:, [1, 1, 3, 3]]
+    tx = xs * ex.x + ys * ey.x + t.disp.x
+    ty = xs * ex.y + ys * ey.y + t.disp.y
+    placed = np.stack([tx.min(axis=1), ty.min(axis=1), tx.max(axis=1), ty.max(axis=1)], axis=1)
+    shifts = np.tile(offsets, (1, 2))
+    return (placed[None, :, :] + shifts[:, None, :]).reshape(-1, 4)
+
+def _place(parts):
+    """Combines the data of child cells placed by instance arrays."""
+    boxes, kinds, pads, pad_parent, pad_no = [], [], [], [], []
+    count = 0
+    for c_boxes, c_kinds, c_pads, c_parent, c_no, inst in parts:
+        offsets = [(0, 0)]
+        if inst.is_regular_array():
+            offsets = [(ii * inst.a.x + jj * inst.b.x, ii * inst.a.y + jj * inst.b.y)
+                       for ii in range(inst.na) for jj in range(inst.nb)]
+        offsets = np.array(offsets, dtype=float)
+        n = len(offsets)
+        boxes.append(_transform(c_boxes, inst.cplx_trans, offsets))
+        kinds.append(np.tile(c_kinds, n))
+        pads.append(_transform(c_pads, inst.cplx_trans, offsets))
+        per_copy = np.arange(n)[:, None] * len(c_boxes) + count
+        pad_parent.append((c_parent[None, :] + per_copy).ravel())
+        pad_no.append(np.tile(c_no, n))
+        count += n * len(c_boxes)
+    if not parts:
+        return (np.zeros((0, 4)), np.zeros(0, dtype=np.int64), np.zeros((0, 4)),
+                np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    return (np.concatenate(boxes), np.concatenate(kinds), np.concatenate(pads),
+            np.concatenate(pad_parent), np.concatenate(pad_no))
@@ -7,6 +7,7 @@ Used for measuring sheet resistance and maybe contact resistance.
 import pya
 import math
 
+import constraints
 import helpers
 
 class six_p_tlm(pya.PCellDeclarationHelper):
@@ -32,15 +33,19 @@ class six_p_tlm(pya.PCellDeclarationHelper):
     self.param("disp_W", self.TypeBoolean, "Display W?", default=True)
     self.param("disp_dL", self.TypeBoolean, "Display dL?", default=True)
     self.param("text_h", self.TypeDouble, "Text Height", default = 20)
+    self.param("font", self.TypeString, "Label Font", default="Default",
+               choices=[(font, font) for font in helpers.FONTS])
+    self.param("merge", self.TypeBoolean, "Merge shapes?", default=False)
 
 
   def display_text_impl(self):
     return f'six p tlm dl={self.dl} contact={self.contact_size}'
   
   def coerce_parameters_impl(self):
-    pass
+    constraints.coerce_pcell(self)
 
   def produce_impl(self):
+    constraints.check_pcell(self)
     dbu = self.layout.dbu
     w = self.width / dbu
     dl = self.dl / dbu
@@ -56,8 +61,9 @@ class six_p_tlm(pya.PCellDeclarationHelper):
 
     for ii in range(6):
       contact_x += ii * dl + contact_size
-      self.cell.shapes(self.contact_layer).insert(pya.Box(
-          *helpers.center_size_to_points(contact_x, 0, contact_size, contact_size)))
+      if not helpers.draft():
+        self.cell.shapes(self.contact_layer).insert(pya.Box(
+            *helpers.center_size_to_points(contact_x, 0, contact_size, contact_size)))
       y_dir = 1 if bool(ii % 2) else -1
       self.cell.shapes(self.metal_layer).insert(pya.Box(
           contact_x - metal_w / 2, - y_dir * w,
@@ -102,12 +108,10 @@ class six_p_tlm(pya.PCellDeclarationHelper):
     if self.disp_C:
         disp_str += f'C={self.contact_size:g} '
     
-    if disp_str:
+    if disp_str and not helpers.draft():
         # Generate klayout region containing text
         # This can only generate with lower left at (0, 0)
-        text_generator = pya.TextGenerator.default_generator()
-        # default height is .7; third argument rescales to desired size
-        text = text_generator.text(disp_str[:-1], self.layout.dbu, self.text_h / .7)
+        text = helpers.label(disp_str[:-1], self.layout.dbu, self.text_h, self.font)
 
         # Adjust position of region
         bbox = text.bbox()
@@ -119,3 +123,7 @@ class six_p_tlm(pya.PCellDeclarationHelper):
         # Add region to metal layer
         self.cell.shapes(self.metal_layer).insert (text)
 
+    # Optionally merge each layer into a minimal set of polygons
+    if self.merge:
+        helpers.merge_shapes(self.cell)
+
@@ -0,0 +1,283 @@
+"""
+Spec-file driven batch builds.
+
+A spec lists one structure per row: the PCell name, its placement x, y in
+um and the parameters that differ from the defaults. Rows are read lazily
+from CSV, JSON Lines, JSON or YAML files, checked against the parameter
+declarations and constraints of the PCell and built in chunks by worker
+processes, so a large mask spec never sits in memory as a whole.
+
+CSV files have the columns pcell, x, y and one column per parameter; empty
+cells keep the default. JSON and YAML rows are objects with the same keys,
+or with the parameters nested under "params". JSON and YAML files hold a
+list of rows.
+"""
+
+import csv
+import json
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pya
+
+import constraints
+import library
+from stream_writer import open_writer
+from wafer_map import write_structures
+
+_TRUE = ('1', 'true', 'yes', 'y', 'on')
+_FALSE = ('0', 'false', 'no', 'n', 'off', '')
+
+_declarations = {}
+
+def declarations(pcell):
+    """Returns {parameter name: PCellParameterDeclaration} of a PCell."""
+    if pcell not in _declarations:
+        _declarations[pcell] = {decl.name: decl
+                                for decl in library.PCELLS[pcell]().get_parameters()}
+    return _declarations[pcell]
+
+def parse_value(decl, value):
+    """Converts a spec value to the declared type of a parameter.
+
+    Layers are returned as strings like '1/0' so rows stay JSON and pickle
+    friendly; write_structures turns them into LayerInfos.
+
+    Raises:
+        ValueError if the value does not fit the declaration
+    """
+    types = pya.PCellParameterDeclaration
+    if decl.type == types.TypeBoolean:
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in _TRUE or text in _FALSE:
+            return text in _TRUE
+        raise ValueError(f'{decl.name} must be a boolean, not {value!r}')
+    if decl.type in (types.TypeInt, types.TypeDouble):
+        try:
+            if isinstance(value, bool):
+                raise ValueError
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{decl.name} must be a number, not {value!r}') from None
+        if decl.type == types.TypeDouble:
+            return number
+        if not number.is_integer():
+            raise ValueError(f'{decl.name} must be an integer, not {value!r}')
+        return int(number)
+    if decl.type == types.TypeLayer:
+        info = value if isinstance(value, pya.LayerInfo) else pya.LayerInfo.from_string(str(value))
+        if info.is_named():
+            raise ValueError(f'{decl.name} must be a layer like 1/0, not {value!r}')
+        return str(info)
+    if decl.type == types.TypeList and isinstance(value, str):
+        return [item.strip() for item in value.split(',')]
+    if decl.type == types.TypeString:
+        return str(value)
+    return value
+
+
+def _csv_rows(f):
+    reader = csv.DictReader(f)
+    for row in reader:
+        yield reader.line_num, {k: v for k, v in row.items() if v not in ('', None)}
+
+def _json_lines(f):
+    for number, line in enumerate(f, 1):
+        if line.strip():
+            yield number, json.loads(line)
+
+def _json_array(f, size=1 << 16):
+    """Yields the items of a top-level JSON array without reading it whole."""
+    decoder = json.JSONDecoder()
+    buffer = f.read(size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('JSON specs must be a list of rows')
+    buffer = buffer[1:]
+    number = 0
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            row, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = f.read(size)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+        number += 1
+        yield number, row
+        buffer = buffer[end:]
+
+def _yaml_rows(f):
+    """Yields the items of a top-level YAML list one node at a time."""
+    import yaml
+    loader = yaml.SafeLoader(f)
+    try:
+        loader.get_event()
+        loader.get_event()
+        if not loader.check_event(yaml.SequenceStartEvent):
+            raise ValueError('YAML specs must be a list of rows')
+        loader.get_event()
+        number = 0
+        while not loader.check_event(yaml.SequenceEndEvent):
+            number += 1
+            yield number, loader.construct_document(loader.compose_node(None, None))
+    finally:
+        loader.dispose()
+
+_READERS = {
+    '.csv': _csv_rows,
+    '.jsonl': _json_lines,
+    '.ndjson': _json_lines,
+    '.json': _json_array,
+    '.yaml': _yaml_rows,
+    '.yml': _yaml_rows,
+}
+
+def read_rows(path):
+    """Yields (row number, raw row dict) from a spec file.
+
+    Row numbers are lines for CSV and JSON Lines files and list positions
+    for JSON and YAML files.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _READERS:
+        raise ValueError(f'unknown spec format {ext!r}')
+    with open(path, newline='') as f:
+        yield from _READERS[ext](f)
+
+
+def parse_row(row, fix=False):
+    """Checks one raw row.
+
+    Args:
+        fix applies the automatic corrections of constraints
+    Returns:
+        ((pcell, params, x, y), []) with complete parameters, or
+        (None, messages) if the row is not valid
+    """
+    row = dict(row)
+    pcell = row.pop('pcell', None)
+    if pcell not in library.PCELLS:
+        return None, [f'unknown pcell {pcell!r}']
+    decls = declarations(pcell)
+    errors = []
+    x = row.pop('x', None)
+    y = row.pop('y', None)
+    try:
+        x, y = float(x), float(y)
+    except (TypeError, ValueError):
+        errors.append('x and y must be numbers')
+
+    given = dict(row.pop('params', None) or {})
+    given.update(row)
+    params = {name: parse_value(decl, decl.default) for name, decl in decls.items()}
+    for name, value in given.items():
+        if name not in decls:
+            errors.append(f'{pcell} has no parameter {name!r}')
+            continue
+        try:
+            params[name] = parse_value(decls[name], value)
+        except ValueError as e:
+            errors.append(str(e))
+    if errors:
+        return None, errors
+
+    if fix:
+        params = constraints.coerce(pcell, params)
+    errors = constraints.check(pcell, params)
+    if errors:
+        return None, errors
+    return (pcell, params, x, y), []
+
+def load_spec(path, fix=False, rejected=None):
+    """Yields the valid placements of a spec file as (pcell, params, x, y).
+
+    Args:
+        rejected is a list receiving (row number, row, messages) for
+            every invalid row; invalid rows are skipped
+    """
+    for number, row in read_rows(path):
+        placement, errors = parse_row(row, fix)
+        if errors:
+            if rejected is not None:
+                rejected.append((number, row, errors))
+            continue
+        yield placement
+
+def chunks(items, size):
+    """Groups an iterable into lists of at most size items."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _build_chunk(args):
+    path, placements, name, prefix, dbu = args
+    with open_writer(path, dbu) as writer:
+        write_structures(writer, placements, name, dbu, prefix)
+    return path
+
+def merge_chunks(paths, path, top='TOP', dbu=.001):
+    """Merges chunk files into one file, reading one chunk at a time.
+
+    Cell names must be unique across chunks. The top cells of all chunks
+    are placed at the origin of a new top cell.
+    """
+    chunk_tops = []
+    with open_writer(path, dbu) as writer:
+        for chunk_path in paths:
+            layout = pya.Layout()
+            layout.read(chunk_path)
+            for ci in layout.each_cell_bottom_up():
+                writer.write_cell(layout.cell(ci))
+            chunk_tops += [cell.name for cell in layout.top_cells()]
+            layout._destroy()
+        writer.begin_cell(top)
+        for name in chunk_tops:
+            writer.sref(name, 0, 0)
+        writer.end_cell()
+
+def build_spec(spec, path, chunk_size=1000, workers=None, fix=False, dbu=.001, top='TOP'):
+    """Builds every valid row of a spec file into a GDSII or OASIS file.
+
+    Rows are read, checked and handed to the workers chunk by chunk. Each
+    worker writes its chunk to a temporary file, and the chunks are merged
+    into path at the end. At most two chunks per worker are in flight.
+
+    Args:
+        chunk_size is the number of rows per chunk
+        workers is the process count; defaults to the CPU count
+        fix applies the automatic corrections of constraints
+    Returns:
+        the rejected rows as (row number, row, messages)
+    """
+    rejected = []
+    ext = os.path.splitext(path)[1]
+    workers = workers or os.cpu_count()
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = ((os.path.join(tmp, f'chunk{n}{ext}'), chunk, f'CHUNK{n}', f'c{n}_', dbu)
+                for n, chunk in enumerate(chunks(load_spec(spec, fix, rejected), chunk_size)))
+        if workers == 1:
+            files = list(map(_build_chunk, jobs))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = []
+                for job in jobs:
+                    pending = [future for future in futures if not future.done()]
+                    if len(pending) >= 2 * workers:
+                        wait(pending, return_when=FIRST_COMPLETED)
+                    futures.append(pool.submit(_build_chunk, job))
+                files = [future.result() for future in futures]
+        merge_chunks(files, path, top, dbu)
+    return rejected
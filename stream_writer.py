@@ -0,0 +1,375 @@
+"""
+Streaming GDSII and OASIS writers.
+
+Write cells record by record as they are produced, so nothing has to be
+collected in a pya.Layout first. Coordinates are integers in dbu. Both
+writers share one interface; open_writer picks one by file extension.
+"""
+
+import os
+import struct
+import time
+import zlib
+
+import pya
+
+# GDSII record types, combined with their data type
+HEADER = 0x0002
+BGNLIB = 0x0102
+LIBNAME = 0x0206
+UNITS = 0x0305
+ENDLIB = 0x0400
+BGNSTR = 0x0502
+STRNAME = 0x0606
+ENDSTR = 0x0700
+BOUNDARY = 0x0800
+SREF = 0x0A00
+AREF = 0x0B00
+TEXT = 0x0C00
+LAYER = 0x0D02
+DATATYPE = 0x0E02
+XY = 0x1003
+ENDEL = 0x1100
+SNAME = 0x1206
+COLROW = 0x1302
+TEXTTYPE = 0x1602
+STRING = 0x1906
+STRANS = 0x1A01
+MAG = 0x1B05
+ANGLE = 0x1C05
+
+# Keeps XY records below 32 kB, which some readers treat as a signed length
+MAX_POINTS = 4000
+
+# OASIS record ids
+OASIS_MAGIC = b'%SEMI-OASIS\r\n'
+OASIS_START = 1
+OASIS_END = 2
+OASIS_CELL = 14
+OASIS_PLACEMENT = 17
+OASIS_PLACEMENT_MAG = 18
+OASIS_TEXT = 19
+OASIS_RECTANGLE = 20
+OASIS_POLYGON = 21
+OASIS_CBLOCK = 34
+
+# Uncompressed bytes collected before an OASIS CBLOCK is written
+CBLOCK_SIZE = 1 << 20
+
+
+def _real8(value):
+    """Encodes a float in the excess-64, base-16 GDSII format."""
+    if value == 0:
+        return bytes(8)
+    sign = 0x80 if value < 0 else 0
+    value = abs(value)
+    exponent = 64
+    while value >= 1:
+        value /= 16
+        exponent += 1
+    while value < 1 / 16:
+        value *= 16
+        exponent -= 1
+    mantissa = int(round(value * 2 ** 56))
+    if mantissa >= 2 ** 56:
+        mantissa >>= 4
+        exponent += 1
+    return bytes([sign | exponent]) + mantissa.to_bytes(7, 'big')
+
+
+class _StreamWriter:
+  """Shared part of the writers: context manager, regions and pya cells."""
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def region(self, layer, datatype, region):
+    """Writes the polygons of a pya.Region, resolving holes."""
+    polygons = list(region.each())
+    while polygons:
+      polygon = polygons.pop()
+      if polygon.is_box():
+        box = polygon.bbox()
+        self.box(layer, datatype, box.left, box.bottom, box.right, box.top)
+        continue
+      if polygon.holes():
+        polygon = polygon.resolved_holes()
+      if polygon.num_points() > MAX_POINTS:
+        polygons.extend(polygon.split())
+        continue
+      self.polygon(layer, datatype, [(p.x, p.y) for p in polygon.each_point_hull()])
+
+  def write_cell(self, cell, name=None, child_name=None):
+    """Writes the shapes and instances of a pya.Cell as one cell.
+
+    The layout must use the dbu of the writer. Child cells are referenced
+    by child_name(cell) (default: their name) and have to be written
+    separately.
+    """
+    layout = cell.layout()
+    child_name = child_name or (lambda child: child.name)
+    self.begin_cell(name or cell.name)
+    for li in layout.layer_indexes():
+      info = layout.get_info(li)
+      shapes = cell.shapes(li)
+      if shapes.is_empty():
+        continue
+      for shape in shapes.each(pya.Shapes.STexts):
+        text = shape.text
+        self.text(info.layer, info.datatype, text.string, text.x, text.y)
+      self.region(info.layer, info.datatype, pya.Region(shapes))
+    for inst in cell.each_inst():
+      array = inst.cell_inst
+      trans = array.cplx_trans
+      child = child_name(layout.cell(array.cell_index))
+      args = (trans.angle, trans.is_mirror(), trans.mag)
+      if array.is_regular_array():
+        self.aref(child, trans.disp.x, trans.disp.y, array.na, array.nb,
+                  (array.a.x, array.a.y), (array.b.x, array.b.y), *args)
+      else:
+        self.sref(child, trans.disp.x, trans.disp.y, *args)
+    self.end_cell()
+
+
+class GdsWriter(_StreamWriter):
+  """Writes a GDSII library one cell at a time.
+
+  Use as a context manager, or call close() when done:
+      with GdsWriter('out.gds', dbu=.001) as gds:
+          gds.begin_cell('TOP')
+          gds.box(1, 0, 0, 0, 1000, 1000)
+          gds.end_cell()
+  """
+
+  def __init__(self, path, dbu=.001, libname='EE312'):
+    self.file = open(path, 'wb')
+    self.in_cell = False
+    stamp = time.localtime()[:6]
+    self._record(HEADER, struct.pack('>h', 600))
+    self._record(BGNLIB, struct.pack('>12h', *stamp, *stamp))
+    self._record(LIBNAME, self._string(libname))
+    # Database unit in user units (um) and in meters
+    self._record(UNITS, _real8(dbu) + _real8(dbu * 1e-6))
+
+  def _record(self, record, data=b''):
+    self.file.write(struct.pack('>HH', len(data) + 4, record))
+    self.file.write(data)
+
+  @staticmethod
+  def _string(text):
+    data = text.encode('ascii')
+    return data + b'\0' if len(data) % 2 else data
+
+  def _xy(self, points):
+    self._record(XY, struct.pack(f'>{2 * len(points)}i',
+                                 *(int(c) for point in points for c in point)))
+
+  def _strans(self, rot, mirror, mag):
+    if rot or mirror or mag != 1:
+      self._record(STRANS, struct.pack('>H', 0x8000 if mirror else 0))
+      if mag != 1:
+        self._record(MAG, _real8(mag))
+      if rot:
+        self._record(ANGLE, _real8(rot))
+
+  def begin_cell(self, name):
+    """Starts a cell; cells may not be nested."""
+    stamp = time.localtime()[:6]
+    self._record(BGNSTR, struct.pack('>12h', *stamp, *stamp))
+    self._record(STRNAME, self._string(name))
+    self.in_cell = True
+
+  def end_cell(self):
+    self._record(ENDSTR)
+    self.in_cell = False
+
+  def polygon(self, layer, datatype, points):
+    """Writes a polygon given as (x, y) points without holes."""
+    points = list(points)
+    if len(points) > MAX_POINTS:
+      raise ValueError(f'GDSII polygons are limited to {MAX_POINTS} points')
+    self._record(BOUNDARY)
+    self._record(LAYER, struct.pack('>h', layer))
+    self._record(DATATYPE, struct.pack('>h', datatype))
+    self._xy(points + points[:1])
+    self._record(ENDEL)
+
+  def box(self, layer, datatype, left, bottom, right, top):
+    self.polygon(layer, datatype, [(left, bottom), (left, top), (right, top), (right, bottom)])
+
+  def text(self, layer, texttype, string, x, y):
+    self._record(TEXT)
+    self._record(LAYER, struct.pack('>h', layer))
+    self._record(TEXTTYPE, struct.pack('>h', texttype))
+    self._xy([(x, y)])
+    self._record(STRING, self._string(string))
+    self._record(ENDEL)
+
+  def sref(self, name, x, y, rot=0, mirror=False, mag=1):
+    """Places a cell once; rot is in degrees."""
+    self._record(SREF)
+    self._record(SNAME, self._string(name))
+    self._strans(rot, mirror, mag)
+    self._xy([(x, y)])
+    self._record(ENDEL)
+
+  def aref(self, name, x, y, cols, rows, col_step, row_step, rot=0, mirror=False, mag=1):
+    """Places a cell as a cols x rows array; steps are (dx, dy) vectors."""
+    self._record(AREF)
+    self._record(SNAME, self._string(name))
+    self._strans(rot, mirror, mag)
+    self._record(COLROW, struct.pack('>hh', cols, rows))
+    self._xy([(x, y),
+              (x + cols * col_step[0], y + cols * col_step[1]),
+              (x + rows * row_step[0], y + rows * row_step[1])])
+    self._record(ENDEL)
+
+  def close(self):
+    if self.file.closed:
+      return
+    if self.in_cell:
+      self.end_cell()
+    self._record(ENDLIB)
+    self.file.close()
+
+
+def _uint(value):
+    """Encodes an OASIS unsigned integer, 7 bits per byte."""
+    data = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            data.append(byte | 0x80)
+        else:
+            data.append(byte)
+            return bytes(data)
+
+def _sint(value):
+    """Encodes an OASIS signed integer, sign in the lowest bit."""
+    return _uint(- value << 1 | 1 if value < 0 else value << 1)
+
+def _gdelta(dx, dy):
+    """Encodes an OASIS displacement in the two integer form."""
+    return _uint(abs(dx) << 2 | (dx < 0) << 1 | 1) + _sint(dy)
+
+def _oasis_real(value):
+    if value == int(value) and value >= 0:
+        return _uint(0) + _uint(int(value))
+    return _uint(7) + struct.pack('<d', value)
+
+def _astring(text):
+    data = text.encode('ascii')
+    return _uint(len(data)) + data
+
+
+class OasisWriter(_StreamWriter):
+  """Writes an OASIS file one cell at a time, each cell deflated in CBLOCKs.
+
+  Same interface as GdsWriter. Every record carries all of its fields, so
+  no modal state crosses cell or CBLOCK boundaries.
+  """
+
+  def __init__(self, path, dbu=.001, level=6):
+    self.file = open(path, 'wb')
+    self.level = level
+    self.in_cell = False
+    self.buffer = bytearray()
+    self.file.write(OASIS_MAGIC)
+    # Version, grid steps per um, and six empty name table offsets kept here
+    self.file.write(_uint(OASIS_START) + _astring('1.0') + _oasis_real(1 / dbu)
+                    + _uint(0) + _uint(0) * 12)
+
+  def _record(self, data):
+    self.buffer += data
+    if len(self.buffer) >= CBLOCK_SIZE:
+      self._flush()
+
+  def _flush(self):
+    if not self.buffer:
+      return
+    deflate = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+    data = deflate.compress(bytes(self.buffer)) + deflate.flush()
+    self.file.write(_uint(OASIS_CBLOCK) + _uint(0) + _uint(len(self.buffer))
+                    + _uint(len(data)) + data)
+    self.buffer = bytearray()
+
+  def begin_cell(self, name):
+    """Starts a cell; cells may not be nested."""
+    self._record(_uint(OASIS_CELL) + _astring(name))
+    self.in_cell = True
+
+  def end_cell(self):
+    self._flush()
+    self.in_cell = False
+
+  def polygon(self, layer, datatype, points):
+    """Writes a polygon given as (x, y) points without holes."""
+    points = [(int(x), int(y)) for x, y in points]
+    if points[0] == points[-1]:
+      points.pop()
+    deltas = b''.join(_gdelta(x1 - x0, y1 - y0)
+                      for (x0, y0), (x1, y1) in zip(points, points[1:]))
+    # Point list type 4: arbitrary deltas, closed implicitly
+    self._record(_uint(OASIS_POLYGON) + bytes([0x3b]) + _uint(layer) + _uint(datatype)
+                 + _uint(4) + _uint(len(points) - 1) + deltas
+                 + _sint(points[0][0]) + _sint(points[0][1]))
+
+  def box(self, layer, datatype, left, bottom, right, top):
+    self._record(_uint(OASIS_RECTANGLE) + bytes([0x7b]) + _uint(layer) + _uint(datatype)
+                 + _uint(int(right - left)) + _uint(int(top - bottom))
+                 + _sint(int(left)) + _sint(int(bottom)))
+
+  def text(self, layer, texttype, string, x, y):
+    self._record(_uint(OASIS_TEXT) + bytes([0x5b]) + _astring(string)
+                 + _uint(layer) + _uint(texttype) + _sint(int(x)) + _sint(int(y)))
+
+  def _placement(self, name, x, y, rot, mirror, mag, repetition=b''):
+    info = 0xb0 | (0x08 if repetition else 0) | (0x01 if mirror else 0)
+    if mag == 1 and rot % 90 == 0:
+      record = (_uint(OASIS_PLACEMENT) + bytes([info | int(rot // 90) % 4 << 1])
+                + _astring(name))
+    else:
+      record = (_uint(OASIS_PLACEMENT_MAG) + bytes([info | 0x06]) + _astring(name)
+                + _oasis_real(mag) + _oasis_real(rot))
+    self._record(record + _sint(int(x)) + _sint(int(y)) + repetition)
+
+  def sref(self, name, x, y, rot=0, mirror=False, mag=1):
+    """Places a cell once; rot is in degrees."""
+    self._placement(name, x, y, rot, mirror, mag)
+
+  def aref(self, name, x, y, cols, rows, col_step, row_step, rot=0, mirror=False, mag=1):
+    """Places a cell as a cols x rows array; steps are (dx, dy) vectors."""
+    col_step = tuple(int(c) for c in col_step)
+    row_step = tuple(int(c) for c in row_step)
+    if cols > 1 and rows > 1:
+      repetition = (_uint(8) + _uint(cols - 2) + _uint(rows - 2)
+                    + _gdelta(*col_step) + _gdelta(*row_step))
+    elif cols > 1:
+      repetition = _uint(9) + _uint(cols - 2) + _gdelta(*col_step)
+    elif rows > 1:
+      repetition = _uint(9) + _uint(rows - 2) + _gdelta(*row_step)
+    else:
+      repetition = b''
+    self._placement(name, x, y, rot, mirror, mag, repetition)
+
+  def close(self):
+    if self.file.closed:
+      return
+    if self.in_cell:
+      self.end_cell()
+    # END is padded to 256 bytes; no validation
+    end = _uint(OASIS_END)
+    padding = 256 - len(end) - 1 - 2
+    self.file.write(end + _uint(padding) + bytes(padding) + _uint(0))
+    self.file.close()
+
+
+def open_writer(path, dbu=.001):
+    """Returns an OasisWriter for .oas files, else a GdsWriter."""
+    if os.path.splitext(path)[1].lower() in ('.oas', '.oasis'):
+      return OasisWriter(path, dbu)
+    return GdsWriter(path, dbu)
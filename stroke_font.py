@@ -0,0 +1,88 @@
+"""
+Compact Manhattan font for structure labels.
+
+Glyphs are drawn on a 3 x 5 grid with strokes one grid unit wide, so each
+character is a few axis-aligned rectangles instead of the chamfered
+outlines of the default KLayout font. Characters without a glyph fall back
+to their upper case form, or a blank.
+"""
+
+import pya
+
+# Rows from top to bottom, '#' is a filled grid square
+GLYPHS = {
+    '0': ('###', '#.#', '#.#', '#.#', '###'),
+    '1': ('##.', '.#.', '.#.', '.#.', '.#.'),
+    '2': ('###', '..#', '###', '#..', '###'),
+    '3': ('###', '..#', '###', '..#', '###'),
+    '4': ('#.#', '#.#', '###', '..#', '..#'),
+    '5': ('###', '#..', '###', '..#', '###'),
+    '6': ('###', '#..', '###', '#.#', '###'),
+    '7': ('###', '..#', '..#', '..#', '..#'),
+    '8': ('###', '#.#', '###', '#.#', '###'),
+    '9': ('###', '#.#', '###', '..#', '###'),
+    'A': ('###', '#.#', '###', '#.#', '#.#'),
+    'B': ('##.', '#.#', '##.', '#.#', '##.'),
+    'C': ('###', '#..', '#..', '#..', '###'),
+    'D': ('##.', '#.#', '#.#', '#.#', '##.'),
+    'E': ('###', '#..', '###', '#..', '###'),
+    'F': ('###', '#..', '###', '#..', '#..'),
+    'G': ('###', '#..', '#.#', '#.#', '###'),
+    'H': ('#.#', '#.#', '###', '#.#', '#.#'),
+    'I': ('###', '.#.', '.#.', '.#.', '###'),
+    'J': ('..#', '..#', '..#', '#.#', '###'),
+    'K': ('#.#', '#.#', '##.', '#.#', '#.#'),
+    'L': ('#..', '#..', '#..', '#..', '###'),
+    'M': ('#.#', '###', '###', '#.#', '#.#'),
+    'N': ('##.', '#.#', '#.#', '#.#', '#.#'),
+    'O': ('###', '#.#', '#.#', '#.#', '###'),
+    'P': ('###', '#.#', '###', '#..', '#..'),
+    'Q': ('###', '#.#', '#.#', '###', '..#'),
+    'R': ('###', '#.#', '##.', '#.#', '#.#'),
+    'S': ('###', '#..', '###', '..#', '###'),
+    'T': ('###', '.#.', '.#.', '.#.', '.#.'),
+    'U': ('#.#', '#.#', '#.#', '#.#', '###'),
+    'V': ('#.#', '#.#', '#.#', '#.#', '.#.'),
+    'W': ('#.#', '#.#', '###', '###', '#.#'),
+    'X': ('#.#', '#.#', '.#.', '#.#', '#.#'),
+    'Y': ('#.#', '#.#', '.#.', '.#.', '.#.'),
+    'Z': ('###', '..#', '.#.', '#..', '###'),
+    'd': ('..#', '..#', '###', '#.#', '###'),
+    'e': ('...', '###', '###', '#..', '###'),
+    '=': ('...', '###', '...', '###', '...'),
+    '-': ('...', '...', '###', '...', '...'),
+    '+': ('...', '.#.', '###', '.#.', '...'),
+    '.': ('...', '...', '...', '...', '.#.'),
+}
+
+# Glyph size and character pitch in grid units
+WIDTH = 3
+HEIGHT = 5
+ADVANCE = 4
+
+_regions = {}
+
+def _glyph(char):
+    """Returns the merged glyph of a character in grid units."""
+    if char not in GLYPHS:
+        char = char.upper()
+    if char not in _regions:
+        region = pya.Region()
+        for row, line in enumerate(GLYPHS.get(char, ())):
+            for col, pixel in enumerate(line):
+                if pixel == '#':
+                    region.insert(pya.Box(col, HEIGHT - row - 1, col + 1, HEIGHT - row))
+        _regions[char] = region.merged()
+    return _regions[char]
+
+def text(string, dbu, text_h):
+    """Returns a pya.Region of string with its lower left at (0, 0).
+
+    Args:
+        text_h is the character height in um, as for the text_h
+            parameter of the PCells
+    """
+    region = pya.Region()
+    for ii, char in enumerate(string):
+        region.insert(_glyph(char).moved(ii * ADVANCE, 0))
+    return region.transformed(pya.ICplxTrans(text_h / HEIGHT / dbu))
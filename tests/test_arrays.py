@@ -0,0 +1,30 @@
+import pya
+
+import helpers
+import library
+
+
+def _contacts(layout, cell):
+    return pya.Region(cell.begin_shapes_rec(layout.layer(3, 0))).merged().count()
+
+def test_library_arrays_in_one_layout_round_trip(tmp_path):
+    library.load()
+    layout = pya.Layout()
+    top = layout.create_cell('TOP')
+    for ii, pcell in enumerate(['tlm_array', 'fpp_array']):
+        cell = layout.create_cell(pcell, 'EE312', {})
+        top.insert(pya.CellInstArray(cell.cell_index(), pya.Trans(0, ii * 3000000)))
+    counts = {'tlm_array': 40, 'fpp_array': 13}
+    for pcell, expected in counts.items():
+        assert _contacts(layout, layout.cell(pcell)) == expected
+
+    path = str(tmp_path / 'arrays.gds')
+    helpers.write_layout(layout, path)
+    read = pya.Layout()
+    read.read(path)
+    for pcell, expected in counts.items():
+        assert _contacts(read, read.cell(pcell)) == expected
+    assert _contacts(read, read.cell('TOP')) == sum(counts.values())
+    # Each variant places its own contact cell
+    children = [{read.cell(ci).name for ci in read.cell(pcell).called_cells()} for pcell in counts]
+    assert len(children[0]) == len(children[1]) == 1 and not children[0] & children[1]
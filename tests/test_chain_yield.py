@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+import library
+from chain_yield import (analyze, chain_geometry, chains, die_grid, fit_negative_binomial,
+                         fit_poisson, join_ratio, morans_i, yield_table)
+from grid_labels import site_name
+from prober_store import ingest
+from site_index import SiteIndex
+
+SIZES = np.array([100., 1000., 10000.])
+TESTED = np.array([5000, 5000, 5000])
+
+
+def test_yield_table_counts_per_size():
+    sizes, tested, failed = yield_table([24, 140, 24, 24, 140], [True, False, False, True, False])
+    assert sizes.tolist() == [24, 140]
+    assert tested.tolist() == [3, 2]
+    assert failed.tolist() == [2, 0]
+
+def test_fit_poisson_recovers_lambda():
+    lam = 2e-5
+    failed = TESTED * (1 - np.exp(- lam * SIZES))
+    assert fit_poisson(SIZES, TESTED, failed) == pytest.approx(lam, rel=1e-3)
+
+def test_fit_negative_binomial_recovers_clustering():
+    lam, alpha = 1e-4, 2.
+    failed = TESTED * (1 - (1 + lam * SIZES / alpha) ** - alpha)
+    fit_lam, fit_alpha = fit_negative_binomial(SIZES, TESTED, failed)
+    assert fit_lam == pytest.approx(lam, rel=5e-2)
+    assert fit_alpha == pytest.approx(alpha, rel=1e-1)
+    # Clustered fails yield better than Poisson at the largest size
+    assert fit_poisson(SIZES, TESTED, failed) < lam
+
+def test_spatial_statistics():
+    checkerboard = np.indices((6, 6)).sum(axis=0) % 2.
+    halves = np.zeros((6, 6))
+    halves[:, :3] = 1
+    assert morans_i(checkerboard) == pytest.approx(-1)
+    assert morans_i(halves) > .5
+    assert join_ratio(checkerboard) == 0
+    assert join_ratio(halves) > 1.5
+    # Missing dies are left out
+    holes = halves.copy()
+    holes[0, 0] = holes[5, 5] = np.nan
+    assert morans_i(holes) > .5
+
+def test_die_grid_parses_site_names():
+    cols, rows = die_grid(['A1', 'C2', 'AB10'])
+    assert cols.tolist() == [0, 2, 27] and rows.tolist() == [0, 1, 9]
+
+def test_chain_geometry_counts_contacts():
+    library.load()
+    structures = [{'pcell': 'contact_chain', 'params': {}},
+                  {'pcell': 'vdp', 'params': {}},
+                  {'pcell': 'contact_chain', 'params': {'bar_len': 20}}]
+    geometry = chain_geometry(structures)
+    assert sorted(geometry) == [0, 2]
+    assert geometry[0]['contacts'] == 140 and geometry[2]['contacts'] == 24
+    assert geometry[0]['contact_area'] == 4
+    # Longer bars use fewer, longer links
+    assert geometry[2]['si_squares'] < geometry[0]['si_squares']
+
+
+def _store(tmp_path, r_contact=5.):
+    meta = [{'pcell': 'contact_chain', 'library': 'EE312', 'cell': 'chain',
+             'params': {}},
+            {'pcell': 'contact_chain', 'library': 'EE312', 'cell': 'chain$1',
+             'params': {'bar_len': 20}}]
+    index = SiteIndex([[0, 0, 10, 10], [20, 0, 30, 10]], [0, 1], meta, [], [], [])
+    sites = {'S0': (5, 5), 'S1': (25, 5)}
+    rng = np.random.default_rng(1)
+    tmp_path.mkdir(exist_ok=True)
+    path = tmp_path / 'log.csv'
+    with open(path, 'w') as f:
+        f.write('die,site,R\n')
+        for col in range(6):
+            for row in range(6):
+                # The long chains of the left half of the wafer are open,
+                # measured either as NaN or as a huge resistance
+                for site, contacts in [('S0', 140), ('S1', 24)]:
+                    r = contacts * r_contact
+                    if col < 3 and site == 'S0':
+                        r = 'nan' if rng.random() < .5 else 1e9
+                    f.write(f'{site_name(col, row)},{site},{r}\n')
+    return ingest(str(path), tmp_path / 'store', index, sites)
+
+def test_chains_normalize_by_contacts(tmp_path):
+    data = chains(_store(tmp_path))
+    assert sorted(set(data['contacts'])) == [24, 140]
+    closed = ~data['open']
+    assert data['r_contact'][closed] == pytest.approx(5.)
+    assert np.isnan(data['r_contact'][data['open']]).all()
+    assert data['open'].any() and closed.any()
+    # Link resistance is removed before dividing
+    links = chains(_store(tmp_path / 'links'), rsh_si=.01)
+    assert (links['r_contact'][closed] < 5).all()
+
+def test_analyze_finds_clustered_fails(tmp_path):
+    result = analyze(_store(tmp_path), n_boot=8, workers=2)
+    sizes, tested, failed = result['yield']
+    assert sizes.tolist() == [24, 140] and tested.tolist() == [36, 36]
+    assert failed.tolist() == [0, 18]
+    assert result['poisson'] > 0
+    assert result['d0'] == pytest.approx(result['poisson'] / 4e-8)
+    assert result['morans_i'] > .5 and result['join_ratio'] > 1.5
+    assert set(result['intervals']) == {'poisson', 'nb_lam', 'nb_alpha', 'morans_i', 'join_ratio'}
+    for low, high in result['intervals'].values():
+        assert low <= high
+    assert 'intervals' not in analyze(_store(tmp_path / 'again'), n_boot=0)
@@ -0,0 +1,55 @@
+import pya
+import pytest
+
+import constraints
+import library
+from wafer_map import produce
+
+
+@pytest.mark.parametrize('pcell', sorted(constraints.RULES))
+def test_defaults_pass_and_produce(pcell):
+    library.load()
+    assert constraints.check(pcell, constraints.defaults(pcell)) == []
+    layout = pya.Layout()
+    assert not produce(layout, pcell, {}).bbox().empty()
+
+
+def test_coerce_cuts_lists_to_the_same_count():
+    params = dict(constraints.defaults('tlm_array'), dl=['10', '20', '30'], width=['5', '6'])
+    assert constraints.check('tlm_array', params)
+    fixed = constraints.coerce('tlm_array', params)
+    assert fixed['dl'] == ['10', '20'] and fixed['width'] == ['5', '6']
+    assert constraints.check('tlm_array', fixed) == []
+    # A single value is used for every line and is kept
+    params = dict(params, width=['20'])
+    assert constraints.coerce('tlm_array', params) == params
+
+
+def test_coerce_shrinks_contacts_to_fit():
+    params = dict(constraints.defaults('vdp'), dia=10, square=4, slit=1, contact_size=8)
+    fixed = constraints.coerce('vdp', params)
+    assert 0 < fixed['contact_size'] < 8
+    assert constraints.check('vdp', fixed) == []
+    params = dict(constraints.defaults('tlm_array'), width=['6', '20'])
+    assert constraints.coerce('tlm_array', params)['contact_size'] == 2
+    assert constraints.check('tlm_array', constraints.coerce('tlm_array', params)) == []
+
+
+def test_produce_refuses_unfixable_parameters(capfd):
+    library.load()
+    layout = pya.Layout()
+    cell = produce(layout, 'tlm_array', {'dl': ['10', '-5']})
+    assert pya.Region(cell.begin_shapes_rec(layout.layer(4, 0))).is_empty()
+    assert 'every dl must be positive' in ''.join(capfd.readouterr())
+    params = constraints.coerce('tlm_array', dict(constraints.defaults('tlm_array'), dl=['10', '-5']))
+    assert constraints.check('tlm_array', params) == ['every dl must be positive']
+
+
+def test_split_rows_reports_rejected_rows():
+    rows = [{'W': 5}, {'W': -1}, {'pad_w': 0, 'W': 2}]
+    accepted, rejected = constraints.split_rows('transistor', rows)
+    assert [p['W'] for p in accepted] == [5]
+    assert [(index, messages) for index, _, messages in rejected] == \
+        [(1, ['W must be positive']), (2, ['pad_w must be positive'])]
+    accepted, rejected = constraints.split_rows('diode', [{'L': .5}], fix=True)
+    assert not rejected and accepted[0]['L'] == accepted[0]['contact_size'] + 5 * accepted[0]['alignment']
@@ -0,0 +1,42 @@
+import os
+
+import pya
+
+import library
+from fingerprint import check_golden, diff_layouts
+
+
+def _build(dls, dbu=.001):
+    layout = pya.Layout()
+    layout.dbu = dbu
+    top = layout.create_cell('TOP')
+    for ii, dl in enumerate(dls):
+        cell = layout.create_cell('tlm', 'EE312', {'dl': dl})
+        top.insert(pya.CellInstArray(cell.cell_index(), pya.Trans(round(ii * 1000 / dbu), 0)))
+    return layout
+
+def test_diff_xors_the_changed_variant():
+    library.load()
+    a = _build([30, 50, 70])
+    # Same structures at another dbu, one variant without its W label
+    b = _build([30, 50, 70], dbu=.0005)
+    tlm50 = [cell for cell in b.each_cell()
+             if cell.is_pcell_variant() and cell.pcell_parameters_by_name()['dl'] == 50][0]
+    params = tlm50.pcell_parameters_by_name()
+    params['disp_W'] = False
+    changed = b.create_cell('tlm', 'EE312', params)
+    for inst in list(tlm50.each_parent_inst()):
+        inst.child_inst().cell_index = changed.cell_index()
+    tlm50.delete()
+
+    diffs = diff_layouts(a, b, tile_size=200, threads=1)
+    keys = {key.split(' ')[0] for key in diffs}
+    assert keys == {'TOP', 'tlm'}
+    # One tlm with dl=50 only in a, the changed one only in b
+    assert sorted(v for v in diffs.values() if isinstance(v, str)) == ['only a', 'only b']
+    assert diffs['TOP']['4/0'] > 0
+    assert set(diffs['TOP']) == {'4/0'}
+
+
+def test_library_matches_golden_fingerprints():
+    assert check_golden(os.path.join(os.path.dirname(__file__), 'golden.json')) == []
@@ -0,0 +1,69 @@
+import pya
+import pytest
+
+import library
+from fracture import fracture_layout, instance_counts, shot_report
+from wafer_map import produce
+
+
+def _wafer():
+    library.load()
+    layout = pya.Layout()
+    top = layout.create_cell('TOP')
+    vdp = produce(layout, 'vdp', {})
+    top.insert(pya.CellInstArray(vdp.cell_index(), pya.Trans(), pya.Vector(1000000, 0),
+                                 pya.Vector(0, 1000000), 2, 3))
+    tlm = produce(layout, 'tlm', {})
+    top.insert(pya.CellInstArray(tlm.cell_index(), pya.Trans(pya.Trans.R90, 3000000, 0)))
+    return layout, top
+
+def _is_trapezoid(polygon):
+    points = list(polygon.each_point_hull())
+    horizontal = sum(a.y == b.y for a, b in zip(points, points[1:] + points[:1]))
+    return len(points) in (3, 4) and horizontal >= len(points) - 2
+
+@pytest.mark.parametrize('tile_size', [50, 1000])
+def test_fractured_gds_covers_the_layout(tmp_path, tile_size):
+    layout, top = _wafer()
+    path = str(tmp_path / 'fractured.gds')
+    counts = fracture_layout(layout, top, path, tile_size=tile_size, threads=2)
+
+    read = pya.Layout()
+    read.read(path)
+    cell = read.cell('FRACTURED')
+    assert cell.child_cells() == 0
+    assert read.dbu == layout.dbu
+    for li in layout.layer_indexes():
+        info = layout.get_info(li)
+        original = pya.Region(top.begin_shapes_rec(li)).merged()
+        shapes = cell.shapes(read.layer(info))
+        assert shapes.size() == counts[str(info)][0]
+        # Cuts through curved edges snap to the grid and leave slivers
+        assert (pya.Region(shapes) ^ original).sized(-2).is_empty()
+        assert all(_is_trapezoid(polygon) for polygon in pya.Region(shapes).each())
+
+def test_fracture_counts_shots(tmp_path):
+    layout, top = _wafer()
+    counts = fracture_layout(layout, top, str(tmp_path / 'a.gds'), tile_size=10000)
+    shot = fracture_layout(layout, top, str(tmp_path / 'b.gds'), tile_size=10000, max_shot=10)
+    for key, (trapezoids, shots) in counts.items():
+        assert shots == trapezoids
+        assert shot[key][0] == trapezoids and shot[key][1] >= trapezoids
+    # The 150 um pads need several 10 um shots
+    assert shot['1/0'][1] > counts['1/0'][0]
+
+def test_shot_report_multiplies_by_placements():
+    layout, top = _wafer()
+    counts = instance_counts(layout, top)
+    assert counts[layout.cell('vdp').cell_index()] == 6
+    assert counts[layout.cell('tlm').cell_index()] == 1
+
+    report = shot_report(layout, top)
+    assert sorted(entry['instances'] for entry in report.values()) == [1, 6]
+    for entry in report.values():
+        assert entry['shots'] == entry['trapezoids'] > 0
+        assert entry['total_shots'] == entry['instances'] * entry['shots']
+    fine = shot_report(layout, top, max_shot=10)
+    for key, entry in fine.items():
+        assert entry['trapezoids'] == report[key]['trapezoids']
+        assert entry['shots'] > entry['trapezoids']
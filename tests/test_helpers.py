@@ -0,0 +1,71 @@
+import pya
+import pytest
+
+import helpers
+import library
+from wafer_map import produce
+
+
+def _shape_count(layout):
+    top = layout.top_cell()
+    return sum(layout.cell(ci).shapes(li).size()
+               for ci in [top.cell_index()] + list(top.called_cells())
+               for li in layout.layer_indexes())
+
+def test_write_layout_in_draft_mode_writes_full_detail(tmp_path):
+    library.load()
+    layout = pya.Layout()
+    layout.create_cell('contact_chain', 'EE312', {})
+    full = _shape_count(layout)
+    helpers.set_draft(True)
+    try:
+        layout.update()
+        draft = _shape_count(layout)
+        assert draft < full
+        helpers.write_layout(layout, str(tmp_path / 'out.gds'))
+        # Back in draft mode afterwards
+        assert helpers.draft()
+        assert _shape_count(layout) == draft
+    finally:
+        helpers.set_draft(False)
+    written = pya.Layout()
+    written.read(str(tmp_path / 'out.gds'))
+    assert _shape_count(written) == full
+
+def test_merge_shapes_keeps_rectangles_as_boxes():
+    layout = pya.Layout()
+    cell = layout.create_cell('TOP')
+    layer = layout.layer(1, 0)
+    cell.shapes(layer).insert(pya.Box(0, 0, 100, 50))
+    cell.shapes(layer).insert(pya.Box(50, 0, 200, 50))
+    cell.shapes(layer).insert(pya.Box(0, 100, 100, 200))
+    cell.shapes(layer).insert(pya.Box(0, 100, 200, 150))
+    helpers.merge_shapes(cell)
+    shapes = list(cell.shapes(layer).each())
+    assert sorted(shape.is_box() for shape in shapes) == [False, True]
+    assert [shape.box for shape in shapes if shape.is_box()] == [pya.Box(0, 0, 200, 50)]
+    helpers.merge_shapes(cell, rectangles=True)
+    assert all(shape.is_box() for shape in cell.shapes(layer).each())
+    assert cell.shapes(layer).size() == 3
+
+@pytest.mark.parametrize('font', helpers.FONTS)
+def test_label_box_covers_label(font):
+    for string in ['A1', 'B12', 'AA10', 'M7']:
+        box = helpers.label_box(string, .001, 20, font)
+        bbox = helpers.label(string, .001, 20, font).bbox()
+        assert box.enlarged(1, 1).contains(bbox.p2) and bbox.bottom == box.bottom == 0
+        assert box.width() - bbox.width() < 5000 and box.height() == bbox.height()
+
+def test_draft_grid_labels_skip_text(monkeypatch):
+    library.load()
+    def no_text(*args):
+        raise AssertionError('label text generated in draft mode')
+    monkeypatch.setattr(helpers, 'label', no_text)
+    helpers.set_draft(True)
+    try:
+        layout = pya.Layout()
+        cell = produce(layout, 'grid_labels', {'x_num': 3, 'y_num': 2})
+        shapes = list(cell.shapes(layout.layer(cell.pcell_parameters_by_name()['l'])).each())
+        assert len(shapes) == 6 and all(shape.is_box() for shape in shapes)
+    finally:
+        helpers.set_draft(False)
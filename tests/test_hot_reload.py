@@ -0,0 +1,97 @@
+import os
+import sys
+import textwrap
+
+import pya
+import pytest
+
+import helpers
+import hot_reload
+import library
+
+MODULE = '''
+import pya
+
+SCALE = {scale}
+
+class hot_square(pya.PCellDeclarationHelper):
+
+  def __init__(self):
+    super(hot_square, self).__init__()
+    self.param("l", self.TypeLayer, "Layer", default = pya.LayerInfo(1, 0))
+    self.param("w", self.TypeDouble, "Width", default = 10)
+
+  def produce_impl(self):
+    w = self.w * SCALE / self.layout.dbu
+    self.cell.shapes(self.l_layer).insert(pya.Box(0, 0, w, w))
+'''
+
+
+def _write(path, source):
+    path.write_text(source)
+    # File times may not tick between two quick writes
+    stamp = os.stat(path).st_mtime_ns + 10 ** 9
+    os.utime(path, ns=(stamp, stamp))
+
+@pytest.fixture
+def square(tmp_path, monkeypatch):
+    """Registers a PCell from a module in tmp_path, as library.load does."""
+    path = tmp_path / 'hot_square.py'
+    _write(path, MODULE.format(scale=1))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import hot_square
+    lib = library.load()
+    monkeypatch.setitem(library.PCELLS, 'hot_square', hot_square.hot_square)
+    lib.layout().register_pcell('hot_square', hot_square.hot_square())
+    yield path
+    sys.modules.pop('hot_square', None)
+
+def _width(cell):
+    return cell.dbbox().width()
+
+
+def test_stamps_cover_shared_and_pcell_modules(square):
+    assert hot_reload.pcell_modules()['hot_square'] == ['hot_square']
+    stamps = hot_reload.stamps()
+    assert set(hot_reload.SHARED) | {'vdp', 'hot_square'} <= set(stamps)
+    assert stamps['hot_square'] == os.stat(square).st_mtime_ns
+
+def test_poll_reproduces_edited_pcells_only(square):
+    layout = pya.Layout()
+    small = layout.create_cell('hot_square', 'EE312', {'w': 5})
+    large = layout.create_cell('hot_square', 'EE312', {'w': 10})
+    vdp = layout.create_cell('vdp', 'EE312', {})
+    vdp_box = vdp.dbbox()
+    watcher = hot_reload.Watcher([layout])
+    assert watcher.poll() == []
+
+    _write(square, MODULE.format(scale=2))
+    assert watcher.poll() == ['hot_square']
+    assert (_width(small), _width(large)) == (10, 20)
+    assert vdp.dbbox() == vdp_box
+    assert watcher.poll() == []
+    assert hot_reload.reproduce(['hot_square'], [layout]) >= 2
+
+def test_failed_import_keeps_the_previous_declaration(square, capsys):
+    layout = pya.Layout()
+    cell = layout.create_cell('hot_square', 'EE312', {'w': 5})
+    watcher = hot_reload.Watcher([layout])
+    _write(square, MODULE.format(scale='('))
+    assert watcher.poll() == []
+    assert 'reload of hot_square failed' in capsys.readouterr().out
+    assert _width(cell) == 5
+    # Still fails until the file changes again
+    assert watcher.poll() == []
+    _write(square, MODULE.format(scale=3))
+    assert watcher.poll() == ['hot_square']
+    assert _width(cell) == 15
+
+def test_shared_reload_keeps_draft_mode():
+    library.load()
+    helpers.set_draft(True)
+    try:
+        names = hot_reload.reload(['helpers'], layouts=[])
+        assert helpers.draft()
+        assert sorted(names) == sorted(library.PCELLS)
+    finally:
+        helpers.set_draft(False)
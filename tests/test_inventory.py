@@ -0,0 +1,48 @@
+import json
+
+import numpy as np
+import pya
+import pytest
+
+import inventory
+import library
+
+
+def test_edit_moves_each_instance_once(tmp_path):
+    lib = library.load()
+    layout = pya.Layout()
+    top = layout.create_cell('TOP')
+    for ii, alignment in enumerate([2, 1, 1]):
+        cell = layout.create_cell('vdp', lib.name(), {'alignment': alignment})
+        top.insert(pya.CellInstArray(cell.cell_index(), pya.Trans(ii * 1000000, 0)))
+    layout.write(str(tmp_path / 'in.gds'))
+
+    inventory.edit(str(tmp_path / 'in.gds'), str(tmp_path / 'out.gds'),
+                   {'alignment': lambda params: params['alignment'] + 1})
+    edited = inventory.read(str(tmp_path / 'out.gds'))
+    alignments = sorted(inst.cell.pcell_parameters_by_name()['alignment']
+                        for inst in edited.top_cell().each_inst())
+    assert alignments == [2, 2, 3]
+
+
+def test_edit_rejects_unknown_parameters(tmp_path):
+    lib = library.load()
+    layout = pya.Layout()
+    top = layout.create_cell('TOP')
+    top.insert(pya.CellInstArray(layout.create_cell('vdp', lib.name(), {}).cell_index(), pya.Trans()))
+    layout.write(str(tmp_path / 'in.gds'))
+    with pytest.raises(KeyError, match='alignmnet'):
+        inventory.edit(str(tmp_path / 'in.gds'), str(tmp_path / 'out.gds'), {'alignmnet': 2})
+    assert not (tmp_path / 'out.gds').exists()
+
+
+def test_write_spec_rows_are_json(tmp_path, monkeypatch):
+    found = [{'pcell': 'vdp', 'params': {'metal': pya.LayerInfo(4, 0), 'dia': 80.}},
+             {'pcell': 'vernier', 'params': {}}]
+    placements = {'variant': np.array([0, 1]), 'x': np.array([1., 2.]), 'y': np.array([3., 4.])}
+    monkeypatch.setattr(inventory, 'inventory', lambda path, top=None: (found, placements))
+    assert inventory.write_spec(str(tmp_path / 'spec.jsonl'), 'unused.gds') == 2
+    with open(tmp_path / 'spec.jsonl') as f:
+        rows = [json.loads(line) for line in f]
+    assert rows == [{'pcell': 'vdp', 'x': 1., 'y': 3., 'metal': '4/0', 'dia': 80.},
+                    {'pcell': 'vernier', 'x': 2., 'y': 4.}]
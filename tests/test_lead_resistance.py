@@ -0,0 +1,43 @@
+import pya
+import pytest
+
+import library
+from lead_resistance import squares, terminal_squares
+from wafer_map import produce
+
+
+def _um(*boxes):
+    return pya.Region([pya.Box(*(round(v * 1000) for v in box)) for box in boxes])
+
+def test_straight_strip():
+    # 5 um wide, 100 um from pad to device: 20 squares
+    lead = _um((0, 0, 5, 100))
+    assert squares(lead, _um((-20, 100, 25, 140)), _um((-5, -10, 10, 0))) \
+        == pytest.approx(20, rel=.02)
+
+def test_stubs_and_slivers_add_nothing():
+    pad, device = _um((-20, 100, 25, 140)), _um((-5, -10, 10, 0))
+    # A stub beside the route and a 40 x 1.5 um sliver below the device level
+    lead = _um((0, 0, 5, 100), (5, 50, 45, 51.5), (-40, -3, 0, -1.5), (-1, -3, 0, 0))
+    assert squares(lead.merged(), pad, device) == pytest.approx(20, rel=.03)
+
+def test_tlm_leads():
+    library.load()
+    layout = pya.Layout()
+    leads = dict((pad, count) for pad, _, count in terminal_squares(produce(layout, 'tlm', {})))
+    # P1: a 40 um wide strip drops 48.5 um from the pad to the resistor,
+    # 1.21 squares, and narrows onto the 21.5 um of resistor edge below
+    # it; the 40 x 1.5 um strip beyond the resistor is a stub
+    assert 48.5 / 40 < leads['P1'] < 48.5 / 21.5
+    assert leads['P1'] == pytest.approx(1.3, rel=.05)
+    # P2: the same strip ends 48.5 um down on the full 40 um
+    assert leads['P2'] == pytest.approx(48.5 / 40, rel=.03)
+
+def test_vdp_leads():
+    library.load()
+    layout = pya.Layout()
+    leads = [count for _, _, count in terminal_squares(produce(layout, 'vdp', {}))]
+    # A 6 um wide L: 48.4 um along x from the pad edge to the corner center,
+    # 22.5 um down to the middle of the slanted device edge, 70.9 / 6 =
+    # 11.8 squares, less 0.44 for the corner
+    assert leads == pytest.approx([11.4] * 4, rel=.06)
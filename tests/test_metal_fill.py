@@ -0,0 +1,80 @@
+import numpy as np
+import pya
+import pytest
+
+import library
+from metal_fill import density, fill
+from site_index import SiteIndex
+from wafer_map import produce
+
+METAL = pya.LayerInfo(4, 0)
+BLOCK = pya.LayerInfo(9, 0)
+
+
+def _reticle():
+    """A vdp, a dense metal block and a keep-out shape on a 1.2 x 0.6 mm reticle."""
+    library.load()
+    layout = pya.Layout()
+    top = layout.create_cell('TOP')
+    vdp = produce(layout, 'vdp', {})
+    top.insert(pya.CellInstArray(vdp.cell_index(), pya.Trans(300000, 300000)))
+    top.shapes(layout.layer(METAL)).insert(pya.Box(800000, 0, 1200000, 200000))
+    top.shapes(layout.layer(BLOCK)).insert(pya.Box(700000, 400000, 900000, 450000))
+    return layout, top
+
+def _tiles(layout, cell):
+    return pya.Region(cell.begin_shapes_rec(layout.layer(METAL)))
+
+
+def test_density_per_window():
+    layout = pya.Layout()
+    top = layout.create_cell('TOP')
+    top.shapes(layout.layer(METAL)).insert(pya.Box(0, 0, 100000, 100000))
+    top.shapes(layout.layer(METAL)).insert(pya.Box(100000, 100000, 125000, 150000))
+    frame = pya.DBox(0, 0, 250, 200)
+    grid = density(layout, top, METAL, window=100, frame=frame, threads=2)
+    # The right column of windows is cut to 50 um
+    assert grid == pytest.approx(np.array([[1, 0, 0], [0, .125, 0]]))
+    assert density(layout, top, METAL, window=1000)[0, 0] == pytest.approx(
+        (100 * 100 + 25 * 50) / (125 * 150))
+
+def test_fill_keeps_clear_of_shapes_and_pads():
+    layout, top = _reticle()
+    frame = pya.DBox(0, 0, 1200, 600)
+    before = density(layout, top, METAL, window=200, frame=frame)
+    keep_out = pya.Region()
+    for li in layout.layer_indexes():
+        keep_out += pya.Region(top.begin_shapes_rec(li))
+    pads = pya.Region([pya.DBox(*pad).to_itype(layout.dbu)
+                       for pad in SiteIndex.from_layout(layout, top).pads])
+    assert pads.count() == 4
+
+    fill_cell, count = fill(layout, top, METAL, window=200, min_density=.2, tile=2, pitch=4,
+                            spacing=5, pad_spacing=20, frame=frame, threads=2)
+    tiles = pya.Region(fill_cell.begin_shapes_rec(layout.layer(METAL)))
+    assert tiles.count() == count > 0
+    # Tiles sit on the 4 um grid and never touch each other
+    assert all(p.bbox().width() == p.bbox().height() == 2000 and p.bbox().left % 4000 == 0
+               and p.bbox().bottom % 4000 == 0 for p in tiles.each())
+    assert tiles.merged().count() == count
+    assert (tiles & keep_out.sized(5000 - 1)).is_empty()
+    assert (tiles & pads.sized(20000 - 1)).is_empty()
+    assert tiles.inside(pya.Region(frame.to_itype(layout.dbu))).count() == count
+
+    after = density(layout, top, METAL, window=200, frame=frame)
+    sparse = before < .2
+    assert (after[sparse] > before[sparse]).all()
+    # Dense windows get no fill
+    assert np.array_equal(after[~sparse], before[~sparse])
+
+def test_fill_layer_and_keep_out_layers():
+    layout, top = _reticle()
+    frame = pya.DBox(0, 0, 1200, 600)
+    dummy = pya.LayerInfo(40, 0)
+    _, count = fill(layout, top, METAL, fill_layer=dummy, keep_out=[BLOCK], pad_spacing=0,
+                    frame=frame, threads=1)
+    tiles = pya.Region(top.begin_shapes_rec(layout.layer(dummy)))
+    assert tiles.count() == count
+    # Only the block layer is kept clear of, so tiles may cover the vdp
+    assert not (tiles & pya.Region(top.begin_shapes_rec(layout.layer(METAL)))).is_empty()
+    assert (tiles & pya.Region(top.begin_shapes_rec(layout.layer(BLOCK))).sized(4999)).is_empty()
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from mosfet_extract import (constant_current, current_at, extract, max_gm, series_resistance,
+                            subthreshold_slope)
+from prober_store import ingest
+from site_index import SiteIndex
+
+COX = 1e-7
+MOBILITY = 300
+VT = .5
+VD = .1
+SS = .08
+
+
+def _linear(vg, W, L, vt=VT):
+    """Linear-region Id, zero below vt + VD / 2."""
+    beta = MOBILITY * COX * W / L
+    return np.maximum(beta * (vg - vt - VD / 2) * VD, 0)
+
+def _subthreshold(vg, W, L, vt=VT):
+    """Exponential Id reaching 1e-7 * W / L at vt."""
+    return 1e-7 * W / L * 10 ** ((vg - vt) / SS)
+
+
+def test_max_gm_recovers_threshold_and_mobility():
+    vg = np.tile(np.linspace(0, 2, 41), (3, 1))
+    W = np.array([10., 10., 20.])
+    L = np.array([2., 5., 5.])
+    vt = np.array([.4, .5, .7])
+    id = _linear(vg, W[:, None], L[:, None], vt[:, None])
+    # The last device stops early; the tail is NaN padding
+    vg[2, 30:] = id[2, 30:] = np.nan
+    result = max_gm(vg, id, VD, W, L, COX)
+    assert result['vt'] == pytest.approx(vt)
+    assert result['mobility'] == pytest.approx([MOBILITY] * 3)
+    assert result['gm_max'] == pytest.approx(MOBILITY * COX * W / L * VD)
+
+def test_max_gm_of_a_flat_sweep_is_nan():
+    vg = np.linspace(0, 1, 5)[None, :]
+    result = max_gm(vg, np.zeros_like(vg), VD, [10], [2], COX)
+    assert np.isnan(result['vt'][0])
+
+def test_constant_current_and_slope():
+    vg = np.tile(np.linspace(0, 1.2, 61), (3, 1))
+    W = np.array([10., 10., 10.])
+    L = np.array([1., 4., 1.])
+    vt = np.array([.3, .6, 5])
+    id = _subthreshold(vg, W[:, None], L[:, None], vt[:, None])
+    # The third device never reaches the criterion
+    assert constant_current(vg, id, W, L)[:2] == pytest.approx(vt[:2])
+    assert np.isnan(constant_current(vg, id, W, L)[2])
+    # and stays below the noise floor
+    assert subthreshold_slope(vg, id)[:2] == pytest.approx([SS * 1000] * 2)
+    assert np.isnan(subthreshold_slope(vg, id)[2])
+    # Points above i_max and below the floor are left out
+    assert np.isnan(subthreshold_slope(vg, id, i_max=1e-15)).all()
+
+def test_current_at_interpolates():
+    vg = np.array([[0., 1, 2, 3], [0, 1, 2, np.nan]])
+    id = np.array([[0., -1, -4, -9], [0, 2, 4, np.nan]])
+    assert current_at(vg, id, [1.5, .25]) == pytest.approx([2.5, .5])
+
+def test_series_resistance_from_l_array():
+    rsd_w, sheet = 400., 250.
+    W = np.array([10., 10., 10., 20., 20., 5.])
+    L = np.array([1., 2., 5., 1., 3., 1.])
+    r_total = (rsd_w + sheet * L) / W
+    labels, fitted_rsd_w, slope, rsd = series_resistance(W, L, r_total)
+    assert labels.tolist() == [5, 10, 20]
+    assert fitted_rsd_w[1:] == pytest.approx([rsd_w] * 2)
+    assert slope[1:] == pytest.approx([sheet] * 2)
+    assert rsd[1:] == pytest.approx([rsd_w / 10, rsd_w / 20])
+    # A single L cannot be fitted
+    assert np.isnan(slope[0])
+
+
+def _store(tmp_path):
+    lengths = [2., 5., 10.]
+    meta = [{'pcell': 'transistor', 'library': 'EE312', 'cell': f'transistor${ii}',
+             'params': {'W': 10., 'L': L}} for ii, L in enumerate(lengths)]
+    boxes = [[ii * 100, 0, ii * 100 + 50, 50] for ii in range(3)]
+    index = SiteIndex(boxes, range(3), meta, [], [], [])
+    sites = {f'S{ii}': (ii * 100 + 25, 25) for ii in range(3)}
+    path = tmp_path / 'log.csv'
+    with open(path, 'w') as f:
+        f.write('die,site,Vg,Id,Vd\n')
+        for die in ('d1', 'd2'):
+            for ii, L in enumerate(lengths):
+                for vg in np.linspace(0, 2, 41):
+                    id = _linear(vg, 10., L + 1) + _subthreshold(min(vg, VT), 10., L + 1) * 1e-3
+                    f.write(f'{die},S{ii},{float(vg)!r},{float(id)!r},{VD}\n')
+    return ingest(str(path), tmp_path / 'store', index, sites)
+
+def test_extract_runs_on_a_store(tmp_path):
+    result = extract(_store(tmp_path), COX)
+    assert sorted(zip(result['die'], result['L'])) == \
+        [(die, L) for die in ('d1', 'd2') for L in (2, 5, 10)]
+    assert result['vt_gm'] == pytest.approx([VT] * 6, abs=1e-3)
+    assert result['vd'] == pytest.approx([VD] * 6)
+    # The devices behave as if L were 1 um longer
+    assert result['mobility'] == pytest.approx(MOBILITY * result['L'] / (result['L'] + 1), rel=1e-3)
+    labels, rsd_w, sheet, rsd = result['rsd']
+    assert labels.tolist() == ['d1/10', 'd2/10']
+    assert np.isfinite(rsd_w).all() and (sheet > 0).all()
@@ -0,0 +1,86 @@
+import itertools
+
+import pya
+import pytest
+
+import library
+from pad_frame import _assign, build_pad_frame
+from site_index import find_pads
+from wafer_map import produce
+
+METALS = (pya.LayerInfo(4, 0), pya.LayerInfo(5, 0))
+
+
+def _frame(pcells, **kwargs):
+    library.load()
+    layout = pya.Layout()
+    cells = [produce(layout, pcell, {}) for pcell in pcells]
+    frame, pad_map = build_pad_frame(layout, cells, **kwargs)
+    return layout, frame, pad_map
+
+def _structure_pads(layout, frame):
+    """Maps (structure index, pad name) to the pad box in the frame."""
+    pads = {}
+    for index, inst in enumerate(frame.each_inst()):
+        cell = layout.cell(inst.cell_index)
+        params = cell.pcell_parameters_by_name()
+        for no, pad in enumerate(find_pads(cell, params['pad_w'], params['pad_h'])):
+            pads[(index, f'P{no + 1}')] = pad.transformed(inst.trans)
+    return pads
+
+def test_every_frame_pad_reaches_its_structure_pad():
+    layout, frame, pad_map = _frame(['vdp', 'tlm', 'transistor', 'diode'])
+    assert sorted(pad_map.values()) == sorted(set(pad_map.values()))
+    assert {index for index, _ in pad_map.values()} == {0, 1, 2, 3}
+    pads = _structure_pads(layout, frame)
+    reached = []
+    for info in METALS:
+        li = layout.layer(info)
+        routes = pya.Region(frame.shapes(li)).merged()
+        devices = pya.Region(frame.begin_shapes_rec(li)) - pya.Region(frame.shapes(li))
+        nets = pya.Region(frame.begin_shapes_rec(li)).merged()
+        # Routes keep the clearance between each other
+        assert routes.isolated_check(10 / layout.dbu - 1).is_empty()
+        for route in routes.each():
+            net = nets.interacting(pya.Region(route))
+            assert net.count() == 1
+            hit = [key for key, pad in pads.items()
+                   if not (pya.Region(pad) & devices & net).is_empty()]
+            # One structure pad per route, except for unused frame pads
+            assert len(hit) <= 1
+            reached += hit
+    assert sorted(reached) == sorted(pad_map.values())
+
+def test_frame_pads_clear_the_structures():
+    layout, frame, pad_map = _frame(['vdp', 'tlm'], pad_w=80, pad_h=60, pitch=150)
+    structures = pya.Region()
+    for inst in frame.each_inst():
+        structures.insert(inst.bbox())
+    middle = structures.bbox().center().y
+    frame_pads = pya.Region()
+    # Each route ends in its frame pad, on the far side from the structures
+    for info in METALS:
+        for polygon in pya.Region(frame.shapes(layout.layer(info))).each():
+            box = polygon.bbox()
+            if box.center().y > middle:
+                frame_pads.insert(pya.Box(box.left, box.top - 60000, box.right, box.top))
+            else:
+                frame_pads.insert(pya.Box(box.left, box.bottom, box.right, box.bottom + 60000))
+    assert (frame_pads & structures).is_empty()
+    assert len(pad_map) == 8
+
+def test_too_few_frame_pads_raise():
+    with pytest.raises(ValueError):
+        _frame(['vdp', 'tlm'], n_pads=3)
+
+@pytest.mark.parametrize('terminals, pads', [
+    ([0, 10, 20], [5, 15, 25, 35]),
+    ([0, 1, 2, 50], [0, 20, 40, 60, 80]),
+    ([30, 31], [0, 100]),
+])
+def test_assign_is_ordered_and_optimal(terminals, pads):
+    assigned = _assign(terminals, pads)
+    assert assigned == sorted(set(assigned))
+    best = min(sum(abs(t - pads[k]) for t, k in zip(terminals, combo))
+               for combo in itertools.combinations(range(len(pads)), len(terminals)))
+    assert sum(abs(t - pads[k]) for t, k in zip(terminals, assigned)) == best
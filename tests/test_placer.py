@@ -0,0 +1,59 @@
+import random
+
+import pya
+import pytest
+
+from placer import pack, place_structures, site_ids
+
+
+def _separated(a, b, spacing):
+    (ax, ay, aw, ah), (bx, by, bw, bh) = a, b
+    return ax + aw + spacing <= bx or bx + bw + spacing <= ax or \
+        ay + ah + spacing <= by or by + bh + spacing <= ay
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('spacing, pitch', [(0, None), (15, None), (15, 40)])
+def test_pack_keeps_spacing_and_pitch(seed, spacing, pitch):
+    rng = random.Random(seed)
+    sizes = [(rng.randint(10, 300), rng.randint(10, 300)) for _ in range(150)]
+    offsets = [(rng.randint(0, w), rng.randint(0, h)) for w, h in sizes]
+    width = 2000
+    positions, height = pack(sizes, width, spacing, pitch, offsets)
+    boxes = [(x, y, w, h) for (x, y), (w, h) in zip(positions, sizes)]
+    for ii, box in enumerate(boxes):
+        x, y, w, h = box
+        assert 0 <= x and x + w <= width and 0 <= y and y + h <= height
+        if pitch:
+            assert (x + offsets[ii][0]) % pitch == 0 and (y + offsets[ii][1]) % pitch == 0
+        for other in boxes[:ii]:
+            assert _separated(box, other, spacing)
+    assert height == max(y + h for _, y, _, h in boxes)
+
+def test_pack_rejects_too_wide():
+    with pytest.raises(ValueError):
+        pack([(10, 10), (120, 10)], 100)
+
+def test_pack_fills_bottom_first():
+    positions, height = pack([(50, 10), (50, 10), (50, 20)], 100)
+    assert positions == [(50, 0), (50, 10), (0, 0)] and height == 20
+
+def test_site_ids_row_by_row_from_top_left():
+    boxes = [(0, 0, 10, 10), (20, 0, 30, 10), (0, 20, 10, 30)]
+    assert site_ids(boxes) == ['A2', 'B2', 'A1']
+
+def test_place_structures_names_and_places_every_cell():
+    layout = pya.Layout()
+    cells = []
+    for ii, size in enumerate([100, 200, 300]):
+        cell = layout.create_cell(f'S{ii}')
+        cell.shapes(layout.layer(1, 0)).insert(pya.Box(-size, -size, size, size))
+        cells.append(cell)
+    die, sites = place_structures(layout, cells + cells[:1], 1, spacing=.05, pitch=.1,
+                                  labels=pya.LayerInfo(0, 1))
+    assert len(sites) == 4 and die.child_instances() == 4
+    for cell, x, y in sites.values():
+        assert round(x / .1, 6) % 1 == 0 and round(y / .1, 6) % 1 == 0
+    placed = [inst.bbox() for inst in die.each_inst()]
+    for ii, box in enumerate(placed):
+        assert all(not box.enlarged(49, 49).overlaps(other) for other in placed[:ii])
+    assert die.shapes(layout.layer(0, 1)).size() == 4
@@ -0,0 +1,35 @@
+import pya
+import pytest
+
+import polarity
+
+
+def hierarchy():
+    layout = pya.Layout()
+    layout.dbu = .001
+    top = layout.create_cell('TOP')
+    child = layout.create_cell('CHILD')
+    layer = layout.layer(1, 0)
+    child.shapes(layer).insert(pya.Box(0, 0, 1000, 1000))
+    top.insert(pya.CellInstArray(child.cell_index(), pya.Trans(5000, 5000)))
+    top.shapes(layer).insert(pya.Box(-2000, -2000, 0, 0))
+    other = layout.create_cell('OTHER')
+    other.shapes(layer).insert(pya.Box(0, 0, 500, 500))
+    return layout, top, child
+
+
+@pytest.mark.parametrize('output', [pya.LayerInfo(2, 0), None])
+def test_invert_layer_with_frame_in_hierarchy(output):
+    layout, top, child = hierarchy()
+    frame = pya.DBox(-10, -10, 10, 10)
+    target = polarity.invert_layer(layout, top, pya.LayerInfo(1, 0), output=output,
+                                   frame=frame, tile_size=5)
+    expected = pya.Region(frame.to_itype(layout.dbu)) \
+        - pya.Region(pya.Box(-2000, -2000, 0, 0)) - pya.Region(pya.Box(5000, 5000, 6000, 6000))
+    assert (pya.Region(top.begin_shapes_rec(target)) ^ expected).is_empty()
+    # Only the inverted hierarchy loses its shapes
+    assert layout.cell('OTHER').shapes(layout.layer(1, 0)).size() == 1
+    if output is None:
+        assert child.shapes(target).is_empty()
+    else:
+        assert not child.shapes(layout.layer(1, 0)).is_empty()
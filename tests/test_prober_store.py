@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from prober_store import ingest
+from site_index import SiteIndex
+
+
+def _index():
+    meta = [{'pcell': 'vdp', 'library': 'EE312', 'cell': 'vdp', 'params': {'alignment': 1}},
+            {'pcell': 'vdp', 'library': 'EE312', 'cell': 'vdp$1', 'params': {'alignment': 2}}]
+    return SiteIndex([[0, 0, 10, 10], [20, 0, 30, 10]], [0, 1], meta, [], [], [])
+
+def _log(path, rows):
+    with open(path, 'w') as f:
+        f.write('die,site,v,i\n')
+        for row in rows:
+            f.write(','.join(map(str, row)) + '\n')
+    return str(path)
+
+
+def test_append_keeps_join_columns_aligned(tmp_path):
+    sites = {'A': (5, 5), 'B': (25, 5)}
+    store = tmp_path / 'store'
+    ingest(_log(tmp_path / 'a.csv', [('d1', 'A', 0, 1), ('d1', 'B', 0, 2)]), store,
+           _index(), sites)
+    with pytest.raises(ValueError):
+        ingest(_log(tmp_path / 'b.csv', [('d2', 'A', 0, 3)]), store, append=True)
+    result = ingest(_log(tmp_path / 'b.csv', [('d2', 'B', 0, 4), ('d2', 'A', 0, 3)]), store,
+                    _index(), sites, append=True)
+    assert len(result) == 4
+    assert result['kind'].tolist() == [0, 1, 1, 0]
+    assert result.decode('die', result.select(alignment=2)).tolist() == ['d1', 'd2']
+    sweeps = result.sweeps('v', 'i', alignment=1)
+    assert sweeps['die'].tolist() == ['d1', 'd2']
+    assert np.array_equal(sweeps['y'][:, 0], [1, 3])
+
+
+def test_failed_append_leaves_store_unchanged(tmp_path):
+    store = tmp_path / 'store'
+    ingest(_log(tmp_path / 'a.csv', [('d1', 'A', 0, 1), ('d1', 'B', 1, 1),
+                                      ('d2', 'A', 2, 1), ('d2', 'B', 3, 1)]), store)
+    with pytest.raises(ValueError):
+        ingest(_log(tmp_path / 'b.csv', [('d9', 'A', 10, 1), ('d9', 'B', 11, 1),
+                                          ('d9', 'A', 'x', 1)]), store, chunk_rows=2, append=True)
+    result = ingest(_log(tmp_path / 'c.csv', [('d3', 'A', 20, 1)]), store, append=True)
+    assert len(result) == 5
+    assert result['v'].tolist() == [0, 1, 2, 3, 20]
+    assert result.decode('die').tolist() == ['d1', 'd1', 'd2', 'd2', 'd3']
+    assert 'd9' not in result.labels('die')
+
+
+def test_fresh_ingest_replaces_store(tmp_path):
+    store = tmp_path / 'store'
+    ingest(_log(tmp_path / 'a.csv', [('d1', 'A', 0, 1)]), store)
+    with pytest.raises(ValueError):
+        ingest(_log(tmp_path / 'b.csv', [('d2', 'A', 0, 1), ('d2', 'A', 'x', 1)]), store,
+               chunk_rows=1)
+    result = ingest(_log(tmp_path / 'c.csv', [('d3', 'A', 5, 1)]), store, append=True)
+    assert result.decode('die').tolist() == ['d3']
+
+
+def test_sweeps_group_numeric_keys_exactly(tmp_path):
+    sites = {'A': (5, 5), 'B': (25, 5)}
+    rows = [(die, site, v, die * 10 + v) for die in (1.25, 1.5) for site in 'AB' for v in (1, 0)]
+    store = ingest(_log(tmp_path / 'a.csv', rows), tmp_path / 'store', _index(), sites)
+    sweeps = store.sweeps('v', 'i')
+    devices = {(die, site): (kind, y.tolist()) for die, site, kind, y
+               in zip(sweeps['die'], sweeps['site'], sweeps['kind'], sweeps['y'])}
+    assert devices == {(1.25, 'A'): (0, [12.5, 13.5]), (1.25, 'B'): (1, [12.5, 13.5]),
+                       (1.5, 'A'): (0, [15, 16]), (1.5, 'B'): (1, [15, 16])}
@@ -0,0 +1,53 @@
+import numpy as np
+import pya
+import pytest
+
+import library
+from resolution_limit import analyze_image, analyze_wafer, feature_layout, min_resolved_map
+from thumbnails import scanline_fill, trapezoids
+from wafer_map import produce
+
+UM_PER_PX = .1
+
+
+def _micrograph(pcell, params, smallest):
+    """Renders a structure with every feature narrower than smallest lost."""
+    library.load()
+    layout = pya.Layout()
+    cell = produce(layout, pcell, params)
+    region = pya.Region(cell.begin_shapes_rec(layout.layer(1, 0)))
+    resolved = pya.Region([polygon for polygon in region.each()
+                           if polygon.bbox().width() * layout.dbu >= smallest - 1e-9])
+    box = cell.bbox().enlarged(10000, 10000)
+    scale = layout.dbu / UM_PER_PX
+    shape = (int(box.height() * scale), int(box.width() * scale))
+    image = scanline_fill(trapezoids(resolved), box.left, box.top, scale, shape) * 200. + 20
+    origin = (- box.left * scale, box.top * scale)
+    return image, origin
+
+def test_feature_layout_matches_produced_bars():
+    library.load()
+    layout = pya.Layout()
+    cell = produce(layout, 'min_feature_optic', {})
+    features, (row_y, row_h) = feature_layout()
+    row = pya.Region(cell.begin_shapes_rec(layout.layer(1, 0))).interacting(
+        pya.Region(pya.DBox(-1000, row_y - .01, 1000, row_y + .01).to_itype(layout.dbu)))
+    bars = sorted((round(p.bbox().center().x * layout.dbu, 6), round(p.bbox().width() * layout.dbu, 6))
+                  for p in row.each())
+    assert bars == sorted((round(x, 6), round(w, 6)) for x, w in features)
+
+@pytest.mark.parametrize('smallest', [1, 2.5, 4])
+def test_analyze_image_finds_smallest_resolved_width(smallest):
+    image, origin = _micrograph('min_feature_optic', {}, smallest)
+    result = analyze_image(image, origin, UM_PER_PX, {})
+    assert result['min_resolved'] == smallest
+    assert result['resolved'] == [w >= smallest for w in result['widths']]
+
+def test_analyze_wafer_per_site(tmp_path):
+    sites = {}
+    for site, smallest in [('A1', 1.5), ('B1', 3)]:
+        image, origin = _micrograph('min_feature_optic', {}, smallest)
+        np.save(tmp_path / f'{site}.npy', image)
+        sites[site] = str(tmp_path / f'{site}.npy')
+    results = analyze_wafer(sites, origin, UM_PER_PX, {}, workers=1)
+    assert min_resolved_map(results) == {'A1': 1.5, 'B1': 3}
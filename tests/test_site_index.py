@@ -0,0 +1,63 @@
+import numpy as np
+import pya
+
+import library
+from site_index import SiteIndex
+from wafer_map import produce
+
+
+def _wafer():
+    """A 3 x 2 vdp array and a rotated tlm nested one level deeper."""
+    library.load()
+    layout = pya.Layout()
+    top = layout.create_cell('TOP')
+    vdp = produce(layout, 'vdp', {})
+    top.insert(pya.CellInstArray(vdp.cell_index(), pya.Trans(), pya.Vector(1000000, 0),
+                                 pya.Vector(0, 1000000), 3, 2))
+    block = layout.create_cell('BLOCK')
+    tlm = produce(layout, 'tlm', {})
+    block.insert(pya.CellInstArray(tlm.cell_index(), pya.Trans(pya.Trans.R90, 0, 0)))
+    top.insert(pya.CellInstArray(block.cell_index(), pya.Trans(5000000, 0)))
+    return layout, top
+
+def test_pads_report_owning_instance():
+    layout, top = _wafer()
+    index = SiteIndex.from_layout(layout, top)
+    assert len(index.boxes) == 7
+    # vdp P1 is the top left pad, centered at (-150, 100) in the cell
+    x = np.array([-150., 1850., 850.])
+    y = np.array([100., 1100., 100.])
+    instances, pads = index.query(x, y)
+    info = [index.describe(ii, pad) for ii, pad in zip(instances, pads)]
+    assert [i['pcell'] for i in info] == ['vdp'] * 3
+    assert [i['pad'] for i in info] == ['P1'] * 3
+    assert len(set(instances)) == 3
+    for i, (px, py) in zip(info, zip(x, y)):
+        left, bottom, right, top_ = i['bbox']
+        assert left <= px <= right and bottom <= py <= top_
+
+def test_rotated_nested_instance_and_misses():
+    layout, top = _wafer()
+    index = SiteIndex.from_layout(layout, top)
+    # tlm P2 centered at (129, 100) turns to (-100, 129)
+    instances, pads = index.query([5000., 4900.], [0., 129.])
+    info = [index.describe(ii, pad) for ii, pad in zip(instances, pads)]
+    assert [i['pcell'] for i in info] == ['tlm', 'tlm']
+    assert [i['pad'] for i in info] == [None, 'P2']
+    instances, pads = index.query([500., -1e6], [500., 0.])
+    assert list(instances) == [-1, -1] and list(pads) == [-1, -1]
+    assert index.describe(-1) is None
+
+def test_save_load_round_trip(tmp_path):
+    layout, top = _wafer()
+    index = SiteIndex.from_layout(layout, top)
+    path = str(tmp_path / 'sites.npz')
+    index.save(path)
+    loaded = SiteIndex.load(path)
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-500, 6000, 20000)
+    y = rng.uniform(-500, 1500, 20000)
+    for a, b in zip(index.query(x, y), loaded.query(x, y)):
+        assert np.array_equal(a, b)
+    assert loaded.meta == index.meta
+    assert loaded.describe(0) == index.describe(0)
@@ -0,0 +1,106 @@
+import csv
+import json
+
+import pya
+import pytest
+
+import spec_loader
+from spec_loader import build_spec, chunks, load_spec, parse_row, parse_value
+
+ROWS = [
+    {'pcell': 'transistor', 'x': 0, 'y': 0, 'W': 50},
+    {'pcell': 'transistor', 'x': 1000, 'y': 0, 'W': -1},
+    {'pcell': 'nothing', 'x': 0, 'y': 0},
+    {'pcell': 'vdp', 'x': 2000, 'y': 500},
+    {'pcell': 'transistor', 'x': 'left', 'y': 0},
+    {'pcell': 'transistor', 'x': 0, 'y': 1000, 'width': 3},
+    {'pcell': 'transistor', 'x': 3000, 'y': 1000, 'disp_L': 'no', 'L': '20'},
+]
+VALID = [0, 3, 6]
+
+
+def _write(path, rows):
+    ext = path.suffix
+    if ext == '.csv':
+        keys = sorted({key for row in rows for key in row})
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, keys)
+            writer.writeheader()
+            writer.writerows(rows)
+    elif ext == '.jsonl':
+        path.write_text(''.join(json.dumps(row) + '\n' for row in rows))
+    elif ext == '.json':
+        path.write_text(json.dumps(rows, indent=1))
+    else:
+        import yaml
+        path.write_text(yaml.safe_dump(rows))
+    return str(path)
+
+@pytest.mark.parametrize('ext', ['.csv', '.jsonl', '.json', '.yaml'])
+def test_load_spec_reports_rejected_rows(tmp_path, ext):
+    if ext == '.yaml':
+        pytest.importorskip('yaml')
+    path = _write(tmp_path / f'spec{ext}', ROWS)
+    rejected = []
+    placements = list(load_spec(path, rejected=rejected))
+    assert [(pcell, x, y) for pcell, _, x, y in placements] == \
+        [(ROWS[ii]['pcell'], ROWS[ii]['x'], ROWS[ii]['y']) for ii in VALID]
+    assert placements[0][1]['W'] == 50 and placements[0][1]['L'] == 100
+    assert placements[2][1]['disp_L'] is False and placements[2][1]['L'] == 20
+    # CSV rows are numbered by line, the header being line 1
+    first = 2 if ext == '.csv' else 1
+    numbers = [number - first for number, _, _ in rejected]
+    assert numbers == [ii for ii in range(len(ROWS)) if ii not in VALID]
+    messages = [messages for _, _, messages in rejected]
+    assert messages[0] == ['W must be positive']
+    assert messages[1] == ["unknown pcell 'nothing'"]
+    assert messages[2] == ['x and y must be numbers']
+    assert messages[3] == ["transistor has no parameter 'width'"]
+
+def test_nested_params_and_fix():
+    placement, errors = parse_row({'pcell': 'diode', 'x': 1, 'y': 2, 'params': {'L': .5}})
+    assert placement is None and errors
+    (pcell, params, x, y), errors = parse_row({'pcell': 'diode', 'x': 1, 'y': 2,
+                                               'params': {'L': .5}}, fix=True)
+    assert not errors and (pcell, x, y) == ('diode', 1, 2)
+    assert params['L'] == params['contact_size'] + 5 * params['alignment']
+
+def test_parse_value_checks_types():
+    decls = spec_loader.declarations('transistor')
+    assert parse_value(decls['merge'], 'Yes') is True
+    assert parse_value(decls['merge'], '') is False
+    assert parse_value(decls['W'], '12.5') == 12.5
+    assert parse_value(decls['metal'], pya.LayerInfo(4, 1)) == '4/1'
+    assert parse_value(decls['metal'], '7/2') == '7/2'
+    for name, value in [('merge', 'maybe'), ('W', 'wide'), ('W', True), ('metal', 'METAL')]:
+        with pytest.raises(ValueError):
+            parse_value(decls[name], value)
+
+def test_unknown_format_and_chunks(tmp_path):
+    with pytest.raises(ValueError):
+        list(load_spec(str(tmp_path / 'spec.txt')))
+    assert list(chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('ext', ['.gds', '.oas'])
+def test_build_spec_places_valid_rows(tmp_path, workers, ext):
+    spec = _write(tmp_path / 'spec.jsonl', ROWS * 3)
+    path = str(tmp_path / f'out{ext}')
+    rejected = build_spec(spec, path, chunk_size=2, workers=workers)
+    assert len(rejected) == 3 * (len(ROWS) - len(VALID))
+
+    layout = pya.Layout()
+    layout.read(path)
+    top = layout.cell('TOP')
+    # Every chunk top cell sits at the origin; structures keep their spec position
+    placed = []
+    for chunk in top.each_inst():
+        assert chunk.trans == pya.Trans()
+        placed += [(round(inst.dcplx_trans.disp.x), round(inst.dcplx_trans.disp.y))
+                   for inst in layout.cell(chunk.cell_index).each_inst()]
+    # 9 valid rows in chunks of 2
+    assert top.child_instances() == 5
+    placed.sort()
+    assert placed == sorted((ROWS[ii]['x'], ROWS[ii]['y']) for ii in VALID for _ in range(3))
+    names = [cell.name for cell in layout.each_cell()]
+    assert len(names) == len(set(names))
@@ -0,0 +1,120 @@
+import math
+
+import pya
+import pytest
+
+from stream_writer import MAX_POINTS, GdsWriter, OasisWriter, open_writer
+
+
+def _read(path):
+    layout = pya.Layout()
+    layout.read(path)
+    return layout
+
+def _circle(r, n):
+    return pya.Polygon([pya.Point(round(r * math.cos(2 * math.pi * ii / n)),
+                                  round(r * math.sin(2 * math.pi * ii / n))) for ii in range(n)])
+
+@pytest.mark.parametrize('ext, kind', [('.gds', GdsWriter), ('.oas', OasisWriter), ('.OASIS', OasisWriter)])
+def test_open_writer_picks_format(tmp_path, ext, kind):
+    with open_writer(str(tmp_path / f'out{ext}')) as writer:
+        assert isinstance(writer, kind)
+
+@pytest.mark.parametrize('ext', ['.gds', '.oas'])
+def test_shapes_and_placements_read_back(tmp_path, ext):
+    path = str(tmp_path / f'out{ext}')
+    triangle = [(0, 0), (3000, 0), (0, 4000)]
+    with open_writer(path, dbu=.0005) as writer:
+        writer.begin_cell('CHILD')
+        writer.box(1, 0, -100, -200, 300, 400)
+        writer.polygon(2, 5, triangle)
+        writer.text(7, 0, 'P1', 50, 60)
+        writer.end_cell()
+        writer.begin_cell('TOP')
+        writer.sref('CHILD', 10000, 20000)
+        writer.sref('CHILD', -5000, 0, rot=90, mirror=True)
+        writer.sref('CHILD', 0, -5000, rot=30, mag=2.5)
+        writer.aref('CHILD', 0, 100000, 3, 2, (7000, 0), (1000, 9000))
+        writer.aref('CHILD', 0, 200000, 4, 1, (0, 8000), (0, 0))
+        writer.end_cell()
+
+    layout = _read(path)
+    assert layout.dbu == pytest.approx(.0005)
+    child = layout.cell('CHILD')
+    assert [shape.box for shape in child.shapes(layout.layer(1, 0)).each()] == \
+        [pya.Box(-100, -200, 300, 400)]
+    polygon = next(child.shapes(layout.layer(2, 5)).each()).polygon
+    assert polygon == pya.Polygon([pya.Point(*p) for p in triangle])
+    text = next(child.shapes(layout.layer(7, 0)).each()).text
+    assert (text.string, text.x, text.y) == ('P1', 50, 60)
+
+    expected = [pya.ICplxTrans(1, 0, False, 10000, 20000),
+                pya.ICplxTrans(1, 90, True, -5000, 0),
+                pya.ICplxTrans(2.5, 30, False, 0, -5000)]
+    expected += [pya.ICplxTrans(1, 0, False, ii * 7000 + jj * 1000, 100000 + jj * 9000)
+                 for ii in range(3) for jj in range(2)]
+    expected += [pya.ICplxTrans(1, 0, False, 0, 200000 + ii * 8000) for ii in range(4)]
+    placed = []
+    for inst in layout.cell('TOP').each_inst():
+        array = inst.cell_inst
+        offsets = [pya.Vector()]
+        if array.is_regular_array():
+            offsets = [array.a * ii + array.b * jj for ii in range(array.na) for jj in range(array.nb)]
+        placed += [str(pya.ICplxTrans(pya.Trans(offset)) * array.cplx_trans) for offset in offsets]
+    assert sorted(placed) == sorted(str(trans) for trans in expected)
+
+@pytest.mark.parametrize('ext', ['.gds', '.oas'])
+def test_region_splits_large_polygons_and_resolves_holes(tmp_path, ext):
+    path = str(tmp_path / f'out{ext}')
+    ring = pya.Region(_circle(1000000, 3 * MAX_POINTS)) - pya.Region(pya.Box(-1000, -1000, 1000, 1000))
+    region = ring + pya.Region(pya.Box(2000000, 0, 2001000, 500))
+    with open_writer(path) as writer:
+        writer.begin_cell('TOP')
+        writer.region(1, 0, region)
+    layout = _read(path)
+    shapes = layout.cell('TOP').shapes(layout.layer(1, 0))
+    assert all(shape.polygon.num_points() <= MAX_POINTS and not shape.polygon.holes()
+               for shape in shapes.each())
+    assert (pya.Region(shapes) ^ region).is_empty()
+
+def test_gds_polygon_refuses_too_many_points(tmp_path):
+    with GdsWriter(str(tmp_path / 'out.gds')) as writer:
+        writer.begin_cell('TOP')
+        with pytest.raises(ValueError):
+            writer.polygon(1, 0, [(ii, ii * ii) for ii in range(MAX_POINTS + 1)])
+
+@pytest.mark.parametrize('ext', ['.gds', '.oas'])
+def test_write_cell_copies_a_layout(tmp_path, ext):
+    layout = pya.Layout()
+    child = layout.create_cell('CHILD')
+    child.shapes(layout.layer(1, 0)).insert(pya.Box(0, 0, 100, 200))
+    child.shapes(layout.layer(1, 0)).insert(pya.Text('A', 10, 20))
+    top = layout.create_cell('TOP')
+    top.shapes(layout.layer(2, 0)).insert(_circle(5000, 64))
+    top.insert(pya.CellInstArray(child.cell_index(), pya.Trans(pya.Trans.M45, 300, 0)))
+    top.insert(pya.CellInstArray(child.cell_index(), pya.Trans(0, 1000), pya.Vector(500, 0),
+                                 pya.Vector(0, 700), 5, 3))
+
+    path = str(tmp_path / f'out{ext}')
+    with open_writer(path) as writer:
+        writer.write_cell(child, child_name=lambda cell: cell.name)
+        writer.write_cell(top, name='RENAMED')
+    read = _read(path)
+    renamed = read.cell('RENAMED')
+    assert renamed.child_instances() == 2
+    for li in layout.layer_indexes():
+        info = layout.get_info(li)
+        original = pya.Region(top.begin_shapes_rec(li))
+        assert (pya.Region(renamed.begin_shapes_rec(read.layer(info))) ^ original).is_empty()
+    texts = [shape.text.string for shape in read.cell('CHILD').each_shape(read.layer(1, 0))
+             if shape.is_text()]
+    assert texts == ['A']
+
+def test_oasis_spans_several_cblocks(tmp_path):
+    path = str(tmp_path / 'out.oas')
+    with OasisWriter(path) as writer:
+        writer.begin_cell('TOP')
+        for ii in range(200000):
+            writer.box(1, 0, ii * 10, 0, ii * 10 + 5, 5 + ii % 7)
+    layout = _read(path)
+    assert layout.cell('TOP').shapes(layout.layer(1, 0)).size() == 200000
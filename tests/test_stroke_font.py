@@ -0,0 +1,20 @@
+import pya
+
+import helpers
+import stroke_font
+
+
+def _counts(region):
+    return (sum(polygon.num_points() for polygon in region.each()),
+            region.decompose_trapezoids_to_region().count(),
+            region.decompose_trapezoids_to_region(pya.Polygon.TD_htrapezoids).count())
+
+def test_stroke_labels_cut_vertices_and_trapezoids():
+    assert _counts(helpers.label('dL=50 W=3 C=2', .001, 20, 'Default')) == (170, 73, 73)
+    assert _counts(helpers.label('dL=50 W=3 C=2', .001, 20, 'Stroke')) == (104, 40, 37)
+
+def test_stroke_text_height_and_advance():
+    region = stroke_font.text('10', .001, 20)
+    assert region.bbox().height() == 20000
+    assert region.bbox() == pya.Box(0, 0, 28000, 20000)
+    assert all(polygon.is_box() or polygon.is_rectilinear() for polygon in region.each())
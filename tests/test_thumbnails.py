@@ -0,0 +1,104 @@
+import json
+import math
+import os
+
+import numpy as np
+import pya
+import pytest
+
+import library
+from thumbnails import ALPHA, build_catalog, render, scanline_fill, thumbnail_name, trapezoids
+from wafer_map import produce
+
+
+def _brute_force(region, left, top, scale, shape):
+    """Samples a region at every pixel center."""
+    mask = np.zeros(shape, dtype=bool)
+    polygons = list(region.merged().each())
+    for r in range(shape[0]):
+        for c in range(shape[1]):
+            point = pya.Point(round(left + (c + .5) / scale), round(top - (r + .5) / scale))
+            mask[r, c] = any(polygon.inside(point) for polygon in polygons)
+    return mask
+
+
+def test_trapezoids_of_box_and_triangle():
+    box = trapezoids(pya.Region(pya.Box(-10, 0, 30, 20)))
+    assert box.tolist() == [[0, 20, -10, 30, -10, 30]]
+    triangle = trapezoids(pya.Region(pya.Polygon([pya.Point(0, 0), pya.Point(100, 0),
+                                                   pya.Point(0, 50)])))
+    assert triangle.tolist() == [[0, 50, 0, 100, 0, 0]]
+    assert trapezoids(pya.Region()).shape == (0, 6)
+
+@pytest.mark.parametrize('scale', [.1, .037])
+def test_scanline_fill_matches_pixel_centers(scale):
+    circle = pya.Polygon([pya.Point(round(400 * math.cos(a)), round(300 * math.sin(a)))
+                          for a in np.linspace(0, 2 * math.pi, 50, endpoint=False)])
+    region = pya.Region(circle) + pya.Region(pya.Polygon([pya.Point(450, -400), pya.Point(700, 200),
+                                                          pya.Point(500, 400)]))
+    region -= pya.Region(pya.Box(-100, -50, 120, 60))
+    shape = (int(900 * scale) + 3, int(1200 * scale) + 3)
+    left, top = -503, 451
+    mask = scanline_fill(trapezoids(region), left, top, scale, shape)
+    expected = _brute_force(region, left, top, scale, shape)
+    # Only pixels at the outline may differ: centers on an edge go either
+    # way, and slivers thinner than a pixel still cover one
+    padded = np.pad(expected, 1, mode='edge')
+    outline = ((padded[1:-1, 1:-1] != padded[:-2, 1:-1]) | (padded[1:-1, 1:-1] != padded[2:, 1:-1])
+               | (padded[1:-1, 1:-1] != padded[1:-1, :-2]) | (padded[1:-1, 1:-1] != padded[1:-1, 2:]))
+    assert not (mask != expected)[~outline].any()
+    assert mask.sum() == pytest.approx(region.area() * scale ** 2, rel=.05)
+
+def test_scanline_fill_keeps_small_features():
+    contact = pya.Region(pya.Box(1010, 1010, 1020, 1020))
+    mask = scanline_fill(trapezoids(contact), 0, 2000, .01, (20, 20))
+    assert mask.sum() == 1 and mask[10, 10]
+    assert not scanline_fill(trapezoids(pya.Region()), 0, 0, 1, (4, 4)).any()
+
+def test_render_blends_the_stack():
+    library.load()
+    layout = pya.Layout()
+    cell = produce(layout, 'vdp', {})
+    image = render(cell, size=64)
+    assert image.shape == (64, 64, 3) and image.dtype == np.uint8
+    assert (image[0, 0] == 255).all() and (image != 255).any()
+
+    red = render(cell, [('metal', (255, 0, 0)), ('99/0', (0, 0, 255))], size=64)
+    colors = {tuple(pixel) for pixel in red.reshape(-1, 3)}
+    metal = tuple(int(round(255 * (1 - ALPHA) + c * ALPHA)) for c in (255, 0, 0))
+    assert colors == {(255, 255, 255), metal}
+    # Margins stay blank
+    assert (red[:2] == 255).all() and (red[:, -2:] == 255).all()
+    assert (render(layout.create_cell('EMPTY'), size=8) == 255).all()
+
+def test_thumbnail_name_depends_on_every_input():
+    names = {thumbnail_name(g, s, n) for g, s, n in [('a', None, 64), ('b', None, 64),
+                                                      ('a', [['1/0', [0, 0, 0]]], 64),
+                                                      ('a', None, 128)]}
+    assert len(names) == 4
+    assert thumbnail_name('a', None, 64) == thumbnail_name('a', None, 64)
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_build_catalog_draws_missing_thumbnails_once(tmp_path, workers):
+    library.load()
+    structures = [('vdp', {}), ('vdp', {}), ('tlm', {}),
+                  ('vdp', {'metal': pya.LayerInfo(4, 0)}), ('vdp', {'alignment': 2})]
+    stacks = {'all': None, 'metal': [(pya.LayerInfo(4, 0), (255, 0, 0))]}
+    entries, drawn = build_catalog(str(tmp_path), structures, stacks, size=32,
+                                   workers=workers, chunk_size=1)
+    # Duplicates are one structure; a default written out draws the same
+    # thumbnails, twice at worst when two workers race for them
+    assert [entry['pcell'] for entry in entries] == ['vdp', 'tlm', 'vdp', 'vdp']
+    assert entries[2]['thumbnails'] == entries[0]['thumbnails']
+    files = {name for entry in entries for name in entry['thumbnails'].values()}
+    assert len(files) == 6
+    assert drawn == 6 if workers == 1 else 6 <= drawn <= 8
+    for name in files:
+        with open(tmp_path / name, 'rb') as f:
+            assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+    assert sorted(os.listdir(tmp_path)) == sorted(files | {'catalog.json'})
+    with open(tmp_path / 'catalog.json') as f:
+        assert json.load(f) == entries
+
+    again, drawn = build_catalog(str(tmp_path), structures, stacks, size=32, workers=workers)
+    assert again == entries and drawn == 0
@@ -0,0 +1,13 @@
+import xml.etree.ElementTree as ET
+
+from wafer_heatmap import render_svg
+
+
+def test_render_svg_escapes_text(tmp_path):
+    path = str(tmp_path / 'map.svg')
+    sites = {'A01': (0, 0), 'B<1>': (1000, 0)}
+    render_svg(path, ['A01', 'B<1>'], [1., 2.], sites, 1000, 1000, title='Rsh <n+> & R&D')
+    root = ET.parse(path).getroot()
+    ns = {'svg': 'http://www.w3.org/2000/svg'}
+    assert root.find('svg:text', ns).text == 'Rsh <n+> & R&D'
+    assert [title.text for title in root.iterfind('svg:rect/svg:title', ns)] == ['A01', 'B<1>']
@@ -0,0 +1,54 @@
+import pya
+import pytest
+
+import library
+from stream_writer import open_writer
+from wafer_map import NOTCH_SIZE, die_rows, outline_points, produce, write_structures
+
+
+def _contacts(layout, cell):
+    return pya.Region(cell.begin_shapes_rec(layout.layer(3, 0))).merged().count()
+
+@pytest.mark.parametrize('pcell, expected', [('tlm_array', 40), ('fpp_array', 13)])
+@pytest.mark.parametrize('ext', ['.gds', '.oas'])
+def test_written_structures_keep_child_contacts(tmp_path, pcell, expected, ext):
+    library.load()
+    path = str(tmp_path / f'out{ext}')
+    with open_writer(path) as writer:
+        write_structures(writer, [(pcell, {}, 0, 0), (pcell, {}, 2000, 0)], 'TOP', prefix='c0_')
+    layout = pya.Layout()
+    layout.read(path)
+    top = layout.cell('TOP')
+    assert _contacts(layout, top) == 2 * expected
+    # Every referenced cell is defined, once
+    names = [cell.name for cell in layout.each_cell()]
+    assert len(names) == len(set(names))
+    assert all(not cell.is_ghost_cell() for cell in layout.each_cell())
+
+def test_produced_contacts_match_written(tmp_path):
+    library.load()
+    scratch = pya.Layout()
+    assert _contacts(scratch, produce(scratch, 'tlm_array', {})) == 40
+
+
+def test_die_rows_split_around_notch():
+    die = 1000
+    rows = die_rows(100000, die, die, notch=True)
+    notch = pya.DBox(- NOTCH_SIZE / 2, - 50000, NOTCH_SIZE / 2,
+                     - 50000 + NOTCH_SIZE)
+    bottom = [run for run in rows if run[0] == rows[-1][0]]
+    assert len(bottom) == 2
+    sites = set()
+    for row, y, first, x, count in rows:
+        for ii in range(count):
+            assert not pya.DBox(x + ii * die - die / 2, y - die / 2,
+                                x + ii * die + die / 2, y + die / 2).overlaps(notch.enlarged(3000))
+            sites.add((first + ii, row))
+    assert len(sites) == sum(run[4] for run in rows)
+
+
+def test_outline_points_draw_notch():
+    points = outline_points(100000, notch=True)
+    outline = pya.DPolygon([pya.DPoint(x, y) for x, y in points])
+    assert not outline.inside(pya.DPoint(0, - 50000 + NOTCH_SIZE / 2))
+    assert outline.inside(pya.DPoint(0, - 50000 + 2 * NOTCH_SIZE))
@@ -0,0 +1,209 @@
+"""
+Headless thumbnails and a cached catalog of structure variants.
+
+Structures are produced at full detail, cut into horizontal trapezoids and
+scanline filled with numpy, one boolean mask per layer, which are blended
+over white in the order of a layer stack. No GUI or imaging library is
+needed.
+
+Thumbnails are named by a hash of the geometry fingerprint, the stack and
+the size, so variants drawing the same picture share one file and an
+unchanged variant is never drawn twice. Rebuilding a catalog produces and
+fingerprints every variant in a process pool and only draws the missing
+thumbnails.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pya
+
+import helpers
+import raster
+from fingerprint import cell_hash, cell_key
+from spec_loader import chunks
+from wafer_map import produce
+
+# Opacity of each layer drawn over the ones below it
+ALPHA = .6
+
+
+def trapezoids(region):
+    """Cuts a region into horizontal trapezoids.
+
+    Returns:
+        (n, 6) array of bottom y, top y, bottom left x, bottom right x, top
+        left x and top right x in dbu
+    """
+    rows = []
+    for polygon in region.merged().decompose_trapezoids_to_region(
+            pya.Polygon.TD_htrapezoids).each():
+        points = [(p.x, p.y) for p in polygon.each_point_hull()]
+        bottom = min(y for _, y in points)
+        top = max(y for _, y in points)
+        low = [x for x, y in points if y == bottom]
+        high = [x for x, y in points if y == top]
+        rows.append((bottom, top, min(low), max(low), min(high), max(high)))
+    return np.array(rows, dtype=float).reshape(-1, 6)
+
+def scanline_fill(traps, left, top, scale, shape):
+    """Fills trapezoids into a boolean mask, sampled at pixel centers.
+
+    Features smaller than a pixel still cover one pixel, so thin lines and
+    small contacts stay visible.
+
+    Args:
+        traps is as from trapezoids
+        left, top is the corner of pixel (0, 0) in dbu
+        scale is pixels per dbu
+        shape is (rows, cols)
+    """
+    h, w = shape
+    if not len(traps) or not h or not w:
+        return np.zeros(shape, dtype=bool)
+    y0, y1, xl0, xr0, xl1, xr1 = traps.T
+    # Rows whose centers lie in [y0, y1), at least one per trapezoid
+    r0 = np.ceil((top - y1) * scale - .5).astype(np.int64)
+    r1 = np.maximum(np.floor((top - y0) * scale - .5).astype(np.int64) + 1, r0 + 1)
+    r0, r1 = np.clip(r0, 0, h), np.clip(r1, 0, h)
+    counts = np.maximum(r1 - r0, 0)
+    index = np.repeat(np.arange(len(traps)), counts)
+    starts = np.cumsum(counts) - counts
+    rows = r0[index] + np.arange(counts.sum()) - starts[index]
+
+    yc = top - (rows + .5) / scale
+    height = np.where(y1 > y0, y1 - y0, 1)[index]
+    t = np.clip((yc - y0[index]) / height, 0, 1)
+    xl = xl0[index] + t * (xl1 - xl0)[index]
+    xr = xr0[index] + t * (xr1 - xr0)[index]
+    c0 = np.ceil((xl - left) * scale - .5).astype(np.int64)
+    c1 = np.maximum(np.ceil((xr - left) * scale - .5).astype(np.int64), c0 + 1)
+    # +1 where a span starts and -1 after it ends, summed along each row
+    edges = np.zeros((h, w + 1), dtype=np.int32)
+    np.add.at(edges, (rows, np.clip(c0, 0, w)), 1)
+    np.add.at(edges, (rows, np.clip(c1, 0, w)), -1)
+    return np.cumsum(edges[:, :w], axis=1) > 0
+
+def default_stack(n):
+    """Returns n viridis colors for a stack of n layers."""
+    return [tuple(int(c) for c in rgb) for rgb in raster.colorize(np.arange(n), 0, max(n - 1, 1))]
+
+def _stack_layers(cell, stack):
+    """Resolves a stack to (layer index, color) in drawing order.
+
+    Entries name a layer parameter of the PCell, like 'metal', or a layer
+    like '1/0'; layers the cell does not have are skipped.
+    """
+    layout = cell.layout()
+    used = [li for li in layout.layer_indexes()
+            if not pya.Region(cell.begin_shapes_rec(li)).is_empty()]
+    if stack is None:
+        return list(zip(used, default_stack(len(used))))
+    params = cell.pcell_parameters_by_name() if cell.is_pcell_variant() else {}
+    by_name = {str(layout.get_info(li)): li for li in used}
+    layers = []
+    for layer, color in stack:
+        info = params.get(layer) if isinstance(params.get(layer), pya.LayerInfo) else layer
+        li = by_name.get(str(info))
+        if li is not None:
+            layers.append((li, tuple(color)))
+    return layers
+
+def render(cell, stack=None, size=128, margin=2):
+    """Draws a cell as an RGB thumbnail.
+
+    Args:
+        stack is a list of (layer, (r, g, b)) from bottom to top; a layer
+            is a layer parameter name like 'metal' or a layer like '1/0'.
+            None draws every layer in layer order with viridis colors
+        size is the edge of the square image in pixels
+        margin is the blank border in pixels
+    Returns:
+        (size, size, 3) uint8 array
+    """
+    image = np.full((size, size, 3), 255, dtype=float)
+    box = cell.bbox()
+    if box.empty():
+        return image.astype(np.uint8)
+    inner = max(size - 2 * margin, 1)
+    scale = inner / max(box.width(), box.height(), 1)
+    # Center the cell in the image
+    left = box.center().x - size / 2 / scale
+    top = box.center().y + size / 2 / scale
+    for li, color in _stack_layers(cell, stack):
+        region = pya.Region(cell.begin_shapes_rec(li))
+        mask = scanline_fill(trapezoids(region), left, top, scale, (size, size))
+        image[mask] = image[mask] * (1 - ALPHA) + np.array(color, dtype=float) * ALPHA
+    return np.round(image).astype(np.uint8)
+
+def thumbnail_name(geometry, stack, size):
+    """File name of a thumbnail from the cell hash, stack and size."""
+    digest = hashlib.sha256(f'{geometry}|{json.dumps(stack)}|{size}'.encode())
+    return digest.hexdigest()[:24] + '.png'
+
+
+def _build_chunk(args):
+    directory, structures, stacks, size, dbu = args
+    entries = []
+    drawn = 0
+    with helpers.full_detail():
+        for pcell, params in structures:
+            layout = pya.Layout()
+            layout.dbu = dbu
+            cell = produce(layout, pcell, params)
+            geometry = cell_hash(layout, cell)
+            files = {}
+            for name, stack in stacks.items():
+                files[name] = thumbnail_name(geometry, stack, size)
+                path = os.path.join(directory, files[name])
+                if not os.path.exists(path):
+                    # Written under a temporary name so a killed build
+                    # leaves no partial file behind
+                    raster.write_png(path + f'.{os.getpid()}', render(cell, stack, size))
+                    os.replace(path + f'.{os.getpid()}', path)
+                    drawn += 1
+            entries.append({'key': cell_key(cell), 'pcell': pcell, 'hash': geometry,
+                            'thumbnails': files})
+            layout._destroy()
+    return entries, drawn
+
+def build_catalog(directory, structures, stacks=None, size=128, workers=None, chunk_size=100,
+                  dbu=.001):
+    """Draws the missing thumbnails of a set of structures.
+
+    Writes directory/catalog.json with one entry per distinct structure:
+    its fingerprint key, pcell, geometry hash and the thumbnail file per
+    stack.
+
+    Args:
+        structures is an iterable of (pcell, params), for example the
+            placements of a spec without x and y
+        stacks maps stack names to stacks as for render, with layers as
+            strings; defaults to one stack 'all' of every layer
+        workers is the process count; defaults to the CPU count
+    Returns:
+        the catalog entries and the number of thumbnails drawn
+    """
+    os.makedirs(directory, exist_ok=True)
+    stacks = {'all': None} if stacks is None else \
+        {name: None if stack is None else [(str(layer), list(color)) for layer, color in stack]
+         for name, stack in stacks.items()}
+    distinct = {}
+    for pcell, params in structures:
+        params = {k: str(v) if isinstance(v, pya.LayerInfo) else v for k, v in params.items()}
+        distinct.setdefault((pcell, json.dumps(params, sort_keys=True)), (pcell, params))
+    jobs = [(directory, chunk, stacks, size, dbu)
+            for chunk in chunks(distinct.values(), chunk_size)]
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(jobs) <= 1:
+        results = list(map(_build_chunk, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = list(pool.map(_build_chunk, jobs))
+    entries = [entry for part, _ in results for entry in part]
+    with open(os.path.join(directory, 'catalog.json'), 'w') as f:
+        json.dump(entries, f, indent=1)
+    return entries, sum(drawn for _, drawn in results)
@@ -0,0 +1,126 @@
+"""
+A row of transmission lines sweeping contact spacing and width.
+
+Used for measuring sheet resistance and contact resistance of a whole
+tlm or six_p_tlm family in one structure. Every line runs from a contact
+on a shared bus to a contact on its own pad, so N lines need N + 2 pads
+instead of 2 N. The two bus pads are force and sense of the common side.
+"""
+
+import numpy as np
+import pya
+
+import constraints
+import helpers
+
+class tlm_array(pya.PCellDeclarationHelper):
+
+  def __init__(self):
+    # Important: initialize the super class
+    super(tlm_array, self).__init__()
+    # declare the parameters
+    self.param("resistor", self.TypeLayer, "Layer", default = pya.LayerInfo(1, 0))
+    self.param("contact", self.TypeLayer, "Layer", default = pya.LayerInfo(3, 0))
+    self.param("metal", self.TypeLayer, "Layer", default = pya.LayerInfo(4, 0))
+
+    # One value is used for every line; otherwise one value per line
+    self.param("dl", self.TypeList, "Contact Spacings", default=["10", "20", "40", "80", "160"])
+    self.param("width", self.TypeList, "Structure Widths", default=["20"])
+
+    self.param("pad_w", self.TypeDouble, "Pad Width", default = 150)
+    self.param("pad_h", self.TypeDouble, "Pad Length", default = 100)
+    self.param("pad_dx", self.TypeDouble, "X pad spacing", default=50)
+    self.param("pad_dy", self.TypeDouble, "Y pad spacing", default=50)
+    self.param("bus_w", self.TypeDouble, "Bus Width", default=20)
+
+    self.param("alignment", self.TypeDouble, "Alignment Accuracy", default = 1)
+    self.param("contact_size", self.TypeDouble, "Contact Size", default = 2)
+
+    self.param("disp_W", self.TypeBoolean, "Display W?", default=True)
+    self.param("disp_dL", self.TypeBoolean, "Display dL?", default=True)
+    self.param("text_h", self.TypeDouble, "Text Height", default = 20)
+    self.param("font", self.TypeString, "Label Font", default="Default",
+               choices=[(font, font) for font in helpers.FONTS])
+    self.param("merge", self.TypeBoolean, "Merge shapes?", default=False)
+
+
+  def display_text_impl(self):
+    return f'tlm array dl={",".join(self.dl)} W={",".join(self.width)}'
+
+  def coerce_parameters_impl(self):
+    constraints.coerce_pcell(self)
+
+  def produce_impl(self):
+    constraints.check_pcell(self)
+    dbu = self.layout.dbu
+    dl_um, w_um = np.broadcast_arrays(np.array(self.dl, dtype=float),
+                                      np.array(self.width, dtype=float))
+    dl = dl_um / dbu
+    w = w_um / dbu
+    pad_w = self.pad_w / dbu
+    pad_h = self.pad_h / dbu
+    pad_dx = self.pad_dx / dbu
+    pad_dy = self.pad_dy / dbu
+    bus_w = self.bus_w / dbu
+    alignment = self.alignment / dbu
+    contact_size = self.contact_size / dbu
+
+    contact_box = contact_size + 4 * alignment
+    metal_w = w + 2 * alignment
+    pitch = max(pad_w, metal_w.max()) + pad_dx
+    xs = np.arange(len(dl)) * pitch
+    top = 2 * contact_box + dl
+    pad_y = top.max() + pad_dy
+
+    # Lines with their contact metal; the bottom metal reaches into the bus
+    for x, line_w, line_top, m_w in zip(xs, w, top, metal_w):
+      self.cell.shapes(self.resistor_layer).insert(pya.Box(
+          x - line_w / 2, 0, x + line_w / 2, line_top))
+      self.cell.shapes(self.metal_layer).insert(pya.Box(
+          x - m_w / 2, - bus_w, x + m_w / 2, contact_box))
+      self.cell.shapes(self.metal_layer).insert(pya.Box(
+          x - m_w / 2, line_top - contact_box, x + m_w / 2, pad_y))
+      self.cell.shapes(self.metal_layer).insert(pya.Box(
+          x - pad_w / 2, pad_y, x + pad_w / 2, pad_y + pad_h))
+
+    # Shared bus with a pad at either end
+    bus_x = [xs[0] - pitch, xs[-1] + pitch]
+    self.cell.shapes(self.metal_layer).insert(pya.Box(bus_x[0], - bus_w, bus_x[1], 0))
+    for x in bus_x:
+      self.cell.shapes(self.metal_layer).insert(pya.Box(
+          *helpers.center_size_to_points(x, - bus_w / 2, pad_w, pad_h)))
+
+    # Add contacts, a row across each line at either end
+    if not helpers.draft():
+      counts = np.maximum(np.floor((w - 4 * alignment - contact_size)
+                                   / (2 * contact_size)).astype(int) + 1, 1)
+      row_x = xs - (counts - 1) * contact_size
+      contact = helpers.contact_cell(self.cell, self.contact_layer, contact_size)
+      for row_y in [np.full(len(xs), contact_box / 2), top - contact_box / 2]:
+        helpers.insert_arrays(self.cell, contact, np.stack([row_x, row_y], axis=1),
+                              counts.tolist(), (2 * contact_size, 0))
+
+    # Display text with relevant parameters
+    # Show dL, W or both above each line
+    if (self.disp_dL or self.disp_W) and not helpers.draft():
+      for x, line_dl, line_w in zip(xs, dl_um, w_um):
+        disp_str = ''
+        if self.disp_dL:
+          disp_str += f'dL={line_dl:g} '
+        if self.disp_W:
+          disp_str += f'W={line_w:g} '
+        # Generate klayout region containing text
+        # This can only generate with lower left at (0, 0)
+        text = helpers.label(disp_str[:-1], self.layout.dbu, self.text_h, self.font)
+
+        # Adjust position of region
+        bbox = text.bbox()
+        text_len = (bbox.right - bbox.left)
+        text.move(x - text_len / 2, pad_y + pad_h + .05 * pad_h)
+
+        # Add region to metal layer
+        self.cell.shapes(self.metal_layer).insert (text)
+
+    # Optionally merge each layer into a minimal set of polygons
+    if self.merge:
+      helpers.merge_shapes(self.cell)
@@ -5,6 +5,7 @@ A good ol fashioned transistor.
 import pya
 import math
 
+import constraints
 import helpers
 
 class transistor(pya.PCellDeclarationHelper):
@@ -31,15 +32,19 @@ class transistor(pya.PCellDeclarationHelper):
     self.param("disp_L", self.TypeBoolean, "Display L?", default=True)
     self.param("disp_W", self.TypeBoolean, "Display W?", default=True)
     self.param("text_h", self.TypeDouble, "Text Height", default = 20)
+    self.param("font", self.TypeString, "Label Font", default="Default",
+               choices=[(font, font) for font in helpers.FONTS])
+    self.param("merge", self.TypeBoolean, "Merge shapes?", default=False)
 
 
   def display_text_impl(self):
     return f'Trans L={self.L} W={self.W}'
   
   def coerce_parameters_impl(self):
-    pass
+    constraints.coerce_pcell(self)
 
   def produce_impl(self):
+    constraints.check_pcell(self)
     dbu = self.layout.dbu
     W = self.W / dbu
     L = self.L / dbu
@@ -68,7 +73,9 @@ class transistor(pya.PCellDeclarationHelper):
         *helpers.center_size_to_points(- (W + 3 * offset) / 2, 0, offset, gate_contact_h)))
 
     gate_contact_x = - W / 2 - 3 * offset / 2
-    for ii in range(int((gate_contact_h - 2 * alignment) / (contact_size + 2 * alignment))):
+    # Contact arrays are left out in draft mode
+    num_contacts = 0 if helpers.draft() else int((gate_contact_h - 2 * alignment) / (contact_size + 2 * alignment))
+    for ii in range(num_contacts):
         #contact_y = gate_contact_h / 2 - (ii + 1) * (contact_size + alignment) + contact_size / 2 - alignment
         contact_y = gate_contact_h / 2 - offset / 2 - ii * (contact_size + 2 * alignment)
         self.cell.shapes(self.contact_layer).insert(pya.Box(
@@ -87,7 +94,8 @@ class transistor(pya.PCellDeclarationHelper):
     # Add in S/D contacts, also P well contacts
     sd_contact_y = (active_L - offset) / 2
     p_well_y = - sd_contact_y - 2 * offset
-    for ii in range(int((contact_w - 2 * alignment) / (contact_size + 2 * alignment))):
+    num_contacts = 0 if helpers.draft() else int((contact_w - 2 * alignment) / (contact_size + 2 * alignment))
+    for ii in range(num_contacts):
         contact_x = - contact_w / 2 + offset / 2 + ii * (contact_size + 2 * alignment)
         self.cell.shapes(self.contact_layer).insert(pya.Box(
             *helpers.center_size_to_points(contact_x, sd_contact_y, contact_size, contact_size))) 
@@ -127,12 +135,10 @@ class transistor(pya.PCellDeclarationHelper):
     elif self.disp_W:
         disp_str = f'W={self.W:g}'
     
-    if disp_str:
+    if disp_str and not helpers.draft():
         # Generate klayout region containing text
         # This can only generate with lower left at (0, 0)
-        text_generator = pya.TextGenerator.default_generator()
-        # default height is .7; third argument rescales to desired size
-        text = text_generator.text(disp_str, self.layout.dbu, self.text_h / .7)
+        text = helpers.label(disp_str, self.layout.dbu, self.text_h, self.font)
 
         # Adjust position of region
         bbox = text.bbox()
@@ -143,3 +149,7 @@ class transistor(pya.PCellDeclarationHelper):
 
         # Add region to metal layer
         self.cell.shapes(self.metal_layer).insert (text)
+
+    # Optionally merge each layer into a minimal set of polygons
+    if self.merge:
+        helpers.merge_shapes(self.cell)
@@ -7,6 +7,7 @@ Used for measuring sheet resistance.
 import pya
 import math
 
+import constraints
 import helpers
 
 class vdp(pya.PCellDeclarationHelper):
@@ -35,15 +36,19 @@ class vdp(pya.PCellDeclarationHelper):
     self.param("disp_slit", self.TypeBoolean, "Display slit?", default=True)
     self.param("disp_dia", self.TypeBoolean, "Display dia?", default=True)
     self.param("text_h", self.TypeDouble, "Text Height", default = 20)
+    self.param("font", self.TypeString, "Label Font", default="Default",
+               choices=[(font, font) for font in helpers.FONTS])
+    self.param("merge", self.TypeBoolean, "Merge shapes?", default=False)
 
 
   def display_text_impl(self):
     return f'Van Der Pauw Square Size={self.square}'
   
   def coerce_parameters_impl(self):
-    pass
+    constraints.coerce_pcell(self)
 
   def produce_impl(self):
+    constraints.check_pcell(self)
     dbu = self.layout.dbu
 
     pad_w = self.pad_w / dbu
@@ -94,10 +99,11 @@ class vdp(pya.PCellDeclarationHelper):
                 x_mir * (contact_pos - metal_w / 2), y_mir * pad_dy / 2,
                 x_mir * pad_dx / 2, y_mir * (metal_w + pad_dy / 2)))
             # Define contacts
-            self.cell.shapes(self.contact_layer).insert(pya.Box(
-                *helpers.center_size_to_points(
-                    x_mir * contact_pos, y_mir * contact_pos,
-                    contact_size, contact_size)))
+            if not helpers.draft():
+                self.cell.shapes(self.contact_layer).insert(pya.Box(
+                    *helpers.center_size_to_points(
+                        x_mir * contact_pos, y_mir * contact_pos,
+                        contact_size, contact_size)))
 
     # Display text with relevant parameters
     # Show some subset of square, slit, and dia
@@ -109,12 +115,10 @@ class vdp(pya.PCellDeclarationHelper):
     if self.disp_dia:
         disp_str += f'D={self.dia:g} '
     
-    if disp_str:
+    if disp_str and not helpers.draft():
         # Generate klayout region containing text
         # This can only generate with lower left at (0, 0)
-        text_generator = pya.TextGenerator.default_generator()
-        # default height is .7; third argument rescales to desired size
-        text = text_generator.text(disp_str[:-1], self.layout.dbu, self.text_h / .7)
+        text = helpers.label(disp_str[:-1], self.layout.dbu, self.text_h, self.font)
 
         # Adjust position of region
         bbox = text.bbox()
@@ -125,3 +129,7 @@ class vdp(pya.PCellDeclarationHelper):
 
         # Add region to metal layer
         self.cell.shapes(self.metal_layer).insert (text)
+
+    # Optionally merge each layer into a minimal set of polygons
+    if self.merge:
+        helpers.merge_shapes(self.cell)
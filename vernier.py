@@ -7,6 +7,7 @@ Used for optical inspection of alignment.
 import pya
 import math
 
+import constraints
 import helpers
 
 class vernier(pya.PCellDeclarationHelper):
@@ -27,9 +28,10 @@ class vernier(pya.PCellDeclarationHelper):
     return f'Venier shift={self.shift}'
   
   def coerce_parameters_impl(self):
-    pass
+    constraints.coerce_pcell(self)
 
   def produce_impl(self):
+    constraints.check_pcell(self)
     dbu = self.layout.dbu
     tw = self.tick_width / dbu
     th = self.tick_height / dbu
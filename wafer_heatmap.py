@@ -0,0 +1,199 @@
+"""
+Wafer maps of extracted parameters.
+
+Values are collected per die by grid_labels site ID, rasterized on the
+die grid and written as PNG or SVG. Radial or planar process trends are
+fitted with Zernike polynomials over the die centers and can be removed
+to show the residual pattern.
+"""
+
+import math
+import os
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+import raster
+from grid_labels import parse_site_name
+
+
+def per_die(dies, values):
+    """Medians of values per die, ignoring NaN.
+
+    Returns:
+        (die names, medians) with the names sorted
+    """
+    dies = np.asarray(dies).astype(str)
+    values = np.asarray(values, dtype=float)
+    keep = np.isfinite(values)
+    names, group = np.unique(dies[keep], return_inverse=True)
+    order = np.lexsort((values[keep], group))
+    ordered = values[keep][order]
+    counts = np.bincount(group, minlength=len(names))
+    starts = np.cumsum(counts) - counts
+    return names, (ordered[starts + (counts - 1) // 2] + ordered[starts + counts // 2]) / 2
+
+def rasterize(dies, values):
+    """Places one value per die on the die grid.
+
+    Returns:
+        (rows, cols) array, row 0 on top, NaN where there is no value,
+        and the (col, row) of its upper left die
+    """
+    cells = np.array([parse_site_name(str(die)) for die in dies], dtype=np.int64).reshape(-1, 2)
+    if not len(cells):
+        return np.full((0, 0), np.nan), (0, 0)
+    low = cells.min(axis=0)
+    size = cells.max(axis=0) - low + 1
+    grid = np.full((size[1], size[0]), np.nan)
+    grid[cells[:, 1] - low[1], cells[:, 0] - low[0]] = values
+    return grid, (int(low[0]), int(low[1]))
+
+def zernike_terms(order, radial=False):
+    """Returns the (n, m) Zernike indices up to radial order n."""
+    return [(n, m) for n in range(order + 1) for m in range(- n, n + 1, 2)
+            if not radial or m == 0]
+
+def zernike_basis(x, y, order=2, radius=None, radial=False):
+    """Evaluates Zernike polynomials at points on the wafer.
+
+    Order 1 is a plane; order n spans every polynomial in x and y up to
+    degree n. With radial only the rotationally symmetric terms are used.
+
+    Args:
+        x, y are point coordinates relative to the wafer center
+        radius normalizes the coordinates; defaults to the farthest point
+    Returns:
+        the (n, m) terms and a (points, terms) array
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    r = np.hypot(x, y)
+    radius = radius or np.nanmax(r, initial=0) or 1
+    rho = r / radius
+    theta = np.arctan2(y, x)
+    terms = zernike_terms(order, radial)
+    columns = []
+    for n, m in terms:
+        a = abs(m)
+        poly = sum((-1) ** k * math.factorial(n - k)
+                   / (math.factorial(k) * math.factorial((n + a) // 2 - k)
+                      * math.factorial((n - a) // 2 - k)) * rho ** (n - 2 * k)
+                   for k in range((n - a) // 2 + 1))
+        columns.append(poly * (np.cos(a * theta) if m >= 0 else np.sin(a * theta)))
+    return terms, np.stack(columns, axis=-1)
+
+def fit_trend(x, y, values, order=2, radius=None, radial=False):
+    """Least squares Zernike fit of values over die centers.
+
+    Returns:
+        dict mapping (n, m) to coefficients, and the trend at every point
+    """
+    terms, basis = zernike_basis(x, y, order, radius, radial)
+    values = np.asarray(values, dtype=float)
+    keep = np.isfinite(values) & np.isfinite(basis).all(axis=1)
+    coefficients = np.linalg.lstsq(basis[keep], values[keep], rcond=None)[0]
+    return dict(zip(terms, coefficients)), basis @ coefficients
+
+def _label(value):
+    return f'{value:.3g}'
+
+def render_png(path, grid, title='', pixels=8, vmin=None, vmax=None, colormap=raster.VIRIDIS):
+    """Writes a die grid as a PNG heatmap with a title and color bar.
+
+    Args:
+        grid is as from rasterize
+        pixels is the edge of one die in pixels
+    """
+    finite = grid[np.isfinite(grid)]
+    if vmin is None:
+        vmin = finite.min() if finite.size else 0
+    if vmax is None:
+        vmax = finite.max() if finite.size else 1
+    scale = max(pixels // 4, 1)
+    margin = 4 * scale
+    top = margin + (2 * raster.HEIGHT * scale + margin if title else 0)
+    rows, cols = grid.shape
+    labels = [_label(vmax), _label(vmin)]
+    label_w = max(len(label) for label in labels) * raster.ADVANCE * scale
+    bar_w = 3 * margin
+    height = max(top + rows * pixels + margin, top + 2 * raster.HEIGHT * scale + margin)
+    width = margin + cols * pixels + margin + bar_w + margin + label_w + margin
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    image[top:top + rows * pixels, margin:margin + cols * pixels] = raster.colorize(
+        grid, vmin, vmax, colormap).repeat(pixels, axis=0).repeat(pixels, axis=1)
+    bar_h = max(rows * pixels, 2 * raster.HEIGHT * scale)
+    bar = np.linspace(vmax, vmin, bar_h)[:, None].repeat(bar_w, axis=1)
+    bar_x = margin + cols * pixels + margin
+    image[top:top + bar_h, bar_x:bar_x + bar_w] = raster.colorize(bar, vmin, vmax, colormap)
+    raster.draw_text(image, labels[0], bar_x + bar_w + margin, top, scale)
+    raster.draw_text(image, labels[1], bar_x + bar_w + margin,
+                     top + bar_h - raster.HEIGHT * scale, scale)
+    if title:
+        raster.draw_text(image, title, margin, margin, 2 * scale)
+    raster.write_png(path, image)
+
+def render_svg(path, dies, values, sites, die_w, die_h, title='', vmin=None, vmax=None,
+               colormap=raster.VIRIDIS):
+    """Writes per die values as an SVG map at the die positions.
+
+    Args:
+        sites maps die names to die centers in um, as from build_wafer
+        die_w, die_h is the die step in um
+    """
+    xy = np.array([sites.get(str(die), (np.nan, np.nan)) for die in dies], dtype=float).reshape(-1, 2)
+    keep = np.isfinite(xy).all(axis=1)
+    colors = raster.colorize(np.asarray(values, dtype=float)[keep], vmin, vmax, colormap)
+    left, right = np.nanmin(xy[:, 0]) - die_w, np.nanmax(xy[:, 0]) + die_w
+    low, high = np.nanmin(xy[:, 1]) - die_h, np.nanmax(xy[:, 1]) + die_h
+    rects = [f'<rect x="{x - die_w / 2:g}" y="{- y - die_h / 2:g}" width="{die_w:g}" '
+             f'height="{die_h:g}" fill="#{r:02x}{g:02x}{b:02x}"><title>{escape(str(die))}</title></rect>'
+             for (x, y), (r, g, b), die in zip(xy[keep], colors, np.asarray(dies)[keep])]
+    with open(path, 'w') as f:
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" '
+                f'viewBox="{left:g} {- high - die_h:g} {right - left:g} {high - low + die_h:g}">\n')
+        if title:
+            f.write(f'<text x="{left:g}" y="{- high:g}" font-size="{die_h * .8:g}">{escape(title)}</text>\n')
+        f.write('\n'.join(rects))
+        f.write('\n</svg>\n')
+
+def report(directory, sites, parameters, order=None, radial=False, pixels=8, svg=False,
+           die_w=None, die_h=None):
+    """Writes a wafer map per parameter, and a residual map per trend.
+
+    Args:
+        sites maps die names to die centers in um, as from build_wafer
+        parameters maps names to (dies, values) per measurement; values
+            are reduced to the median per die
+        order fits a Zernike trend of that order over the die centers;
+            None skips the trend
+        svg also writes <name>.svg, which needs die_w and die_h
+    Returns:
+        dict mapping names to summary dicts of dies, mean, std and, with
+        a trend, the coefficients and residual std
+    """
+    os.makedirs(directory, exist_ok=True)
+    summary = {}
+    for name, (dies, values) in parameters.items():
+        names, medians = per_die(dies, values)
+        grid, _ = rasterize(names, medians)
+        render_png(os.path.join(directory, f'{name}.png'), grid, name, pixels)
+        if svg:
+            render_svg(os.path.join(directory, f'{name}.svg'), names, medians, sites,
+                       die_w, die_h, name)
+        info = {'dies': len(names), 'mean': float(np.mean(medians)) if len(names) else math.nan,
+                'std': float(np.std(medians)) if len(names) else math.nan}
+        if order is not None:
+            xy = np.array([sites.get(die, (np.nan, np.nan)) for die in names],
+                          dtype=float).reshape(-1, 2)
+            coefficients, trend = fit_trend(xy[:, 0], xy[:, 1], medians, order, radial=radial)
+            residual = medians - trend
+            grid, _ = rasterize(names, residual)
+            bound = np.nanmax(np.abs(residual), initial=0) or 1
+            render_png(os.path.join(directory, f'{name}_residual.png'), grid,
+                       f'{name} residual', pixels, - bound, bound, raster.DIVERGING)
+            info.update(trend={f'Z{n},{m}': float(c) for (n, m), c in coefficients.items()},
+                        residual_std=float(np.nanstd(residual)))
+        summary[name] = info
+    return summary
@@ -0,0 +1,267 @@
+"""
+Wafer map generator.
+
+Steps a die cell across a circular wafer with edge exclusion and a flat or
+notch. Every row of complete dies is a single CellInstArray, so the wafer
+stays hierarchical and costs little more than the die itself.
+
+stream_wafer builds the same wafer straight into a GDSII or OASIS file
+without ever holding the whole die in a layout.
+"""
+
+import json
+import math
+
+import pya
+
+import helpers
+import library
+from grid_labels import site_name
+from stream_writer import open_writer
+
+# SEMI primary flat lengths in um by wafer diameter in mm
+FLAT_LENGTHS = {
+    100: 32500,
+    150: 57500,
+}
+
+# Size of the orientation notch in um
+NOTCH_SIZE = 1000
+
+
+def _flat_y(wafer_dia, flat_length):
+    """y of the wafer flat, relative to the wafer center."""
+    rad = wafer_dia / 2
+    return - math.sqrt(rad ** 2 - (flat_length / 2) ** 2)
+
+def die_rows(wafer_dia, die_w, die_h, edge_exclusion=3000, flat_length=None,
+             notch=False, offset=(0, 0)):
+    """Lays out the complete dies which fit on the usable wafer area.
+
+    The grid is centered on the wafer center shifted by offset. Rows are
+    numbered from the top and columns from the left, starting at the
+    first row and column which hold a die.
+
+    Args:
+        wafer_dia is the wafer diameter in um
+        die_w, die_h is the die step in um
+        edge_exclusion is the unusable ring at the edge in um
+        flat_length is the length of the primary flat, None for no flat
+        notch keeps dies clear of a notch at the bottom of the wafer
+    Returns:
+        list of (row, y, first col, x of first die, count) with die
+        centers in um relative to the wafer center, one per run of
+        adjacent dies; a row split by the notch has two runs
+    """
+    rad = wafer_dia / 2 - edge_exclusion
+    bottom = - rad
+    if flat_length:
+        bottom = max(bottom, _flat_y(wafer_dia, flat_length) + edge_exclusion)
+
+    def fits(x, y):
+        left, right = x - die_w / 2, x + die_w / 2
+        low, high = y - die_h / 2, y + die_h / 2
+        if low < bottom:
+            return False
+        if notch and low < - wafer_dia / 2 + NOTCH_SIZE + edge_exclusion \
+                and abs(x) < die_w / 2 + NOTCH_SIZE / 2 + edge_exclusion:
+            return False
+        return all(cx ** 2 + cy ** 2 <= rad ** 2
+                   for cx in (left, right) for cy in (low, high))
+
+    n_x = int(math.ceil(wafer_dia / (2 * die_w))) + 1
+    n_y = int(math.ceil(wafer_dia / (2 * die_h))) + 1
+    runs = []
+    for jj in range(n_y, - n_y - 1, -1):
+        y = offset[1] + jj * die_h
+        cols = [ii for ii in range(- n_x, n_x + 1) if fits(offset[0] + ii * die_w, y)]
+        # Without a notch the usable area is convex and each row is one run
+        for ii, col in enumerate(cols):
+            if ii and col == cols[ii - 1] + 1:
+                runs[-1][3] += 1
+            else:
+                runs.append([jj, y, col, 1])
+
+    if not runs:
+        return []
+    top = runs[0][0]
+    left = min(run[2] for run in runs)
+    return [(top - jj, y, first - left, offset[0] + first * die_w, count)
+            for jj, y, first, count in runs]
+
+def outline_points(wafer_dia, flat_length=None, notch=False, num=256):
+    """Returns the wafer outline as a list of (x, y) in um.
+
+    The notch is a V NOTCH_SIZE wide and deep at the bottom of the wafer.
+    """
+    rad = wafer_dia / 2
+    start = - math.pi / 2
+    if flat_length:
+        start += math.asin(flat_length / wafer_dia)
+    elif notch:
+        start += math.asin(NOTCH_SIZE / wafer_dia)
+    stop = 3 * math.pi / 2 - (start + math.pi / 2)
+    points = [(rad * math.cos(start + ii * (stop - start) / num),
+               rad * math.sin(start + ii * (stop - start) / num))
+              for ii in range(num + 1)]
+    if notch and not flat_length:
+        points.append((0, - rad + NOTCH_SIZE))
+    return points
+
+def build_wafer(layout, die_cell, wafer_dia=100000, die_w=None, die_h=None,
+                edge_exclusion=3000, flat_length=None, notch=False, offset=(0, 0),
+                outline=pya.LayerInfo(0, 0), labels=pya.LayerInfo(0, 1), name='WAFER'):
+    """Builds a wafer cell stepping die_cell over the usable area.
+
+    Args:
+        layout is the layout holding die_cell
+        die_w, die_h default to the die bounding box
+        flat_length defaults to the SEMI flat of the wafer size unless
+            notch is set; pass 0 for neither
+        outline is the layer for the wafer outline
+        labels is the layer for the grid_labels style site IDs
+    Returns:
+        the wafer cell and a dict mapping site IDs to die centers in um
+    """
+    dbu = layout.dbu
+    bbox = die_cell.dbbox()
+    die_w = die_w or bbox.width()
+    die_h = die_h or bbox.height()
+    if flat_length is None and not notch:
+        flat_length = FLAT_LENGTHS.get(int(round(wafer_dia / 1000)), 0)
+
+    wafer = layout.create_cell(name)
+    outline_layer = layout.layer(outline)
+    label_layer = layout.layer(labels)
+
+    wafer.shapes(outline_layer).insert(helpers.tuples_to_polygon(
+        [(x / dbu, y / dbu) for x, y in outline_points(wafer_dia, flat_length, notch)]))
+
+    # Place the die so its bounding box is centered on the site
+    center = bbox.center()
+    sites = {}
+    for row, y, first, x, count in die_rows(wafer_dia, die_w, die_h, edge_exclusion,
+                                            flat_length, notch, offset):
+        disp = pya.Vector(round((x - center.x) / dbu), round((y - center.y) / dbu))
+        wafer.insert(pya.CellInstArray(die_cell.cell_index(), pya.Trans(disp),
+                                       pya.Vector(round(die_w / dbu), 0), pya.Vector(0, 0),
+                                       count, 1))
+        for ii in range(count):
+            site = site_name(first + ii, row)
+            sites[site] = (x + ii * die_w, y)
+            wafer.shapes(label_layer).insert(pya.Text(
+                site, pya.Trans(round((x + ii * die_w) / dbu), round(y / dbu))))
+
+    return wafer, sites
+
+def produce(layout, pcell, params):
+    """Produces an EE312 structure as a cell of layout.
+
+    Layer parameters may be LayerInfos or strings like '1/0', as stored in
+    specs and SiteIndex metadata.
+    """
+    declaration = library.PCELLS[pcell]()
+    layout.register_pcell(pcell, declaration)
+    params = dict(params)
+    for decl in declaration.get_parameters():
+        if decl.type == pya.PCellParameterDeclaration.TypeLayer \
+                and isinstance(params.get(decl.name), str):
+            params[decl.name] = pya.LayerInfo.from_string(params[decl.name])
+    return layout.create_cell(pcell, params)
+
+def write_structures(writer, placements, name, dbu=.001, prefix=''):
+    """Writes EE312 structures and one cell placing them to a stream writer.
+
+    Each distinct structure is produced alone in a scratch layout, written
+    and dropped before the next one, so peak memory is set by the largest
+    structure. Structure cells are named prefix + pcell + '_' + number,
+    the cells they place prefix + their name.
+
+    Args:
+        placements is an iterable of (pcell, params, x, y) placing EE312
+            PCells with their origin at x, y in um; layer parameters may
+            be LayerInfos or strings like '1/0'
+        name is the cell placing all structures
+    Returns:
+        the bounding box of the placed structures in um
+    """
+    # Distinct structures by PCell and parameters: [cell name, params, origins]
+    variants = {}
+    for pcell, params, x, y in placements:
+        key = (pcell, json.dumps(params, sort_keys=True, default=str))
+        if key not in variants:
+            variants[key] = [f'{prefix}{pcell}_{len(variants)}', params, []]
+        variants[key][2].append((x, y))
+
+    bbox = pya.DBox()
+    # Child cells shared by structures, such as contact cells, are written
+    # once under prefix + name, before the first structure using them
+    written = set()
+    child_name = lambda child: prefix + child.name
+    with helpers.full_detail():
+        for (pcell, _), (cell_name, params, origins) in variants.items():
+            scratch = pya.Layout()
+            scratch.dbu = dbu
+            cell = produce(scratch, pcell, params)
+            called = set(cell.called_cells())
+            for ci in scratch.each_cell_bottom_up():
+                child = scratch.cell(ci)
+                if ci in called and child_name(child) not in written:
+                    writer.write_cell(child, child_name(child), child_name)
+                    written.add(child_name(child))
+            writer.write_cell(cell, cell_name, child_name)
+            for x, y in origins:
+                bbox += cell.dbbox().moved(x, y)
+            # Free the structure before producing the next one
+            scratch._destroy()
+
+    writer.begin_cell(name)
+    for cell_name, _, origins in variants.values():
+        for x, y in origins:
+            writer.sref(cell_name, round(x / dbu), round(y / dbu))
+    writer.end_cell()
+    return bbox
+
+def stream_wafer(path, placements, wafer_dia=100000, die_w=None, die_h=None,
+                 edge_exclusion=3000, flat_length=None, notch=False, offset=(0, 0),
+                 outline=pya.LayerInfo(0, 0), labels=pya.LayerInfo(0, 1), dbu=.001,
+                 die_name='DIE', name='WAFER'):
+    """Builds a wafer of EE312 structures directly into a file.
+
+    Structures are written by write_structures, so peak memory is set by
+    the largest structure rather than the wafer. The die and wafer cells
+    only hold references. OASIS files (.oas) are written with CBLOCK
+    compression.
+
+    Args:
+        placements is an iterable of (pcell, params, x, y) as for
+            write_structures, placing structures on the die
+        die_w, die_h default to the bounding box of all structures
+        other arguments as for build_wafer
+    Returns:
+        dict mapping site IDs to die centers in um
+    """
+    if flat_length is None and not notch:
+        flat_length = FLAT_LENGTHS.get(int(round(wafer_dia / 1000)), 0)
+
+    sites = {}
+    with open_writer(path, dbu) as writer:
+        bbox = write_structures(writer, placements, die_name, dbu)
+        die_w = die_w or bbox.width()
+        die_h = die_h or bbox.height()
+        center = bbox.center()
+        writer.begin_cell(name)
+        writer.region(outline.layer, outline.datatype, pya.Region(helpers.tuples_to_polygon(
+            [(x / dbu, y / dbu) for x, y in outline_points(wafer_dia, flat_length, notch)])))
+        for row, y, first, x, count in die_rows(wafer_dia, die_w, die_h, edge_exclusion,
+                                                flat_length, notch, offset):
+            writer.aref(die_name, round((x - center.x) / dbu), round((y - center.y) / dbu),
+                        count, 1, (round(die_w / dbu), 0), (0, 0))
+            for ii in range(count):
+                site = site_name(first + ii, row)
+                sites[site] = (x + ii * die_w, y)
+                writer.text(labels.layer, labels.datatype, site,
+                            round((x + ii * die_w) / dbu), round(y / dbu))
+        writer.end_cell()
+
+    return sites